@@ -0,0 +1,145 @@
+"""
+Measures the time and peak memory needed to import parts of rast_common.main, each in a fresh interpreter,
+and checks that the lightweight imports neither load NumPy, pandas or SQLAlchemy nor print anything,
+and that they are much faster than the imports that load them.
+
+Usage: `python benchmarks/import_time.py [repeat]`
+The exit status is 1 if a check fails.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# imports that must not load the heavy dependencies
+LIGHTWEIGHT_IMPORTS = [
+    "import rast_common.main",
+    "from rast_common.main import get_date_from_string, get_timestamp_from_line",
+    "from rast_common.main.StringUtils import get_timestamp_from_string",
+]
+
+HEAVY_IMPORTS = [
+    "from rast_common.main import read_all_performance_metrics_from_db",
+    "from rast_common.main import *",
+]
+
+HEAVY_MODULES = ['numpy', 'pandas', 'sqlalchemy']
+
+# The lightweight imports must take at most this fraction of the fastest heavy import.
+# Relative to the heavy imports, so that the check does not depend on the speed of the machine.
+MAX_LIGHTWEIGHT_IMPORT_TIME_FRACTION = 0.25
+
+BENCHMARK_PREFIX = "import: "
+
+# runs the import statement in the child process and writes the measurement to a file,
+# so that everything printed to stdout stems from the import
+_MEASURE_IMPORT = """
+import json, sys, time, tracemalloc
+statement, trace, output_path = sys.argv[1], sys.argv[2] == 'trace', sys.argv[3]
+if trace:
+    tracemalloc.start()
+begin = time.perf_counter()
+exec(statement)
+duration_s = time.perf_counter() - begin
+with open(output_path, 'w') as file:
+    json.dump({
+        'duration_s': duration_s,
+        'peak_memory_bytes': tracemalloc.get_traced_memory()[1] if trace else 0,
+        'modules': sorted(sys.modules),
+    }, file)
+"""
+
+
+def _run_import(statement: str, trace: bool) -> tuple[dict, str]:
+    with tempfile.TemporaryDirectory() as work_dir:
+        output_path = os.path.join(work_dir, 'import.json')
+        completed = subprocess.run(
+            [sys.executable, '-c', _MEASURE_IMPORT, statement, 'trace' if trace else 'time', output_path],
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        with open(output_path) as file:
+            return json.load(file), completed.stdout
+
+
+def measure_import(statement: str, repeat: int = 5) -> dict:
+    """
+    :return: result of the import in the format of run_benchmarks.measure,
+    with the heavy modules loaded by the import and the output it printed
+    """
+    durations = []
+    for _ in range(repeat):
+        measurement, printed_output = _run_import(statement, trace=False)
+        durations.append(measurement['duration_s'])
+
+    measurement, _ = _run_import(statement, trace=True)
+    median_s = statistics.median(durations)
+
+    return {
+        'version': '-',
+        'benchmark': f"{BENCHMARK_PREFIX}{statement}",
+        'size': 0,
+        'items': 1,
+        'min_s': min(durations),
+        'median_s': median_s,
+        'items_per_second': 1 / median_s,
+        'latency_us': median_s * 1000000,
+        'peak_memory_bytes': measurement['peak_memory_bytes'],
+        'loaded_heavy_modules': [module for module in HEAVY_MODULES if module in measurement['modules']],
+        'printed_output': printed_output,
+    }
+
+
+def measure_import_times(repeat: int = 5) -> list[dict]:
+    return [measure_import(statement, repeat) for statement in LIGHTWEIGHT_IMPORTS + HEAVY_IMPORTS]
+
+
+def check_import_results(results: list[dict]) -> list[str]:
+    """
+    :param results: results of measure_import_times, other results are ignored
+    :return: description of each failed check
+    """
+    failures = []
+
+    import_results = {
+        result['benchmark'][len(BENCHMARK_PREFIX):]: result
+        for result in results
+        if result['benchmark'].startswith(BENCHMARK_PREFIX)
+    }
+    heavy_import_times_s = [
+        result['median_s'] for statement, result in import_results.items() if statement in HEAVY_IMPORTS
+    ]
+
+    for statement, result in import_results.items():
+        if result['printed_output'] != "":
+            failures.append(f"{statement} printed {result['printed_output']!r}")
+        if statement in LIGHTWEIGHT_IMPORTS and len(result['loaded_heavy_modules']) > 0:
+            failures.append(f"{statement} loaded {', '.join(result['loaded_heavy_modules'])}")
+        if statement in LIGHTWEIGHT_IMPORTS and len(heavy_import_times_s) > 0 \
+                and result['median_s'] > MAX_LIGHTWEIGHT_IMPORT_TIME_FRACTION * min(heavy_import_times_s):
+            failures.append(f"{statement} took {result['median_s'] * 1000:.1f} ms, more than "
+                            f"{MAX_LIGHTWEIGHT_IMPORT_TIME_FRACTION:.0%} of the fastest heavy import")
+
+    return failures
+
+
+def main(repeat: int = 5) -> int:
+    results = measure_import_times(repeat)
+
+    print(f"{'import':<70} {'duration [ms]':>13} {'peak [MiB]':>11}  heavy modules")
+    for result in results:
+        print(f"{result['benchmark'][len(BENCHMARK_PREFIX):]:<70} {result['median_s'] * 1000:>13.1f} "
+              f"{result['peak_memory_bytes'] / 2 ** 20:>11.2f}  {', '.join(result['loaded_heavy_modules'])}")
+
+    failures = check_import_results(results)
+    for failure in failures:
+        print(f"FAILED: {failure}")
+
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:])))
@@ -0,0 +1,363 @@
+"""
+Measures the throughput, latency and peak memory of the hot paths of rast_common
+on synthetic data (see synthetic_data.py) of several sizes.
+Runs fully offline and generates the same data for the same seed.
+
+Each schema version is measured in a separate process, so that the versions share neither engines nor caches.
+The time needed to import rast_common.main is measured as well, see import_time.py.
+
+The results are written as JSON and can be compared against the results of a previous run, e.g.,
+`python benchmarks/run_benchmarks.py --output results.json --baseline baseline.json`
+The exit status is 1 if a benchmark got slower or needs more memory than the baseline by more than the threshold,
+or if a lightweight import of rast_common.main loads the heavy dependencies.
+
+Usage: `python benchmarks/run_benchmarks.py [--sizes N ...] [--versions V1 CURRENT V3] [--repeat R] [--seed S]
+[--output FILE] [--baseline FILE] [--threshold FRACTION] [--input FILE]`
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from importlib.metadata import version as package_version, PackageNotFoundError
+from typing import Callable, Optional
+
+from import_time import measure_import_times, check_import_results
+
+RESULTS_FORMAT_VERSION = 1
+
+DEFAULT_SIZES = [10000, 100000]
+DEFAULT_VERSIONS = ['V1', 'CURRENT']
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.1
+
+_PACKAGES = ['numpy', 'pandas', 'SQLAlchemy', 'pyarrow']
+
+
+def measure(
+        benchmark: str,
+        size: int,
+        number_of_items: int,
+        run: Callable,
+        setup: Callable = lambda: None,
+        repeat: int = DEFAULT_REPEAT
+) -> dict:
+    """
+    Runs the benchmark repeat times to measure its duration
+    and once more with tracemalloc to measure its peak memory, since tracing slows down allocations.
+    Output printed by the benchmark is discarded.
+    :param benchmark: name of the benchmark, usually the name of the measured function
+    :param size: size of the synthetic data
+    :param number_of_items: number of items (e.g., lines, rows or lookups) processed per run
+    :param run: function running the benchmark with the result of setup
+    :param setup: function preparing a run, which is not measured
+    :param repeat: number of measured runs
+    :return: result of the benchmark
+    """
+    durations = []
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for _ in range(repeat):
+            argument = setup()
+            begin = time.perf_counter()
+            run(argument)
+            durations.append(time.perf_counter() - begin)
+
+        argument = setup()
+        tracemalloc.start()
+        try:
+            run(argument)
+            _, peak_memory_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    median_s = statistics.median(durations)
+
+    return {
+        'benchmark': benchmark,
+        'size': size,
+        'items': number_of_items,
+        'min_s': min(durations),
+        'median_s': median_s,
+        'items_per_second': number_of_items / median_s,
+        'latency_us': median_s / number_of_items * 1000000,
+        'peak_memory_bytes': peak_memory_bytes,
+    }
+
+
+def run_benchmarks_of_version(version_name: str, sizes: list[int], repeat: int, seed: int) -> list[dict]:
+    # imported in the worker only, so that the main process does not load rast_common and its dependencies
+    from sqlalchemy.orm import Session
+
+    import synthetic_data
+    from rast_common.main.FileUtils import readResponseTimesFromLogFile, readResponseTimesFromLogFileAsArrays
+    from rast_common.main.StringUtils import get_timestamp_from_line, get_timestamps_from_lines
+    from rast_common.main.SwitchAggFlowStats import SwitchAggFlowStats, lookup_switch_throughput
+    from rast_common.main.TrainingDatabase import create_connection_using_sqlalchemy, create_training_data_table, \
+        insert_training_data, ingest_training_data, read_all_training_data_from_db_using_sqlalchemy, \
+        read_training_data_from_db_between_using_sqlalchemy, read_training_data_batches_from_db
+    from rast_common.main.TrainingDatabaseUtils import read_all_performance_metrics_from_db
+    from rast_common.Version import TrainingDataEntityVersion, select_version
+
+    select_version(TrainingDataEntityVersion[version_name])
+
+    results = []
+
+    def add_result(benchmark: str, size: int, number_of_items: int, run: Callable, setup: Callable = lambda: None):
+        result = measure(benchmark, size, number_of_items, run, setup, repeat)
+        result['version'] = version_name
+        results.append(result)
+        print(f"{version_name:>8} {benchmark:<55} {size:>8} {result['items_per_second']:>14.0f} items/s")
+
+    def consume(iterable):
+        for _ in iterable:
+            pass
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in sizes:
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                log_path = synthetic_data.generate_locust_log_file(
+                    os.path.join(work_dir, f"locust_log_{size}.log"), size, seed
+                )
+                rast_log_lines = synthetic_data.generate_rast_log_lines(size, seed)
+                db_path = synthetic_data.generate_training_database(
+                    os.path.join(work_dir, f"trainingdata_{size}.db"), size, seed
+                )
+                batch = synthetic_data.generate_training_data_batch(size, seed)
+                rows = list(batch)
+                stats_by_switch_id = synthetic_data.generate_switch_agg_flow_stats(size, seed)
+                _, _, bytes_per_second, packets_per_second = \
+                    synthetic_data.generate_switch_agg_flow_stats_stream(size, seed)
+
+            # the second of the generated days
+            second_day = (synthetic_data.FIRST_DAY + timedelta(days=1)).strftime("%Y %m %d")
+            rows_of_second_day = sum(
+                1 for _ in read_training_data_from_db_between_using_sqlalchemy(db_path, second_day, second_day)
+            )
+
+            add_result("readResponseTimesFromLogFile", size, size,
+                       lambda _: readResponseTimesFromLogFile(log_path))
+            add_result("readResponseTimesFromLogFileAsArrays", size, size,
+                       lambda _: readResponseTimesFromLogFileAsArrays(log_path))
+
+            def get_timestamps_line_by_line(_):
+                for line in rast_log_lines:
+                    get_timestamp_from_line(line)
+
+            add_result("get_timestamp_from_line", size, size, get_timestamps_line_by_line)
+            add_result("get_timestamps_from_lines", size, size,
+                       lambda _: get_timestamps_from_lines(rast_log_lines, as_epoch=True))
+
+            def create_empty_database():
+                path = os.path.join(work_dir, "insert.db")
+                if os.path.exists(path):
+                    os.remove(path)
+                engine = create_connection_using_sqlalchemy(path)
+                create_training_data_table(engine)
+                return engine
+
+            def insert_rows(engine):
+                with Session(engine) as session:
+                    insert_training_data(session, rows)
+                    session.commit()
+                engine.dispose()
+
+            def ingest_batch(engine):
+                ingest_training_data(engine, batch)
+                engine.dispose()
+
+            add_result("insert_training_data", size, size, insert_rows, create_empty_database)
+            add_result("ingest_training_data", size, size, ingest_batch, create_empty_database)
+
+            add_result("read_all_training_data_from_db_using_sqlalchemy", size, size,
+                       lambda _: consume(read_all_training_data_from_db_using_sqlalchemy(db_path)))
+            add_result("read_training_data_from_db_between_using_sqlalchemy", size, rows_of_second_day,
+                       lambda _: consume(read_training_data_from_db_between_using_sqlalchemy(
+                           db_path, second_day, second_day
+                       )))
+            add_result("read_training_data_batches_from_db", size, size,
+                       lambda _: consume(read_training_data_batches_from_db(db_path)))
+            add_result("read_all_performance_metrics_from_db", size, size,
+                       lambda _: read_all_performance_metrics_from_db(db_path))
+
+            def add_agg_flow_stats(stats):
+                for bytes_of_second, packets_of_second in zip(bytes_per_second.tolist(), packets_per_second.tolist()):
+                    stats.add_agg_flow_stats(bytes_of_second, packets_of_second)
+
+            def get_bytes_per_second_one_by_one(_):
+                stats = stats_by_switch_id[0]
+                for timestamp in batch.columns["timestamp"].astype('datetime64[us]').tolist():
+                    stats.get_bytes_per_second_for(timestamp)
+
+            add_result("SwitchAggFlowStats.add_agg_flow_stats", size, size, add_agg_flow_stats,
+                       lambda: SwitchAggFlowStats(0))
+            add_result("SwitchAggFlowStats.get_bytes_per_second_for", size, size, get_bytes_per_second_one_by_one)
+            add_result("lookup_switch_throughput", size, size,
+                       lambda _: lookup_switch_throughput(
+                           stats_by_switch_id, batch.columns["switch_id"], batch.columns["timestamp"]
+                       ))
+
+    return results
+
+
+def _environment() -> dict:
+    packages = {}
+    for package in _PACKAGES:
+        try:
+            packages[package] = package_version(package)
+        except PackageNotFoundError:
+            packages[package] = None
+
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'packages': packages,
+    }
+
+
+def run_benchmarks(sizes: list[int], versions: list[str], repeat: int, seed: int) -> dict:
+    """
+    :return: results of all benchmarks, measured in one process per schema version
+    """
+    results = []
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for version_name in versions:
+            output_path = os.path.join(work_dir, f"results_{version_name}.json")
+            subprocess.run(
+                [
+                    sys.executable, os.path.abspath(__file__),
+                    '--worker', version_name,
+                    '--sizes', *(str(size) for size in sizes),
+                    '--repeat', str(repeat),
+                    '--seed', str(seed),
+                    '--output', output_path
+                ],
+                check=True
+            )
+            with open(output_path) as file:
+                results.extend(json.load(file))
+
+    results.extend(measure_import_times(repeat))
+
+    return {
+        'format_version': RESULTS_FORMAT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': _environment(),
+        'sizes': sizes,
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+
+def _result_key(result: dict) -> tuple:
+    return result['version'], result['benchmark'], result['size']
+
+
+def compare_results(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    """
+    :param results: results of run_benchmarks
+    :param baseline: results of a previous run
+    :param threshold: relative slowdown or increase of the peak memory considered as regression
+    :return: comparison of each benchmark measured in both runs
+    """
+    baseline_by_key = {_result_key(result): result for result in baseline['results']}
+
+    comparisons = []
+    for result in results['results']:
+        baseline_result = baseline_by_key.get(_result_key(result))
+        if baseline_result is None:
+            continue
+
+        speedup = result['items_per_second'] / baseline_result['items_per_second']
+        memory_ratio = result['peak_memory_bytes'] / max(baseline_result['peak_memory_bytes'], 1)
+        comparisons.append({
+            'version': result['version'],
+            'benchmark': result['benchmark'],
+            'size': result['size'],
+            'speedup': speedup,
+            'memory_ratio': memory_ratio,
+            'regression': speedup < 1 - threshold or memory_ratio > 1 + threshold,
+        })
+
+    return comparisons
+
+
+def print_results(results: dict):
+    print(f"{'version':>8} {'benchmark':<55} {'size':>8} {'items/s':>14} {'latency [µs]':>13} {'peak [MiB]':>11}")
+    for result in results['results']:
+        print(f"{result['version']:>8} {result['benchmark']:<55} {result['size']:>8} "
+              f"{result['items_per_second']:>14.0f} {result['latency_us']:>13.3f} "
+              f"{result['peak_memory_bytes'] / 2 ** 20:>11.2f}")
+
+
+def print_comparisons(comparisons: list[dict]):
+    print(f"{'version':>8} {'benchmark':<55} {'size':>8} {'speedup':>8} {'memory':>7}")
+    for comparison in comparisons:
+        print(f"{comparison['version']:>8} {comparison['benchmark']:<55} {comparison['size']:>8} "
+              f"{comparison['speedup']:>7.2f}x {comparison['memory_ratio']:>6.2f}x"
+              f"{'  REGRESSION' if comparison['regression'] else ''}")
+
+
+def main(args: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measures the hot paths of rast_common on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES, help="sizes of the synthetic data")
+    parser.add_argument("--versions", nargs='+', default=DEFAULT_VERSIONS, choices=['V1', 'CURRENT', 'V3'],
+                        help="schema versions of the training databases")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="number of measured runs per benchmark")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the synthetic data")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON file with the results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown or increase of the peak memory considered as regression")
+    parser.add_argument("--input", help="JSON file with results to compare instead of running the benchmarks")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(args)
+
+    if args.worker is not None:
+        results = run_benchmarks_of_version(args.worker, args.sizes, args.repeat, args.seed)
+        with open(args.output, 'w') as file:
+            json.dump(results, file)
+        return 0
+
+    if args.input is not None:
+        with open(args.input) as file:
+            results = json.load(file)
+    else:
+        results = run_benchmarks(args.sizes, args.versions, args.repeat, args.seed)
+
+    print_results(results)
+
+    failures = check_import_results(results['results'])
+    for failure in failures:
+        print(f"FAILED: {failure}")
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline is None:
+        return 1 if len(failures) > 0 else 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+
+    comparisons = compare_results(results, baseline, args.threshold)
+    print_comparisons(comparisons)
+
+    return 1 if len(failures) > 0 or any(comparison['regression'] for comparison in comparisons) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Measures the update throughput of SwitchAggFlowStatsRegistry
+compared to SwitchAggFlowStats objects guarded by a single global lock,
+as the number of switches and writer threads grows.
+
+Usage: `python benchmarks/switch_agg_flow_stats_registry.py [updates per thread]`
+"""
+import sys
+import threading
+import time
+
+from rast_common.main.SwitchAggFlowStats import SwitchAggFlowStats
+from rast_common.main.SwitchAggFlowStatsRegistry import SwitchAggFlowStatsRegistry
+
+
+def _run_threads(number_of_threads: int, update) -> float:
+    start = threading.Barrier(number_of_threads + 1)
+
+    def work(thread_index: int):
+        start.wait()
+        update(thread_index)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(number_of_threads)]
+    for thread in threads:
+        thread.start()
+
+    begin = time.perf_counter()
+    start.wait()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - begin
+
+
+def measure_global_lock(number_of_switches: int, number_of_threads: int, updates_per_thread: int) -> float:
+    stats_by_switch_id = {switch_id: SwitchAggFlowStats(switch_id) for switch_id in range(number_of_switches)}
+    global_lock = threading.Lock()
+
+    def update(thread_index: int):
+        for i in range(updates_per_thread):
+            stats = stats_by_switch_id[(thread_index + i) % number_of_switches]
+            with global_lock:
+                stats.add_agg_flow_stats(1500, 1)
+
+    duration = _run_threads(number_of_threads, update)
+    return number_of_threads * updates_per_thread / duration
+
+
+def measure_registry(number_of_switches: int, number_of_threads: int, updates_per_thread: int) -> float:
+    registry = SwitchAggFlowStatsRegistry()
+
+    def update(thread_index: int):
+        for i in range(updates_per_thread):
+            registry.add_agg_flow_stats((thread_index + i) % number_of_switches, 1500, 1)
+
+    duration = _run_threads(number_of_threads, update)
+    return number_of_threads * updates_per_thread / duration
+
+
+def main(updates_per_thread: int = 50000) -> list[dict]:
+    results = []
+
+    print(f"{'switches':>8} {'threads':>7} {'global lock [updates/s]':>24} {'registry [updates/s]':>21}")
+    for number_of_switches in [1, 8, 64]:
+        for number_of_threads in [1, 2, 4, 8, 16]:
+            global_lock = measure_global_lock(number_of_switches, number_of_threads, updates_per_thread)
+            registry = measure_registry(number_of_switches, number_of_threads, updates_per_thread)
+            results.append({
+                'switches': number_of_switches,
+                'threads': number_of_threads,
+                'global_lock_updates_per_second': global_lock,
+                'registry_updates_per_second': registry,
+            })
+            print(f"{number_of_switches:>8} {number_of_threads:>7} {global_lock:>24.0f} {registry:>21.0f}")
+
+    return results
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,229 @@
+"""
+Seeded generator of synthetic RAST data for the benchmarks:
+locust log files, RAST simulator log lines, training databases and switch flow statistics.
+The same seed always generates the same data, so that benchmark runs on different machines are comparable.
+
+The schema of the generated training databases is the selected version, see `rast_common.Version.select_version`.
+
+Usage: `python benchmarks/synthetic_data.py <output directory> [--size N] [--seed S] [--switches K]`
+"""
+import argparse
+import os
+from datetime import datetime, time
+from typing import Iterable, Tuple
+
+import numpy as np
+
+from rast_common.main.SwitchAggFlowStats import SwitchAggFlowStats, SECONDS_PER_DAY
+from rast_common.main.SwitchAggFlowStatsBinary import write_switch_agg_flow_stats_binary
+from rast_common.main.TrainingDatabase import TrainingDataRowBatch, create_connection_using_sqlalchemy, \
+    create_training_data_table, ingest_training_data
+
+DEFAULT_SEED = 42
+
+FIRST_DAY = datetime(2021, 4, 1)
+# the generated requests are spread over these days independent of their number
+NUMBER_OF_DAYS = 3
+
+REQUEST_TYPES = ['/login', '/logout', '/products', '/product', '/cart', '/cart/add', '/order', '/search']
+# relative frequency of the request types
+_REQUEST_TYPE_WEIGHTS = np.array([4, 1, 10, 20, 8, 6, 2, 9], dtype=np.float64)
+# median response time in milliseconds of the request types
+_REQUEST_TYPE_MEDIAN_MS = np.array([80, 20, 120, 60, 40, 90, 400, 250], dtype=np.float64)
+
+_LOCUST_NOISE_LINES = [
+    "loadgenerator/INFO/locust.runners: Ramping to 50 users at a rate of 5.00 per second",
+    "loadgenerator/INFO/locust.main: Starting web interface at http://0.0.0.0:8089",
+    "loadgenerator/WARNING/root: CPU usage above 90%! This may constrain your throughput",
+]
+
+
+def generate_request_timestamps(number_of_requests: int, seed: int = DEFAULT_SEED) -> np.ndarray:
+    """
+    :return: sorted start times of the requests as datetime64[us],
+    with load varying over the day like a daily traffic pattern
+    """
+    rng = np.random.default_rng(seed)
+
+    # twice as many requests in the afternoon as in the night
+    offsets_s = np.sort(rng.uniform(0, NUMBER_OF_DAYS * SECONDS_PER_DAY, number_of_requests))
+    offsets_s += 3600 * np.sin(2 * np.pi * offsets_s / SECONDS_PER_DAY)
+    offsets_s = np.sort(np.clip(offsets_s, 0, NUMBER_OF_DAYS * SECONDS_PER_DAY - 1))
+
+    # locust logs milliseconds, so requests within the same millisecond occur at high load
+    offsets_us = (offsets_s * 1000).astype(np.int64) * 1000
+    return np.datetime64(FIRST_DAY, 'us') + offsets_us.astype('timedelta64[us]')
+
+
+def generate_requests(number_of_requests: int, seed: int = DEFAULT_SEED) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: start times as datetime64[us], indexes into REQUEST_TYPES and response times in milliseconds
+    """
+    rng = np.random.default_rng(seed + 1)
+
+    timestamps = generate_request_timestamps(number_of_requests, seed)
+    request_types = rng.choice(
+        len(REQUEST_TYPES),
+        size=number_of_requests,
+        p=_REQUEST_TYPE_WEIGHTS / _REQUEST_TYPE_WEIGHTS.sum()
+    )
+    response_times_ms = np.maximum(
+        1,
+        rng.lognormal(np.log(_REQUEST_TYPE_MEDIAN_MS[request_types]), 0.6)
+    ).astype(np.int64)
+
+    return timestamps, request_types, response_times_ms
+
+
+def generate_locust_log_lines(number_of_requests: int, seed: int = DEFAULT_SEED) -> Iterable[str]:
+    """
+    :return: lines of a locust log file as parsed by `readResponseTimesFromLogFile`,
+    one "Response time" line per request interleaved with other log messages
+    """
+    rng = np.random.default_rng(seed + 2)
+
+    timestamps, _, response_times_ms = generate_requests(number_of_requests, seed)
+    formatted_timestamps = np.datetime_as_string(timestamps, unit='ms')
+    noise = rng.integers(0, 10 * len(_LOCUST_NOISE_LINES), number_of_requests)
+
+    for formatted_timestamp, response_time_ms, noise_index in zip(
+            formatted_timestamps.tolist(), response_times_ms.tolist(), noise.tolist()
+    ):
+        timestamp = formatted_timestamp.replace('T', ' ').replace('.', ',')
+        if noise_index < len(_LOCUST_NOISE_LINES):
+            yield f"[{timestamp}] {_LOCUST_NOISE_LINES[noise_index]}\n"
+        yield f"[{timestamp}] loadgenerator/INFO/root: Response time {response_time_ms} ms\n"
+
+
+def generate_locust_log_file(path: str, number_of_requests: int, seed: int = DEFAULT_SEED) -> str:
+    with open(path, 'w') as file:
+        file.writelines(generate_locust_log_lines(number_of_requests, seed))
+    return path
+
+
+def generate_rast_log_lines(number_of_requests: int, seed: int = DEFAULT_SEED) -> list[str]:
+    """
+    :return: lines of a RAST simulator log file as parsed by `get_timestamp_from_line`,
+    every tenth line without fractional seconds
+    """
+    timestamps, request_types, _ = generate_requests(number_of_requests, seed)
+    formatted_timestamps = np.datetime_as_string(timestamps, unit='us')
+
+    return [
+        f"[PID {4711 + index % 8}] {formatted_timestamp[:19 if index % 10 == 0 else 26].replace('T', ' ')} "
+        f"UID {index} CMD {REQUEST_TYPES[request_type]}\n"
+        for index, (formatted_timestamp, request_type) in enumerate(zip(formatted_timestamps.tolist(), request_types))
+    ]
+
+
+def generate_training_data_batch(
+        number_of_rows: int,
+        seed: int = DEFAULT_SEED,
+        number_of_switches: int = 4
+) -> TrainingDataRowBatch:
+    """
+    :return: training data rows of the generated requests, including the fields of all schema versions
+    """
+    rng = np.random.default_rng(seed + 3)
+
+    timestamps, request_types, response_times_ms = generate_requests(number_of_rows, seed)
+    parallel_requests = rng.poisson(8, (3, number_of_rows))
+
+    return TrainingDataRowBatch({
+        "timestamp": timestamps.astype('datetime64[ns]'),
+        "number_of_parallel_requests_start": parallel_requests[0],
+        "number_of_parallel_requests_end": parallel_requests[1],
+        "number_of_parallel_requests_finished": parallel_requests[2],
+        "request_type": np.array(REQUEST_TYPES, dtype=object)[request_types],
+        "system_cpu_usage": rng.uniform(5, 95, number_of_rows),
+        "requests_per_second": rng.poisson(20, number_of_rows),
+        "requests_per_minute": rng.poisson(1200, number_of_rows),
+        "switch_id": rng.integers(0, number_of_switches, number_of_rows),
+        "bytes_per_second_transmitted_through_switch": rng.integers(0, 10 ** 7, number_of_rows),
+        "packets_per_second_transmitted_through_switch": rng.integers(0, 10 ** 4, number_of_rows),
+        "request_execution_time_ms": response_times_ms,
+    })
+
+
+def generate_training_database(path: str, number_of_rows: int, seed: int = DEFAULT_SEED) -> str:
+    """
+    Creates a training database of the selected schema version containing the generated training data rows.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    engine = create_connection_using_sqlalchemy(path)
+    create_training_data_table(engine)
+    ingest_training_data(engine, generate_training_data_batch(number_of_rows, seed))
+    engine.dispose()
+
+    return path
+
+
+def generate_switch_agg_flow_stats_stream(
+        number_of_updates: int,
+        seed: int = DEFAULT_SEED,
+        number_of_switches: int = 4
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: second of the day, switch id, bytes per second and packets per second of each update,
+    in the order the switches report them
+    """
+    rng = np.random.default_rng(seed + 4)
+
+    seconds_of_day = np.sort(rng.integers(0, SECONDS_PER_DAY, number_of_updates))
+    switch_ids = rng.integers(0, number_of_switches, number_of_updates)
+    packets_per_second = rng.poisson(500, number_of_updates)
+    bytes_per_second = packets_per_second * rng.integers(64, 1500, number_of_updates)
+
+    return seconds_of_day, switch_ids, bytes_per_second, packets_per_second
+
+
+def generate_switch_agg_flow_stats(
+        number_of_updates: int,
+        seed: int = DEFAULT_SEED,
+        number_of_switches: int = 4
+) -> dict[int, SwitchAggFlowStats]:
+    """
+    :return: statistics of the switches, accumulated from the generated stream of updates
+    """
+    stats_by_switch_id = {switch_id: SwitchAggFlowStats(switch_id) for switch_id in range(number_of_switches)}
+
+    for second_of_day, switch_id, bytes_per_second, packets_per_second in zip(
+            *(column.tolist() for column in generate_switch_agg_flow_stats_stream(
+                number_of_updates, seed, number_of_switches
+            ))
+    ):
+        stats = stats_by_switch_id[switch_id]
+        time_of_stat = time(second_of_day // 3600, second_of_day // 60 % 60, second_of_day % 60)
+        stats.bytes_per_second_received[time_of_stat] = \
+            stats.bytes_per_second_received.get(time_of_stat, 0) + bytes_per_second
+        stats.packets_per_second_received[time_of_stat] = \
+            stats.packets_per_second_received.get(time_of_stat, 0) + packets_per_second
+
+    return stats_by_switch_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates synthetic RAST data.")
+    parser.add_argument("output", help="directory to write the data to")
+    parser.add_argument("--size", type=int, default=100000, help="number of requests")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--switches", type=int, default=4, help="number of switches")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+
+    day = FIRST_DAY.strftime('%Y-%m-%d')
+    generate_locust_log_file(os.path.join(args.output, f"locust_log_{day}.log"), args.size, args.seed)
+    with open(os.path.join(args.output, f"rast_log_{day}.log"), 'w') as file:
+        file.writelines(generate_rast_log_lines(args.size, args.seed))
+    generate_training_database(os.path.join(args.output, f"trainingdata_{day}.db"), args.size, args.seed)
+    write_switch_agg_flow_stats_binary(
+        os.path.join(args.output, f"switch_agg_flow_stats_{day}.bin"),
+        generate_switch_agg_flow_stats(args.size, args.seed, args.switches).values()
+    )
+
+
+if __name__ == '__main__':
+    main()
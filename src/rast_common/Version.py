@@ -4,6 +4,8 @@ from enum import Enum
 class TrainingDataEntityVersion(Enum):
     V1 = 1
     CURRENT = 2
+    # CURRENT with the request types stored in a lookup table, see TrainingDatabaseMigration
+    V3 = 3
 
 
 SELECTED_VERSION = TrainingDataEntityVersion.CURRENT
@@ -12,3 +14,7 @@ SELECTED_VERSION = TrainingDataEntityVersion.CURRENT
 def select_version(version: TrainingDataEntityVersion):
     global SELECTED_VERSION
     SELECTED_VERSION = version
+
+
+def get_selected_version() -> TrainingDataEntityVersion:
+    return SELECTED_VERSION
@@ -0,0 +1,160 @@
+import os
+import threading
+from typing import Optional
+from urllib.parse import quote
+
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+# Pragmas of connections that only read: memory-map the database file, cache more pages,
+# keep temporary tables and indexes in memory and reject writes.
+DEFAULT_READER_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative values are KiB
+    "temp_store": "MEMORY",
+    "query_only": "ON",
+}
+
+# Pragmas of connections that write. The journal mode is not changed, because it is stored in the database file,
+# pass e.g. {"journal_mode": "WAL", "synchronous": "NORMAL"} to opt in.
+DEFAULT_WRITER_PRAGMAS = {
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def _set_pragmas_on_connect(engine: Engine, pragmas: dict):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+class EngineManager:
+    """
+    Caches one pooled Engine per database file, so that repeated queries do not pay for creating an engine
+    and its connections. Engines are safe to share between threads, see `get_scoped_session` for sessions.
+
+    Engines of a database file that was replaced (e.g. by copying a new file over it) are disposed and recreated,
+    so that pooled connections do not keep reading the old file.
+
+    Example:
+
+    ```
+    engine = ENGINE_MANAGER.get_engine(r"db/trainingdata_2021-04-06.db")
+    ```
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines: dict[tuple, tuple[tuple, Engine]] = {}
+        self._scoped_sessions: dict[tuple, scoped_session] = {}
+
+    @staticmethod
+    def _key(db_path: str, read_only: bool, pragmas: Optional[dict], enable_sql_logging: bool) -> tuple:
+        if pragmas is None:
+            pragmas = DEFAULT_READER_PRAGMAS if read_only else DEFAULT_WRITER_PRAGMAS
+        return os.path.abspath(db_path), read_only, tuple(sorted(pragmas.items())), enable_sql_logging
+
+    @staticmethod
+    def _file_identity(path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+    @staticmethod
+    def _create_engine(key: tuple) -> Engine:
+        path, read_only, pragmas, enable_sql_logging = key
+        if read_only:
+            # the URI is opened read-only by SQLite itself, so a missing file is an error instead of created.
+            # SQLite decodes the path of the URI, so characters like "#", "?" and "%" have to be percent-encoded.
+            url = f"sqlite:///file:{quote(path)}?mode=ro&uri=true"
+        else:
+            url = f"sqlite:///{path}"
+
+        engine = create_engine(url, echo=enable_sql_logging)
+        _set_pragmas_on_connect(engine, dict(pragmas))
+        return engine
+
+    def get_engine(
+            self,
+            db_path: str,
+            read_only: bool = True,
+            pragmas: Optional[dict] = None,
+            enable_sql_logging: bool = False
+    ) -> Engine:
+        """
+        :param db_path: path to database file
+        :param read_only: open the database file in read-only mode
+        :param pragmas: SQLite pragmas set on each new connection,
+        defaults to DEFAULT_READER_PRAGMAS or DEFAULT_WRITER_PRAGMAS
+        :param enable_sql_logging: enable logging of SQL statements
+        :return: the cached Engine for these arguments
+        """
+        key = self._key(db_path, read_only, pragmas, enable_sql_logging)
+        file_identity = self._file_identity(key[0])
+
+        with self._lock:
+            cached = self._engines.get(key)
+            if cached is not None:
+                cached_file_identity, engine = cached
+                if cached_file_identity == file_identity:
+                    return engine
+                self._dispose(key)
+
+            engine = self._create_engine(key)
+            self._engines[key] = (file_identity, engine)
+            return engine
+
+    def get_scoped_session(
+            self,
+            db_path: str,
+            read_only: bool = True,
+            pragmas: Optional[dict] = None,
+            enable_sql_logging: bool = False
+    ) -> scoped_session:
+        """
+        :return: session registry that hands out one session per thread, see `get_engine` for the arguments.
+        Call `remove()` on it when a thread finished its work.
+        """
+        engine = self.get_engine(db_path, read_only, pragmas, enable_sql_logging)
+        key = self._key(db_path, read_only, pragmas, enable_sql_logging)
+
+        with self._lock:
+            session = self._scoped_sessions.get(key)
+            if session is None or session.session_factory.kw["bind"] is not engine:
+                session = scoped_session(sessionmaker(bind=engine))
+                self._scoped_sessions[key] = session
+            return session
+
+    def _dispose(self, key: tuple):
+        _, engine = self._engines.pop(key)
+        session = self._scoped_sessions.pop(key, None)
+        if session is not None:
+            session.remove()
+        engine.dispose()
+
+    def dispose(self, db_path: Optional[str] = None):
+        """
+        Closes the pooled connections of the engines of a database file, or of all engines.
+        """
+        with self._lock:
+            for key in list(self._engines):
+                if db_path is None or key[0] == os.path.abspath(db_path):
+                    self._dispose(key)
+
+
+# Engine manager shared by the readers of this package
+ENGINE_MANAGER = EngineManager()
+
+
+def get_read_engine(db_path: str, pragmas: Optional[dict] = None, enable_sql_logging: bool = False) -> Engine:
+    return ENGINE_MANAGER.get_engine(db_path, True, pragmas, enable_sql_logging)
+
+
+def get_write_engine(db_path: str, pragmas: Optional[dict] = None, enable_sql_logging: bool = False) -> Engine:
+    return ENGINE_MANAGER.get_engine(db_path, False, pragmas, enable_sql_logging)
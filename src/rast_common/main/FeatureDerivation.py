@@ -0,0 +1,147 @@
+import logging
+from datetime import datetime
+from typing import Iterable, Mapping, Optional, Union
+
+import numpy as np
+
+from .SwitchAggFlowStats import SwitchAggFlowStats, lookup_switch_throughput
+from .TrainingDatabase import TrainingDataRowBatch
+
+_logger = logging.getLogger(__name__)
+
+_NANOSECONDS_PER_SECOND = 1000000000
+_NANOSECONDS_PER_MILLISECOND = 1000000
+
+_CONCURRENCY_FIELDS = (
+    "number_of_parallel_requests_start",
+    "number_of_parallel_requests_end",
+    "number_of_parallel_requests_finished",
+)
+
+
+def _requests_in_trailing_window(sorted_timestamps: np.ndarray, timestamps: np.ndarray, window: int) -> np.ndarray:
+    """
+    :return: number of requests within (timestamp - window, timestamp] of each timestamp, including the request itself
+    """
+    return (
+            np.searchsorted(sorted_timestamps, timestamps, side='right')
+            - np.searchsorted(sorted_timestamps, timestamps - window, side='right')
+    )
+
+
+def _derive_concurrency(starts: np.ndarray, response_times_ms: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Derives the number of parallel requests from the start and the response time of each request.
+    The request itself is not counted.
+    :return: columns of the number of parallel requests
+    at the start and at the end of each request and of the requests finished in between
+    """
+    ends = starts + response_times_ms * _NANOSECONDS_PER_MILLISECOND
+    sorted_starts = np.sort(starts)
+    sorted_ends = np.sort(ends)
+
+    ended_before_start = np.searchsorted(sorted_ends, starts, side='right')
+    ended_before_end = np.searchsorted(sorted_ends, ends, side='right')
+
+    return {
+        # started up to the start, minus those that already ended and the request itself
+        "number_of_parallel_requests_start":
+            np.searchsorted(sorted_starts, starts, side='right') - ended_before_start - 1,
+        # started up to the end, minus those that ended up to the end, which includes the request itself
+        "number_of_parallel_requests_end":
+            np.searchsorted(sorted_starts, ends, side='right') - ended_before_end,
+        "number_of_parallel_requests_finished":
+            ended_before_end - ended_before_start - 1,
+    }
+
+
+def _logfile_entries_to_columns(logfile_entries: Iterable[dict]) -> dict[str, list]:
+    logfile_entries = list(logfile_entries)
+
+    columns = {
+        "timestamp": [entry['time_stamp'] for entry in logfile_entries],
+        "request_type": [entry['request_type'] for entry in logfile_entries],
+        "request_execution_time_ms": [entry['response_time'] for entry in logfile_entries],
+    }
+
+    if all(field in entry for entry in logfile_entries for field in _CONCURRENCY_FIELDS):
+        for field in _CONCURRENCY_FIELDS:
+            columns[field] = [entry[field] for entry in logfile_entries]
+
+    return columns
+
+
+def derive_training_data_features(
+        logfile_entries: Union[Iterable[dict], TrainingDataRowBatch],
+        stats_by_switch_id: Optional[Mapping[int, SwitchAggFlowStats]] = None,
+        switch_id=None,
+        system_cpu_usage=None,
+        derive_concurrency: Optional[bool] = None
+) -> TrainingDataRowBatch:
+    """
+    Computes the features of the training data from the log file entries of a load test in one vectorized pass:
+    requests per second and per minute,
+    the number of parallel requests (if the log file entries do not contain them),
+    and the bytes and packets per second transmitted through the switch of each request.
+
+    Requests per second (minute) are the number of requests that started within the second (minute)
+    up to and including the start of the request, counting the request itself.
+    The timestamp of a log file entry is the start of the request.
+
+    The result can be passed to `ingest_training_data` or `insert_training_data`.
+
+    Example call:
+
+    `ingest_training_data(engine, derive_training_data_features(entries, stats_by_switch_id, switch_id=1))`
+    :param logfile_entries: log file entries as expected by `TrainingDataRow.from_logfile_entry`,
+    in which the number of parallel requests are optional, or a TrainingDataRowBatch.
+    All requests of the load test have to be passed at once, since the windows span neighbouring requests.
+    :param stats_by_switch_id: Optional statistics of the switches to look up the throughput with
+    :param switch_id: Optional switch id of each request, or a single switch id for all requests.
+    Defaults to the switch ids of a TrainingDataRowBatch or 0.
+    :param system_cpu_usage: Optional system CPU usage of each request, or a single value for all requests.
+    Defaults to the system CPU usage of a TrainingDataRowBatch or 0.
+    :param derive_concurrency: derive the number of parallel requests from the timestamps and response times.
+    By default, they are only derived if the log file entries do not contain them.
+    :return: training data rows in the order of the log file entries
+    """
+    begin = datetime.now()
+
+    if isinstance(logfile_entries, TrainingDataRowBatch):
+        columns = dict(logfile_entries.columns)
+    else:
+        columns = _logfile_entries_to_columns(logfile_entries)
+
+    if derive_concurrency is None:
+        derive_concurrency = not all(field in columns for field in _CONCURRENCY_FIELDS)
+
+    timestamps = np.asarray(columns["timestamp"], dtype='datetime64[ns]')
+    columns["timestamp"] = timestamps
+    starts = timestamps.view(np.int64)
+    sorted_starts = np.sort(starts)
+
+    columns["requests_per_second"] = _requests_in_trailing_window(sorted_starts, starts, _NANOSECONDS_PER_SECOND)
+    columns["requests_per_minute"] = _requests_in_trailing_window(sorted_starts, starts, 60 * _NANOSECONDS_PER_SECOND)
+
+    if derive_concurrency:
+        columns.update(_derive_concurrency(
+            starts,
+            np.asarray(columns["request_execution_time_ms"], dtype=np.int64)
+        ))
+
+    if switch_id is not None:
+        columns["switch_id"] = np.full(timestamps.shape, switch_id, dtype=np.int64)
+    if system_cpu_usage is not None:
+        columns["system_cpu_usage"] = np.full(timestamps.shape, system_cpu_usage, dtype=np.float64)
+
+    if stats_by_switch_id is not None:
+        (
+            columns["bytes_per_second_transmitted_through_switch"],
+            columns["packets_per_second_transmitted_through_switch"]
+        ) = lookup_switch_throughput(stats_by_switch_id, columns.get("switch_id", 0), timestamps)
+
+    batch = TrainingDataRowBatch(columns)
+
+    _logger.info("derive_training_data_features finished in %s s", (datetime.now() - begin).total_seconds())
+
+    return batch
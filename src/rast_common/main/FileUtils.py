@@ -1,6 +1,113 @@
+from array import array
 from datetime import datetime, timedelta
-from re import search
-from typing import Dict
+import json
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .Instrumentation import INSTRUMENTATION
+
+_TIMESTAMP_PATTERN = re.compile('\\[([^\\]]*)\\]')
+_RESPONSE_TIME_PATTERN = re.compile('(?<=Response time\\s)\\d*')
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+# Timestamps occurring more than once are moved apart by this many microseconds
+_DUPLICATE_TIMESTAMP_STEP_US = 100
+
+# Factor to convert a fraction of a second with the given number of digits to microseconds
+_FRACTION_TO_MICROSECONDS = [0, 100000, 10000, 1000, 100, 10, 1]
+
+
+def _write_json_atomically(path: str, obj, **dump_kwargs):
+    """
+    Writes the object as JSON to a temporary file next to the path and replaces the file at the path with it,
+    so that readers never see a partially written file and a crash while writing keeps the previous file.
+    :param dump_kwargs: keyword arguments of json.dump, e.g., indent
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(obj, file, **dump_kwargs)
+    os.replace(temporary_path, path)
+
+
+class _ResponseTimeLogParser:
+    """
+    Parses the "Response time" lines of a log file, e.g.,
+    `[2021-04-06 12:00:00,123] ... Response time 42 ms`.
+
+    Timestamps are represented as microseconds since the epoch (of the naive timestamps in the log file).
+    A timestamp that occurred before is moved to the next free slot in steps of 100 µs.
+    """
+
+    def __init__(self):
+        self._day_cache: Dict[str, int] = {}
+        # Consecutive lines are often logged within the same second
+        self._previous_second: Optional[str] = None
+        self._previous_second_since_epoch = 0
+        # Maps each occupied timestamp to a later timestamp that is possibly free.
+        # Following the chain finds the next free slot; the chain is shortened on every lookup.
+        self._next_free_timestamp: Dict[int, int] = {}
+
+    def _decode_second(self, text: str) -> int:
+        # fast path for the fixed format "%Y-%m-%d %H:%M:%S"
+        if len(text) == 19 and text[10] == ' ' and text[13] == ':' and text[16] == ':' and text[11:19:3].isdigit() \
+                and text[12:19:3].isdigit():
+            date = text[:10]
+            day = self._day_cache.get(date)
+            if day is None:
+                day = datetime.strptime(date, '%Y-%m-%d').toordinal() - _EPOCH_ORDINAL
+                self._day_cache[date] = day
+
+            return day * 86400 + int(text[11:13]) * 3600 + int(text[14:16]) * 60 + int(text[17:19])
+
+        return (datetime.strptime(text, '%Y-%m-%d %H:%M:%S') - _EPOCH) // timedelta(seconds=1)
+
+    def _decode_timestamp(self, text: str) -> int:
+        fraction = text[20:]
+        if text[19:20] == ',' and 0 < len(fraction) <= 6 and fraction.isdigit():
+            second = text[:19]
+            if second != self._previous_second:
+                self._previous_second_since_epoch = self._decode_second(second)
+                self._previous_second = second
+
+            return self._previous_second_since_epoch * 1000000 + int(fraction) * _FRACTION_TO_MICROSECONDS[len(fraction)]
+
+        time_stamp = datetime.strptime(text, '%Y-%m-%d %H:%M:%S,%f')
+        return (time_stamp - _EPOCH) // timedelta(microseconds=1)
+
+    def _claim_free_timestamp(self, time_stamp: int) -> int:
+        next_free_timestamp = self._next_free_timestamp
+
+        free_timestamp = time_stamp
+        while free_timestamp in next_free_timestamp:
+            free_timestamp = next_free_timestamp[free_timestamp]
+
+        # shorten the chain of all visited timestamps
+        while time_stamp != free_timestamp:
+            following_timestamp = next_free_timestamp[time_stamp]
+            next_free_timestamp[time_stamp] = free_timestamp
+            time_stamp = following_timestamp
+
+        next_free_timestamp[free_timestamp] = free_timestamp + _DUPLICATE_TIMESTAMP_STEP_US
+        return free_timestamp
+
+    def parse_line(self, line: str) -> Optional[Tuple[int, float]]:
+        """
+        :param line: line of a log file
+        :return: None if the line does not contain a response time,
+        otherwise the timestamp in microseconds since the epoch and the response time in seconds
+        """
+        if 'Response time' not in line:
+            return None
+
+        time_stamp = self._decode_timestamp(_TIMESTAMP_PATTERN.search(line).group(1))
+        response_time = _RESPONSE_TIME_PATTERN.search(line).group()
+
+        return self._claim_free_timestamp(time_stamp), float(response_time) / 1000
 
 
 def readResponseTimesFromLogFile(path: str) -> Dict[datetime, float]:
@@ -9,20 +116,45 @@ def readResponseTimesFromLogFile(path: str) -> Dict[datetime, float]:
     # if 'locust_log' not in path:
     #     return response_times
 
-    with open(path) as logfile:
+    parser = _ResponseTimeLogParser()
+
+    with INSTRUMENTATION.measure("readResponseTimesFromLogFile") as measurement, open(path) as logfile:
         for line in logfile:
-            if 'Response time' not in line:
+            entry = parser.parse_line(line)
+            if entry is None:
                 continue
 
-            time_stamp = datetime.strptime(search('\\[[^\\]]*\\]', line).group(), '[%Y-%m-%d %H:%M:%S,%f]')
-            response_time = search('(?<=Response time\\s)\\d*', line).group()
-
-            while True:
-                if time_stamp in response_times.keys():
-                    time_stamp += timedelta(microseconds=100)
-                else:
-                    break
+            response_times[_EPOCH + timedelta(microseconds=entry[0])] = entry[1]
 
-            response_times[time_stamp] = float(response_time) / 1000
+        measurement.end_phase("parse")
+        measurement.count(len(response_times), os.fstat(logfile.fileno()).st_size)
 
     return response_times
+
+
+def readResponseTimesFromLogFileAsArrays(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same as `readResponseTimesFromLogFile`, but without creating a datetime object per line.
+    :param path: Path to the log file
+    :return: Timestamps in nanoseconds since the epoch (of the naive timestamps in the log file, i.e.,
+    `timestamps.astype('datetime64[ns]')` are the keys of `readResponseTimesFromLogFile`)
+    and the response times in seconds, both in the order of the log file
+    """
+    time_stamps = array('q')
+    response_times = array('d')
+
+    parser = _ResponseTimeLogParser()
+
+    with INSTRUMENTATION.measure("readResponseTimesFromLogFileAsArrays") as measurement, open(path) as logfile:
+        for line in logfile:
+            entry = parser.parse_line(line)
+            if entry is None:
+                continue
+
+            time_stamps.append(entry[0])
+            response_times.append(entry[1])
+
+        measurement.end_phase("parse")
+        measurement.count(len(time_stamps), os.fstat(logfile.fileno()).st_size)
+
+    return np.frombuffer(time_stamps, dtype=np.int64) * 1000, np.frombuffer(response_times, dtype=np.float64)
@@ -0,0 +1,203 @@
+import threading
+import time
+from typing import Callable, NamedTuple
+
+
+# a NamedTuple instead of a dataclass, since importing dataclasses would slow down the import of the string helpers
+class InstrumentationEvent(NamedTuple):
+    """
+    Measurement of one call of an instrumented operation, e.g., one read of a training database file.
+    The durations only include the time spent within the operation,
+    not the time the consumer of a stream of rows spends between the rows.
+    """
+    operation: str
+    # e.g. {"query": 0.01, "fetch": 0.2, "construct": 0.4}
+    phase_durations_s: dict[str, float]
+    row_count: int
+    byte_count: int
+
+    @property
+    def duration_s(self) -> float:
+        return sum(self.phase_durations_s.values())
+
+
+class _Measurement:
+    """
+    Times the phases of one call of an operation, see `Instrumentation.measure`.
+    Each phase lasts from the end of the previous phase (or the begin of the measurement) until `end_phase`.
+    """
+    enabled = True
+
+    def __init__(self, instrumentation: "Instrumentation", operation: str):
+        self._instrumentation = instrumentation
+        self._operation = operation
+        self._phase_durations_s: dict[str, float] = {}
+        self._row_count = 0
+        self._byte_count = 0
+        self._phase_begin = time.perf_counter()
+
+    def end_phase(self, phase: str):
+        now = time.perf_counter()
+        self._phase_durations_s[phase] = self._phase_durations_s.get(phase, 0.) + now - self._phase_begin
+        self._phase_begin = now
+
+    def resume(self):
+        """ do not count the time since the end of the previous phase, e.g., the time the consumer of a stream took """
+        self._phase_begin = time.perf_counter()
+
+    def count(self, row_count: int = 0, byte_count: int = 0):
+        self._row_count += row_count
+        self._byte_count += byte_count
+
+    def finish(self):
+        self._instrumentation.emit(
+            InstrumentationEvent(self._operation, self._phase_durations_s, self._row_count, self._byte_count)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish()
+
+
+class _DisabledMeasurement:
+    """ Placeholder of `_Measurement` while no hook is registered, all methods do nothing. """
+    enabled = False
+
+    def end_phase(self, phase: str):
+        pass
+
+    def resume(self):
+        pass
+
+    def count(self, row_count: int = 0, byte_count: int = 0):
+        pass
+
+    def finish(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_DISABLED_MEASUREMENT = _DisabledMeasurement()
+
+
+class Instrumentation:
+    """
+    Registry of hooks, which receive an InstrumentationEvent per call of an instrumented operation:
+    the readers and insert functions of the training database, the existence check of the training data of a log file,
+    the log file parsers and the updates of the switch statistics.
+    Reads of partitioned training databases emit one event per partition.
+
+    Instrumentation is disabled as long as no hook is registered,
+    the operations then only call methods of a shared placeholder that do nothing.
+    Hooks are called in the thread of the operation, so they should return quickly, e.g., by updating counters
+    (see InstrumentationCounters) that are exported to a monitoring system or written to a structured log.
+
+    Example:
+
+    ```
+    counters = InstrumentationCounters()
+    INSTRUMENTATION.add_hook(counters)
+    read_all_performance_metrics_from_db(r"db/trainingdata_2021-04-06.db")
+    print(counters.snapshot())
+    ```
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # replaced instead of modified, so that emit iterates without holding the lock
+        self._hooks: tuple[Callable[[InstrumentationEvent], None], ...] = ()
+        self.enabled = False
+
+    def add_hook(self, hook: Callable[[InstrumentationEvent], None]):
+        with self._lock:
+            self._hooks = self._hooks + (hook,)
+            self.enabled = True
+
+    def remove_hook(self, hook: Callable[[InstrumentationEvent], None]):
+        with self._lock:
+            self._hooks = tuple(registered_hook for registered_hook in self._hooks if registered_hook is not hook)
+            self.enabled = len(self._hooks) > 0
+
+    def measure(self, operation: str):
+        """
+        Example:
+
+        ```
+        with INSTRUMENTATION.measure("read_training_data") as measurement:
+            result = connection.execute(stmt)
+            measurement.end_phase("query")
+        ```
+        :param operation: name of the operation, usually the name of the instrumented function
+        :return: context manager timing the phases of one call of the operation,
+        which emits the event when the context is left or `finish` is called
+        """
+        if not self.enabled:
+            return _DISABLED_MEASUREMENT
+        return _Measurement(self, operation)
+
+    def count(self, operation: str, row_count: int = 1, byte_count: int = 0):
+        """ emit an event without phases, for operations too short to be timed, e.g., an update of switch statistics """
+        if self.enabled:
+            self.emit(InstrumentationEvent(operation, {}, row_count, byte_count))
+
+    def emit(self, event: InstrumentationEvent):
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception:
+                # a failing hook must not fail the instrumented operation.
+                # logging is imported here, since importing it would slow down the import of the string helpers
+                import logging
+                logging.getLogger(__name__).exception("instrumentation hook %r failed", hook)
+
+
+INSTRUMENTATION = Instrumentation()
+
+
+class InstrumentationCounters:
+    """
+    Hook accumulating the events per operation: the number of calls, rows, bytes and the duration of each phase.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict] = {}
+
+    def __call__(self, event: InstrumentationEvent):
+        with self._lock:
+            counters = self._counters.get(event.operation)
+            if counters is None:
+                counters = {'calls': 0, 'row_count': 0, 'byte_count': 0, 'duration_s': 0., 'phase_durations_s': {}}
+                self._counters[event.operation] = counters
+
+            counters['calls'] += 1
+            counters['row_count'] += event.row_count
+            counters['byte_count'] += event.byte_count
+            counters['duration_s'] += event.duration_s
+            phase_durations_s = counters['phase_durations_s']
+            for phase, duration_s in event.phase_durations_s.items():
+                phase_durations_s[phase] = phase_durations_s.get(phase, 0.) + duration_s
+
+    def snapshot(self) -> dict[str, dict]:
+        """
+        :return: copy of the counters per operation, e.g.,
+        {"insert_training_data": {"calls": 1, "row_count": 1000, "byte_count": 0, "duration_s": 0.05,
+        "phase_durations_s": {"prepare": 0.01, "insert": 0.03, ...}}}
+        """
+        with self._lock:
+            return {
+                operation: dict(counters, phase_durations_s=dict(counters['phase_durations_s']))
+                for operation, counters in self._counters.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
@@ -0,0 +1,520 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import BigInteger, Engine, Connection, String, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .FileUtils import _ResponseTimeLogParser, _EPOCH, _write_json_atomically
+from .Instrumentation import INSTRUMENTATION
+from .TrainingDatabase import DEFAULT_INGESTION_BATCH_SIZE, Base, IngestionStatistics, TrainingDataRowBatch, \
+    create_training_data_table, _insert_training_data_in_batches, _resolve_version
+from ..Version import TrainingDataEntityVersion
+
+_logger = logging.getLogger(__name__)
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+# Maximum number of bytes read from a log file per call of read_new_lines,
+# so that following a large log file from the beginning does not hold the whole file in memory
+DEFAULT_MAX_BYTES_PER_READ = 16 * 1024 * 1024
+
+# Number of bytes at the beginning of a log file whose hash detects that the log file was truncated and rewritten
+_FINGERPRINT_LENGTH = 1024
+
+_UPSERT_FOLLOWED_LOG_FILE_SQL = (
+    "INSERT INTO followed_log_files (path, device, inode, byte_offset, fingerprint_length, fingerprint) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (path) DO UPDATE SET "
+    "device = excluded.device, "
+    "inode = excluded.inode, "
+    "byte_offset = excluded.byte_offset, "
+    "fingerprint_length = excluded.fingerprint_length, "
+    "fingerprint = excluded.fingerprint"
+)
+
+
+class FollowedLogFileEntity(Base):
+    """
+    Position within each log file followed by ingest_followed_log_files,
+    which is updated in the transaction that inserts the rows read up to that position,
+    so that a restarted ingestion neither inserts rows a second time nor loses rows.
+    The device and inode are null if the log file was rotated and the new log file is read from the beginning.
+    """
+    __tablename__ = 'followed_log_files'
+    path: Mapped[str] = mapped_column(String, primary_key=True)
+    device: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    inode: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    byte_offset: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    fingerprint_length: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    fingerprint: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+
+
+class _FollowedFile:
+    __slots__ = ("path", "identity", "offset", "fingerprint", "file")
+
+    def __init__(
+            self,
+            path: str,
+            identity: Optional[Tuple[int, int]] = None,
+            offset: int = 0,
+            fingerprint: Optional[Tuple[int, str]] = None
+    ):
+        self.path = path
+        # device and inode of the file, which change when the log file is rotated
+        self.identity = identity
+        # position after the last complete line that was read
+        self.offset = offset
+        # length and hash of the beginning of the file that was read,
+        # which change when the log file is truncated, also if it grew beyond the offset again since
+        self.fingerprint = fingerprint
+        self.file = None
+
+
+class LogFollower:
+    """
+    Follows growing log files like `tail -F` and reads the complete lines appended since the previous read,
+    instead of reading the log files from the beginning again.
+
+    The position within each log file can be stored in a JSON checkpoint file,
+    so that a restarted follower continues where the previous one stopped.
+    A log file that is rotated, i.e., renamed and replaced by a new file, is read to the end before the new file.
+    If it was rotated while it was not followed, the rotated file is looked up next to the log file,
+    which works as long as the rotated file is neither compressed nor moved to another directory.
+    A log file that is truncated (e.g. by the copytruncate option of logrotate) is read from the beginning again.
+    Truncation is detected by the size of the log file and by a hash of its first bytes,
+    so that a log file that grew beyond the previous position again before the next read is detected as well.
+
+    Example:
+
+    ```
+    with LogFollower(["logs/locust_log.log"], "logs/locust_log.checkpoint.json") as follower:
+        for path, response_times in follower.follow_response_times(poll_interval_s=5):
+            ...
+    ```
+    """
+
+    def __init__(
+            self,
+            paths: Iterable[str],
+            checkpoint_path: Optional[str] = None,
+            max_bytes_per_read: int = DEFAULT_MAX_BYTES_PER_READ,
+            encoding: str = 'utf-8'
+    ):
+        """
+        :param paths: paths of the log files, which do not need to exist yet
+        :param checkpoint_path: optional path of the JSON file to store the positions within the log files in,
+        see save_checkpoint
+        :param max_bytes_per_read: maximum number of bytes read from a log file per call of read_new_lines,
+        unless a single line is longer
+        :param encoding: encoding of the log files
+        """
+        self._checkpoint_path = checkpoint_path
+        self._max_bytes_per_read = max_bytes_per_read
+        self._encoding = encoding
+        self._has_backlog = False
+
+        self._followed_files = [_FollowedFile(os.path.abspath(path)) for path in paths]
+
+        if checkpoint_path is not None:
+            self.restore_positions(_read_checkpoint(checkpoint_path))
+
+    @property
+    def has_backlog(self) -> bool:
+        """ True if the previous read stopped before the end of a log file, so reading again returns more lines """
+        return self._has_backlog
+
+    def read_new_lines(self) -> List[Tuple[str, List[str]]]:
+        """
+        Reads the complete lines appended to the log files since the previous read.
+        A last line without line break is read once it is complete.
+        :return: path and new lines of each log file with new lines
+        """
+        self._has_backlog = False
+        new_lines = []
+
+        for followed in self._followed_files:
+            measurement = INSTRUMENTATION.measure("LogFollower.read_new_lines")
+
+            data = self._read_new_data(followed)
+            if len(data) == 0:
+                # polls without new lines are not reported
+                continue
+
+            lines = data.decode(self._encoding, errors='replace').splitlines(keepends=True)
+            measurement.end_phase("read")
+            measurement.count(len(lines), len(data))
+            measurement.finish()
+
+            new_lines.append((followed.path, lines))
+
+        return new_lines
+
+    def read_new_response_times(self) -> List[Tuple[str, Dict[datetime, float]]]:
+        """
+        Incremental version of `readResponseTimesFromLogFile`.
+        Timestamps occurring more than once are only moved apart within the lines of the same read.
+        :return: path and new response times of each log file with new "Response time" lines
+        """
+        new_response_times = []
+
+        for path, lines in self.read_new_lines():
+            parser = _ResponseTimeLogParser()
+            response_times = {}
+
+            for line in lines:
+                entry = parser.parse_line(line)
+                if entry is None:
+                    continue
+
+                response_times[_EPOCH + timedelta(microseconds=entry[0])] = entry[1]
+
+            if len(response_times) > 0:
+                new_response_times.append((path, response_times))
+
+        return new_response_times
+
+    def follow_response_times(
+            self,
+            poll_interval_s: float = 1.0,
+            stop_event: Optional[threading.Event] = None
+    ) -> Iterable[Tuple[str, Dict[datetime, float]]]:
+        """
+        Polls the log files for new response times until the stop event is set, or forever.
+        The checkpoint is saved after the consumer received the response times of a poll,
+        so that a restarted follower returns the response times of an interrupted poll again instead of losing them.
+        :param poll_interval_s: seconds to wait after a poll that read the log files to the end
+        :param stop_event: optional event to stop following the log files
+        :return: stream of the path and new response times of a log file, see read_new_response_times
+        """
+        while stop_event is None or not stop_event.is_set():
+            yield from self.read_new_response_times()
+
+            self.save_checkpoint()
+
+            if not self._has_backlog:
+                _wait(poll_interval_s, stop_event)
+
+    def positions(self) -> Dict[str, dict]:
+        """
+        :return: position within each log file by path, as stored in the checkpoint file,
+        device and inode are None if the log file is read from the beginning, e.g., after it was rotated
+        """
+        return {
+            followed.path: {
+                'device': None if followed.identity is None else followed.identity[0],
+                'inode': None if followed.identity is None else followed.identity[1],
+                'offset': followed.offset,
+                'fingerprint': followed.fingerprint
+            }
+            for followed in self._followed_files
+        }
+
+    def restore_positions(self, positions: Dict[str, dict]):
+        """
+        Continues reading the log files at the given positions, see positions.
+        Log files that are not followed are ignored.
+        :param positions: position within each log file by path
+        """
+        for followed in self._followed_files:
+            position = positions.get(followed.path)
+            if position is None:
+                continue
+
+            if followed.file is not None:
+                followed.file.close()
+                followed.file = None
+
+            # checkpoints written before fingerprints were stored only detect truncation by the size of the file
+            fingerprint = position.get('fingerprint')
+            followed.identity = None if position['device'] is None else (position['device'], position['inode'])
+            followed.offset = position['offset']
+            followed.fingerprint = None if fingerprint is None else tuple(fingerprint)
+
+    def save_checkpoint(self):
+        """ store the positions within the log files in the checkpoint file, if a checkpoint path was given """
+        if self._checkpoint_path is None:
+            return
+
+        _write_checkpoint(self._checkpoint_path, self.positions())
+
+    def close(self):
+        for followed in self._followed_files:
+            if followed.file is not None:
+                followed.file.close()
+                followed.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self, followed: _FollowedFile) -> bytes:
+        """
+        :return: rest of the log file the checkpoint refers to, if the log file was rotated since
+        """
+        try:
+            file = open(followed.path, 'rb')
+        except FileNotFoundError:
+            return b""
+
+        stat = os.fstat(file.fileno())
+        identity = (stat.st_dev, stat.st_ino)
+        data = b""
+
+        if followed.identity is not None and identity != followed.identity:
+            data = self._read_rest_of_rotated_file(followed)
+            followed.offset = 0
+            followed.fingerprint = None
+
+        followed.file = file
+        followed.identity = identity
+
+        return data
+
+    def _read_rest_of_rotated_file(self, followed: _FollowedFile) -> bytes:
+        """
+        :return: rest of the log file the checkpoint refers to, if it is found next to the log file
+        under a name starting with the name of the log file without extension, e.g., "locust_log.log.1"
+        """
+        directory = os.path.dirname(followed.path)
+        name_prefix = os.path.splitext(os.path.basename(followed.path))[0]
+
+        for name in sorted(os.listdir(directory)):
+            if not name.startswith(name_prefix):
+                continue
+
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            if (stat.st_dev, stat.st_ino) == followed.identity:
+                with open(path, 'rb') as rotated_file:
+                    rotated_file.seek(followed.offset)
+                    return _with_line_break(rotated_file.read())
+
+        return b""
+
+    def _read_new_data(self, followed: _FollowedFile) -> bytes:
+        """
+        :return: complete lines appended to the log file since the previous read
+        """
+        data = b""
+
+        if followed.file is None:
+            data = self._open(followed)
+            if followed.file is None:
+                return data
+
+        if _was_truncated(followed):
+            followed.offset = 0
+            followed.fingerprint = None
+
+        followed.file.seek(followed.offset)
+        chunk = followed.file.read(self._max_bytes_per_read)
+        reached_end = len(chunk) < self._max_bytes_per_read
+        end_of_lines = chunk.rfind(b"\n") + 1
+        while end_of_lines == 0 and not reached_end:
+            # a single line is longer than max_bytes_per_read
+            more = followed.file.read(self._max_bytes_per_read)
+            reached_end = len(more) < self._max_bytes_per_read
+            chunk += more
+            end_of_lines = chunk.rfind(b"\n") + 1
+
+        data += chunk[:end_of_lines]
+        followed.offset += end_of_lines
+        if followed.fingerprint is None or followed.fingerprint[0] < min(followed.offset, _FINGERPRINT_LENGTH):
+            followed.fingerprint = _fingerprint(followed.file, min(followed.offset, _FINGERPRINT_LENGTH))
+
+        if not reached_end:
+            self._has_backlog = True
+            return data
+
+        try:
+            stat = os.stat(followed.path)
+        except FileNotFoundError:
+            # the log file was renamed, but not replaced yet, so the writer may still append to the renamed file
+            return data
+
+        if (stat.st_dev, stat.st_ino) != followed.identity:
+            # the log file was rotated: read the rest of the renamed file, which the writer no longer appends to,
+            # and continue with the new log file
+            followed.file.seek(followed.offset)
+            data += _with_line_break(followed.file.read())
+            followed.file.close()
+            followed.file = None
+            followed.identity = None
+            followed.offset = 0
+            followed.fingerprint = None
+            self._has_backlog = True
+        elif stat.st_size < followed.offset:
+            # the log file was truncated
+            followed.offset = 0
+            followed.fingerprint = None
+            self._has_backlog = True
+
+        return data
+
+
+def _fingerprint(file, length: int) -> Tuple[int, str]:
+    """ :return: length and hash of the first bytes of the file, as stored in the checkpoint """
+    # seek and read instead of os.pread, which is not available on Windows
+    position = file.tell()
+    file.seek(0)
+    data = file.read(length)
+    file.seek(position)
+    return length, hashlib.sha1(data).hexdigest()
+
+
+def _was_truncated(followed: _FollowedFile) -> bool:
+    if os.fstat(followed.file.fileno()).st_size < followed.offset:
+        return True
+    # the beginning of the log file changes when it is truncated and rewritten
+    if followed.fingerprint is None:
+        return False
+    return _fingerprint(followed.file, followed.fingerprint[0]) != followed.fingerprint
+
+
+def _with_line_break(data: bytes) -> bytes:
+    # the last line of a rotated log file is complete, even without line break
+    if len(data) == 0 or data.endswith(b"\n"):
+        return data
+    return data + b"\n"
+
+
+def _wait(seconds: float, stop_event: Optional[threading.Event]):
+    if stop_event is None:
+        time.sleep(seconds)
+    else:
+        stop_event.wait(seconds)
+
+
+def _read_checkpoint(path: str) -> dict:
+    """
+    :return: position within each log file by path, empty if the checkpoint file does not exist yet
+    """
+    if not os.path.isfile(path):
+        return {}
+
+    with open(path) as file:
+        checkpoint = json.load(file)
+
+    if checkpoint.get('format_version') != CHECKPOINT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format version {checkpoint.get('format_version')} in {path}")
+
+    return checkpoint['files']
+
+
+def _write_checkpoint(path: str, positions: dict):
+    _write_json_atomically(
+        path, {'format_version': CHECKPOINT_FORMAT_VERSION, 'files': positions}, indent=2, sort_keys=True
+    )
+
+
+def _read_followed_log_files(connection: Connection) -> Dict[str, dict]:
+    """ :return: position within each log file stored in the training database, see LogFollower.positions """
+    return {
+        entity.path: {
+            'device': entity.device,
+            'inode': entity.inode,
+            'offset': entity.byte_offset,
+            'fingerprint': None if entity.fingerprint is None else (entity.fingerprint_length, entity.fingerprint)
+        }
+        for entity in connection.execute(select(FollowedLogFileEntity.__table__))
+    }
+
+
+def _upsert_followed_log_file(connection: Connection, path: str, position: dict):
+    fingerprint = position['fingerprint'] or (None, None)
+    connection.exec_driver_sql(
+        _UPSERT_FOLLOWED_LOG_FILE_SQL,
+        (path, position['device'], position['inode'], position['offset'], fingerprint[0], fingerprint[1])
+    )
+
+
+def ingest_followed_log_files(
+        follower: LogFollower,
+        engine: Engine,
+        parse_log_lines: Callable[[List[str]], Iterable[dict]],
+        poll_interval_s: float = 1.0,
+        stop_event: Optional[threading.Event] = None,
+        batch_size: int = DEFAULT_INGESTION_BATCH_SIZE,
+        version: Optional[TrainingDataEntityVersion] = None
+) -> IngestionStatistics:
+    """
+    Inserts the entries appended to the followed log files into the training database until the stop event is set,
+    so that the training database stays up to date without reading the log files from the beginning again.
+    The position within each log file is stored in the followed_log_files table, see FollowedLogFileEntity,
+    in the transaction that inserts the entries read up to that position,
+    so that a restart continues after the last committed entries, and each entry is inserted exactly once.
+    The positions stored in the training database take precedence over the checkpoint file of the follower,
+    which is not saved.
+
+    Example call:
+
+    `ingest_followed_log_files(LogFollower(["logs/rast_log.log"], "logs/rast_log.json"), engine, parse_rast_log_lines)`
+    :param follower: follower of the log files
+    :param engine: Engine of the training database
+    :param parse_log_lines: Function that parses new lines of a log file into log file entries
+    as expected by `TrainingDataRow.from_logfile_entry`
+    :param poll_interval_s: seconds to wait after a poll that read the log files to the end
+    :param stop_event: optional event to stop following the log files, otherwise the log files are followed forever
+    :param batch_size: number of rows inserted per executemany call,
+    the rows of a log file read by a poll are inserted in one transaction
+    :param version: Version of the training data schema, defaults to the selected version
+    :return: number of inserted rows and the duration of the ingestion
+    """
+    version = _resolve_version(version)
+
+    begin = datetime.now()
+
+    create_training_data_table(engine, version)
+    FollowedLogFileEntity.__table__.create(engine, checkfirst=True)
+
+    row_count = 0
+
+    with engine.connect() as connection:
+        follower.restore_positions(_read_followed_log_files(connection))
+        connection.rollback()
+
+        while stop_event is None or not stop_event.is_set():
+            for path, lines in follower.read_new_lines():
+                with INSTRUMENTATION.measure("ingest_followed_log_files") as measurement:
+                    batch = TrainingDataRowBatch.from_logfile_entries(parse_log_lines(lines))
+                    measurement.end_phase("parse")
+
+                    if len(batch) > 0:
+                        # stable, so that entries with the same timestamp keep the order of the log file
+                        row_count += _insert_training_data_in_batches(
+                            connection,
+                            [batch.take(np.argsort(batch.columns["timestamp"], kind='stable'))],
+                            batch_size,
+                            version,
+                            path,
+                            commit_each_batch=False,
+                            measurement=measurement
+                        )
+
+                    # also without entries, so that the lines are not parsed again
+                    _upsert_followed_log_file(connection, path, follower.positions()[path])
+                    connection.commit()
+                    measurement.end_phase("commit")
+
+            if not follower.has_backlog:
+                _wait(poll_interval_s, stop_event)
+
+    statistics = IngestionStatistics(row_count, (datetime.now() - begin).total_seconds())
+
+    _logger.info("ingest_followed_log_files inserted %s rows in %s s (%.0f rows/s)",
+                 statistics.row_count, statistics.duration_s, statistics.rows_per_second)
+
+    return statistics
@@ -0,0 +1,141 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from glob import glob
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from .Instrumentation import INSTRUMENTATION
+from .StringUtils import dir_path
+from .TrainingDatabase import create_training_data_table, training_data_exists_in_db_using_sqlalchemy, \
+    IngestionStatistics, DEFAULT_INGESTION_BATCH_SIZE, _insert_training_data_in_batches, _resolve_version, \
+    TrainingDataRowBatch, _record_log_file_in_ingestion_manifest
+from ..Version import TrainingDataEntityVersion
+
+_logger = logging.getLogger(__name__)
+
+# Rough estimate of the memory a worker needs while parsing a log file, relative to the size of the file
+_PARSING_MEMORY_PER_LOG_FILE_BYTE = 3
+
+
+def _parse_log_file_to_column_batch(parse_log_file: Callable[[str], Iterable[dict]], path: str) -> TrainingDataRowBatch:
+    """
+    Runs in a worker process: parses the log file
+    and converts the log file entries to a column batch sorted by timestamp.
+    """
+    batch = TrainingDataRowBatch.from_logfile_entries(parse_log_file(path))
+
+    # stable, so that entries with the same timestamp keep the order of the log file
+    return batch.take(np.argsort(batch.columns["timestamp"], kind='stable'))
+
+
+def ingest_log_directory(
+        directory: str,
+        engine: Engine,
+        parse_log_file: Callable[[str], Iterable[dict]],
+        file_pattern: str = '*.log',
+        max_workers: Optional[int] = None,
+        memory_budget_mb: int = 1024,
+        batch_size: int = DEFAULT_INGESTION_BATCH_SIZE,
+        version: Optional[TrainingDataEntityVersion] = None
+) -> IngestionStatistics:
+    """
+    Parses the log files of a directory in parallel and inserts the entries into the training database.
+    Log files whose day is already present in the database are skipped,
+    see `training_data_exists_in_db_using_sqlalchemy`.
+
+    The entries of each log file are sorted by timestamp and the log files are inserted in the order of their paths,
+    independent of the order in which the workers finish, so that the result is deterministic.
+    The entries of different log files are not merged by timestamp:
+    each log file is inserted within one transaction together with its entry in the ingestion manifest,
+    so that a log file interrupted by a crash is neither partially inserted nor recorded as ingested.
+    For daily log files named by date, the order of the paths is the order of the timestamps.
+    Log files without entries are recorded in the manifest as well, so that they are not parsed again.
+
+    Example call:
+
+    `ingest_log_directory("logs", engine, parse_locust_log_file, "locust_log_*.log", max_workers=8)`
+    :param directory: Directory containing the log files
+    :param engine: Engine of the training database
+    :param parse_log_file: Function that parses a log file into log file entries
+    as expected by `TrainingDataRow.from_logfile_entry`. Must be picklable, i.e., defined at module level.
+    :param file_pattern: Glob pattern of the log files within the directory
+    :param max_workers: Number of worker processes, defaults to the number of CPUs
+    :param memory_budget_mb: Estimated memory that the log files being parsed or waiting for insertion may use.
+    At least one log file is parsed at a time, regardless of its size.
+    :param batch_size: number of rows inserted per statement, each log file is inserted within one transaction
+    :param version: Version of the training data schema, defaults to the selected version
+    :return: number of inserted rows and the duration of the ingestion
+    """
+    version = _resolve_version(version)
+
+    begin = datetime.now()
+
+    paths = sorted(glob(os.path.join(dir_path(directory), file_pattern)))
+
+    create_training_data_table(engine, version)
+
+    with Session(engine) as session:
+        paths = [path for path in paths if not _log_file_was_ingested(session, path)]
+
+    memory_budget = memory_budget_mb * 1024 * 1024
+    row_count = 0
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, engine.connect() as connection, \
+            INSTRUMENTATION.measure("ingest_log_directory") as measurement:
+        pending = deque()
+        reserved_memory = 0
+        next_path_index = 0
+
+        while next_path_index < len(paths) or len(pending) > 0:
+            # submit log files as long as they fit into the memory budget
+            while next_path_index < len(paths):
+                path = paths[next_path_index]
+                estimated_memory = os.path.getsize(path) * _PARSING_MEMORY_PER_LOG_FILE_BYTE
+                if len(pending) > 0 and reserved_memory + estimated_memory > memory_budget:
+                    break
+
+                future = executor.submit(_parse_log_file_to_column_batch, parse_log_file, path)
+                pending.append((path, estimated_memory, future))
+                reserved_memory += estimated_memory
+                next_path_index += 1
+
+            path, estimated_memory, future = pending.popleft()
+            batch = future.result()
+            # the log files are parsed by the workers, so this is the time spent waiting for them
+            measurement.end_phase("parse")
+            measurement.count(byte_count=os.path.getsize(path))
+
+            row_count += _insert_training_data_in_batches(
+                connection,
+                [batch],
+                batch_size,
+                version,
+                path,
+                commit_each_batch=False,
+                measurement=measurement
+            )
+            _record_log_file_in_ingestion_manifest(connection, path)
+            connection.commit()
+            measurement.end_phase("commit")
+            reserved_memory -= estimated_memory
+
+    statistics = IngestionStatistics(row_count, (datetime.now() - begin).total_seconds())
+
+    _logger.info("ingest_log_directory inserted %s rows from %s log files in %s s (%.0f rows/s)",
+                 statistics.row_count, len(paths), statistics.duration_s, statistics.rows_per_second)
+
+    return statistics
+
+
+def _log_file_was_ingested(session: Session, path: str) -> bool:
+    try:
+        return training_data_exists_in_db_using_sqlalchemy(session, path)
+    except (AttributeError, ValueError):
+        # the path does not contain a date, so we cannot know
+        return False
@@ -0,0 +1,215 @@
+import logging
+import os
+from datetime import datetime, date
+from itertools import islice
+from typing import Optional
+
+from sqlalchemy import Engine, func, select
+from sqlalchemy.orm import Session
+
+from .EngineManager import get_read_engine
+from .Instrumentation import INSTRUMENTATION
+from .StringUtils import get_date_from_string
+from .TrainingDataPartitions import CATALOG_FORMAT_VERSION, PARTITIONINGS, is_partitioned_training_database, \
+    read_training_data_catalog, write_training_data_catalog, partition_of_day
+from .TrainingDatabase import DEFAULT_INGESTION_BATCH_SIZE, IngestionManifestEntity, IngestionStatistics, \
+    create_connection_using_sqlalchemy, create_training_data_table, training_data_exists_in_db_using_sqlalchemy, \
+    read_training_data_batches_from_db, _resolve_version, _training_data_fields, _training_data_values, \
+    _insert_training_data_in_batches
+from ..Version import TrainingDataEntityVersion
+
+_logger = logging.getLogger(__name__)
+
+
+def create_partitioned_training_database(directory: str, partitioning: str = 'day'):
+    """ create an empty partitioned training database, which stores the training data of each day or week
+    in a separate SQLite database file.
+    The read functions of TrainingDatabase and TrainingDatabaseUtils accept the directory instead of a database file.
+    Does nothing if the directory already contains a partitioned training database with the same partitioning.
+    :param directory: Directory of the partitioned training database
+    :param partitioning: 'day' or 'week'
+    """
+    if partitioning not in PARTITIONINGS:
+        raise ValueError(f"Unknown partitioning {partitioning}, expected one of {PARTITIONINGS}")
+
+    if is_partitioned_training_database(directory):
+        existing_partitioning = read_training_data_catalog(directory)['partitioning']
+        if existing_partitioning != partitioning:
+            raise ValueError(f"{directory} is already partitioned per {existing_partitioning}")
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    write_training_data_catalog(directory, {
+        'format_version': CATALOG_FORMAT_VERSION,
+        'partitioning': partitioning,
+        'partitions': {}
+    })
+
+
+def _create_partition(
+        directory: str,
+        catalog: dict,
+        file_name: str,
+        first_day: date,
+        last_day: date,
+        version: TrainingDataEntityVersion
+) -> Engine:
+    engine = create_connection_using_sqlalchemy(os.path.join(directory, file_name))
+    create_training_data_table(engine, version)
+
+    if file_name not in catalog['partitions']:
+        catalog['partitions'][file_name] = {
+            'first_day': first_day.isoformat(),
+            'last_day': last_day.isoformat(),
+            'row_count': 0
+        }
+        # register the partition before inserting into it, so that no rows are stored outside the catalog
+        write_training_data_catalog(directory, catalog)
+
+    return engine
+
+
+def _partition_row_count(engine: Engine) -> int:
+    with Session(engine) as session:
+        return session.execute(select(func.coalesce(func.sum(IngestionManifestEntity.row_count), 0))).scalar()
+
+
+def ingest_partitioned_training_data(
+        directory: str,
+        rows,
+        path_to_log_file: Optional[str] = None,
+        batch_size: int = DEFAULT_INGESTION_BATCH_SIZE,
+        version: Optional[TrainingDataEntityVersion] = None
+) -> IngestionStatistics:
+    """ stream training data into the partitions of a partitioned training database,
+    committing one transaction per batch and partition.
+    Partitions are created as rows of new days or weeks arrive.
+
+    Example call:
+
+    `ingest_partitioned_training_data("db/trainingdata", read_training_data_batches_from_db("db/trainingdata.db"))`
+    :param directory: Directory of the partitioned training database, see create_partitioned_training_database
+    :param rows: iterable of TrainingDataRow objects or column batches, see ingest_training_data
+    :param path_to_log_file: optional path of the log file the rows were read from
+    :param batch_size: number of rows split into the partitions at a time
+    :param version: Version of the training data schema, defaults to the selected version
+    :return: number of inserted rows and the duration of the ingestion
+    """
+    version = _resolve_version(version)
+
+    begin = datetime.now()
+
+    catalog = read_training_data_catalog(directory)
+    fields = _training_data_fields(version)
+    values = _training_data_values(rows, fields)
+
+    partition_of_stored_day = {}
+    engines = {}
+    row_count = 0
+
+    with INSTRUMENTATION.measure("ingest_partitioned_training_data") as measurement:
+        try:
+            while True:
+                batch = list(islice(values, batch_size))
+                measurement.end_phase("prepare")
+                if len(batch) == 0:
+                    break
+
+                values_per_partition = {}
+                for row_values in batch:
+                    # the values contain the timestamp as stored, i.e., starting with "YYYY-MM-DD"
+                    stored_day = row_values[0][:10]
+                    partition = partition_of_stored_day.get(stored_day)
+                    if partition is None:
+                        partition = partition_of_day(date.fromisoformat(stored_day), catalog['partitioning'])
+                        partition_of_stored_day[stored_day] = partition
+                    partition_values = values_per_partition.get(partition)
+                    if partition_values is None:
+                        values_per_partition[partition] = [row_values]
+                    else:
+                        partition_values.append(row_values)
+                measurement.end_phase("split")
+
+                for (file_name, first_day, last_day), partition_values in values_per_partition.items():
+                    engine = engines.get(file_name)
+                    if engine is None:
+                        engine = _create_partition(directory, catalog, file_name, first_day, last_day, version)
+                        engines[file_name] = engine
+                        measurement.end_phase("create_partitions")
+
+                    with engine.connect() as connection:
+                        _insert_training_data_in_batches(
+                            connection,
+                            partition_values,
+                            batch_size,
+                            version,
+                            path_to_log_file,
+                            commit_each_batch=True,
+                            measurement=measurement
+                        )
+
+                row_count += len(batch)
+        finally:
+            for file_name, engine in engines.items():
+                catalog['partitions'][file_name]['row_count'] = _partition_row_count(engine)
+                engine.dispose()
+            write_training_data_catalog(directory, catalog)
+            measurement.end_phase("catalog")
+
+    statistics = IngestionStatistics(row_count, (datetime.now() - begin).total_seconds())
+
+    _logger.info("ingest_partitioned_training_data inserted %s rows into %s partitions in %s s (%.0f rows/s)",
+                 statistics.row_count, len(engines), statistics.duration_s, statistics.rows_per_second)
+
+    return statistics
+
+
+def partitioned_training_data_exists(directory: str, path_to_log_file: str) -> bool:
+    """ check whether the training data of the day the log file was written has already been inserted
+    into a partitioned training database, see training_data_exists_in_db_using_sqlalchemy.
+    :param directory: Directory of the partitioned training database
+    :param path_to_log_file: path to a log file containing the date in the format "%Y-%m-%d"
+    :return: True if training data of that day exists
+    """
+    catalog = read_training_data_catalog(directory)
+    day = datetime.strptime(get_date_from_string(path_to_log_file), "%Y-%m-%d").date()
+    file_name, _, _ = partition_of_day(day, catalog['partitioning'])
+
+    if file_name not in catalog['partitions']:
+        return False
+
+    with Session(get_read_engine(os.path.join(directory, file_name))) as session:
+        return training_data_exists_in_db_using_sqlalchemy(session, path_to_log_file)
+
+
+def partition_training_database(
+        db_path: str,
+        directory: str,
+        partitioning: str = 'day',
+        batch_size: int = DEFAULT_INGESTION_BATCH_SIZE,
+        version: Optional[TrainingDataEntityVersion] = None
+) -> IngestionStatistics:
+    """ copy the training data of a single SQLite database file into a partitioned training database.
+    The ingestion manifest and the rollups of the partitions are rebuilt from the copied rows,
+    the paths of the log files recorded in the manifest of the source are not copied.
+
+    Example call:
+
+    `partition_training_database(r"db/trainingdata_2021-04-06.db", r"db/trainingdata_2021-04-06", 'week')`
+    :param db_path: Path to SQLite database file to copy
+    :param directory: Directory of the partitioned training database
+    :param partitioning: 'day' or 'week'
+    :param batch_size: number of rows read and split into the partitions at a time
+    :param version: Version of the training data schema, defaults to the selected version
+    :return: number of copied rows and the duration of the copy
+    """
+    version = _resolve_version(version)
+
+    create_partitioned_training_database(directory, partitioning)
+
+    return ingest_partitioned_training_data(
+        directory,
+        read_training_data_batches_from_db(db_path, version=version, batch_size=batch_size),
+        batch_size=batch_size,
+        version=version
+    )
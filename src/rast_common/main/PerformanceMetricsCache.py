@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+import pandas as pd
+from pandas import DataFrame
+from sqlalchemy import select, func
+
+from .EngineManager import get_read_engine
+from .FileUtils import _write_json_atomically
+from .TrainingDataPartitions import is_partitioned_training_database
+from .TrainingDatabase import _training_data_entity
+from .TrainingDatabaseUtils import PERFORMANCE_METRICS_COLUMNS, _read_performance_metrics
+from ..Version import get_selected_version
+
+_logger = logging.getLogger(__name__)
+
+# Increase when the layout of the cache changes, so that existing caches are rebuilt
+CACHE_FORMAT_VERSION = 2
+
+# Number of appended part files after which the parts are merged into a single file
+_MAX_PARTS = 16
+
+_METADATA_FILE = 'metadata.json'
+
+
+def _default_cache_dir(db_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), '.performance_metrics_cache')
+
+
+def _cache_path(db_path: str, begin_end: Tuple[str, str], cache_dir: str) -> str:
+    key = json.dumps([os.path.abspath(db_path), get_selected_version().name, list(begin_end)])
+    return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest())
+
+
+def _cache_identity(db_path: str, begin_end: Tuple[str, str]) -> dict:
+    """
+    Everything that invalidates the cache when it changes:
+    the database file, the schema, the columns of the DataFrame and the local timezone used for the Timestamp column.
+    """
+    db_stat = os.stat(db_path)
+    return {
+        'cache_format_version': CACHE_FORMAT_VERSION,
+        'db_path': os.path.abspath(db_path),
+        'db_file': [db_stat.st_dev, db_stat.st_ino],
+        'schema_version': get_selected_version().name,
+        'begin_end': list(begin_end),
+        'columns': PERFORMANCE_METRICS_COLUMNS,
+        'timezone': [time.timezone, time.altzone, list(time.tzname)],
+    }
+
+
+def _rows_up_to_id(db_path: str, high_water_id: int) -> list:
+    """
+    :return: number of rows with an id up to the high-water id and the timestamp of the row with that id.
+    Both change when rows were removed, also when the ids of removed rows were assigned to new rows,
+    since the ids are not AUTOINCREMENT.
+    """
+    db_connection = get_read_engine(db_path)
+    training_data_table = _training_data_entity(get_selected_version()).__table__
+    with db_connection.connect() as connection:
+        row_count = connection.execute(
+            select(func.count()).where(training_data_table.c.id <= high_water_id)
+        ).scalar()
+        high_water_timestamp = connection.execute(
+            select(training_data_table.c.timestamp).where(training_data_table.c.id == high_water_id)
+        ).scalar()
+    # as stored in the JSON metadata
+    return [row_count, None if high_water_timestamp is None else str(high_water_timestamp)]
+
+
+def _read_metadata(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, _METADATA_FILE)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_metadata(path: str, metadata: dict):
+    # an interrupted refresh leaves the previous metadata intact
+    _write_json_atomically(os.path.join(path, _METADATA_FILE), metadata)
+
+
+def read_all_performance_metrics_from_db_cached(
+        db_path: str,
+        begin_end: Tuple[str, str] = (),
+        cache_dir: Optional[str] = None
+) -> Tuple[DataFrame, dict]:
+    """
+    Same as `read_all_performance_metrics_from_db`, but caches the result in Parquet files (requires pyarrow).
+    Later calls only read the rows inserted since the previous call and append them to the cache.
+    Request types keep their codes across refreshes.
+
+    The cache is rebuilt if the database file was replaced, rows that are already cached were removed or replaced
+    (detected by the number of rows up to the last cached id and the timestamp of that row),
+    or the schema version, columns or local timezone changed.
+
+    Example call:
+
+    `read_all_performance_metrics_from_db_cached(r"db/trainingdata_2021-04-06.db", ("2021 03 30", "2021 04 05"))`
+    :param db_path: Path to SQLite database file, partitioned training databases are not supported,
+    since the ids of their rows are not unique across the partitions
+    :param begin_end: Optional tuple to filter within the specified begin and end datetime.
+    :param cache_dir: Directory of the cache, defaults to `.performance_metrics_cache` next to the database file
+    :return: DataFrame with performance metrics
+    and dictionary with the request types mapping created using ordinal encoding
+    """
+    begin = datetime.now()
+
+    if is_partitioned_training_database(db_path):
+        raise ValueError(f"{db_path} is a partitioned training database, use read_all_performance_metrics_from_db")
+
+    if cache_dir is None:
+        cache_dir = _default_cache_dir(db_path)
+
+    path = _cache_path(db_path, begin_end, cache_dir)
+    identity = _cache_identity(db_path, begin_end)
+    metadata = _read_metadata(path)
+
+    if metadata is not None and (
+            metadata['identity'] != identity
+            or _rows_up_to_id(db_path, metadata['high_water_id']) != metadata['high_water_rows']
+    ):
+        metadata = None
+
+    if metadata is None:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        metadata = {
+            'identity': identity,
+            'high_water_id': 0,
+            'high_water_rows': [0, None],
+            'known_request_types': [],
+            'parts': []
+        }
+
+    parts = [pd.read_parquet(os.path.join(path, part)) for part in metadata['parts']]
+    known_request_types = {request_type: code for code, request_type in enumerate(metadata['known_request_types'])}
+
+    new_rows, known_request_types, high_water_id = _read_performance_metrics(
+        db_path,
+        begin_end,
+        after_id=metadata['high_water_id'],
+        known_request_types=known_request_types,
+        operation="read_all_performance_metrics_from_db_cached"
+    )
+
+    if len(new_rows) > 0 or len(parts) == 0:
+        parts.append(new_rows)
+
+        if len(parts) > _MAX_PARTS:
+            parts = [pd.concat(parts, ignore_index=True)]
+            part_names = []
+        else:
+            part_names = metadata['parts']
+
+        part_name = f"part-{high_water_id:012d}.parquet"
+        parts[-1].to_parquet(os.path.join(path, part_name), index=False)
+
+        obsolete_part_names = [name for name in metadata['parts'] if name not in part_names]
+
+        metadata['parts'] = part_names + [part_name]
+        metadata['high_water_id'] = high_water_id
+        metadata['high_water_rows'] = _rows_up_to_id(db_path, high_water_id)
+        # the position in the list is the code of the request type
+        metadata['known_request_types'] = sorted(known_request_types, key=known_request_types.get)
+        _write_metadata(path, metadata)
+
+        for name in obsolete_part_names:
+            if name != part_name:
+                os.remove(os.path.join(path, name))
+
+    df = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+
+    _logger.info(
+        "read_all_performance_metrics_from_db_cached finished in %s s", (datetime.now() - begin).total_seconds()
+    )
+
+    return df, known_request_types
@@ -1,7 +1,21 @@
 import argparse
 import os
-from datetime import datetime
+import re
+from datetime import datetime, date
+from functools import lru_cache
 from re import search
+from typing import Iterable, List, Tuple, Union, TYPE_CHECKING
+
+from .Instrumentation import INSTRUMENTATION
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Matches the timestamp after a closing bracket, optionally with fractional seconds,
+# e.g., "] 2021-04-06 12:00:00.123456"
+_TIMESTAMP_PATTERN = re.compile(r"(?<=\])\s*(\d*-\d*-\d*)\s(\d*):(\d*):(\d*)(?:\.(\d*))?")
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
 
 def get_date_from_string(line):
@@ -16,16 +30,67 @@ def get_timestamp_from_string(line: str):
     return search(r"(?<=\])\s*\d*-\d*-\d*\s\d*:\d*:\d*\.?\d*", line).group().strip()
 
 
-def get_timestamp_from_line(line: str) -> datetime:
-    if contains_timestamp_with_ms(line):
-        format_string = '%Y-%m-%d %H:%M:%S.%f'
+@lru_cache(maxsize=4096)
+def _parse_date(text: str) -> date:
+    # all lines of a log file share only a few dates, so each date is parsed once
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def _parse_timestamp(line: str) -> Tuple[date, int, int, int, int]:
+    """
+    Parses the timestamp of a line in a single pass, accepting the same formats as `get_timestamp_from_line`.
+    :return: date, hour, minute, second and microsecond of the timestamp
+    """
+    match = _TIMESTAMP_PATTERN.search(line)
+    if match is None:
+        raise ValueError(f"No timestamp found in line: {line!r}")
+
+    date_text, hour, minute, second, fraction = match.groups()
+    hour, minute, second = int(hour), int(minute), int(second)
+    if hour > 23 or minute > 59 or second > 59:
+        raise ValueError(f"Invalid time in line: {line!r}")
+
+    if fraction is None:
+        microsecond = 0
+    elif 0 < len(fraction) <= 6:
+        microsecond = int(fraction.ljust(6, '0'))
     else:
-        format_string = '%Y-%m-%d %H:%M:%S'
+        raise ValueError(f"Invalid fractional seconds in line: {line!r}")
+
+    return _parse_date(date_text), hour, minute, second, microsecond
+
+
+def get_timestamp_from_line(line: str) -> datetime:
+    day, hour, minute, second, microsecond = _parse_timestamp(line)
+    return datetime(day.year, day.month, day.day, hour, minute, second, microsecond)
+
+
+def get_timestamps_from_lines(lines: Iterable[str], as_epoch: bool = False) -> Union[List[datetime], "np.ndarray"]:
+    """
+    Batch version of `get_timestamp_from_line`.
+    :param lines: Lines containing a timestamp with or without milliseconds
+    :param as_epoch: Return nanoseconds since the epoch (of the naive timestamps) instead of datetime objects
+    :return: List of datetime objects or NumPy array of nanoseconds since the epoch, in the order of the lines
+    """
+    with INSTRUMENTATION.measure("get_timestamps_from_lines") as measurement:
+        if not as_epoch:
+            timestamps = [get_timestamp_from_line(line) for line in lines]
+        else:
+            # imported here, so that the string helpers can be used without loading NumPy
+            import numpy as np
+
+            microseconds_since_epoch = []
+            for line in lines:
+                day, hour, minute, second, microsecond = _parse_timestamp(line)
+                seconds = (day.toordinal() - _EPOCH_ORDINAL) * 86400 + hour * 3600 + minute * 60 + second
+                microseconds_since_epoch.append(seconds * 1000000 + microsecond)
+
+            timestamps = np.array(microseconds_since_epoch, dtype=np.int64) * 1000
+
+        measurement.end_phase("parse")
+        measurement.count(len(timestamps))
 
-    return datetime.strptime(
-        get_timestamp_from_string(line),
-        format_string
-    )
+    return timestamps
 
 
 def dir_path(path):
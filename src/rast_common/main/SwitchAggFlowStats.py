@@ -1,7 +1,31 @@
+import copy
 import json
+from array import array
+from collections.abc import Mapping, MutableMapping
 from dataclasses import dataclass
 from datetime import datetime, time
 from json import JSONEncoder
+from time import time as unix_time
+from types import MappingProxyType
+from typing import Tuple
+
+import numpy as np
+
+from .Instrumentation import INSTRUMENTATION
+from .TimeUtils import _local_utc_offset
+
+SECONDS_PER_DAY = 86400
+
+
+def _seconds_of_day(timestamps) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param timestamps: naive timestamps, e.g., a NumPy datetime64 array, a pandas Series or a list of datetime objects
+    :return: second of the day of each timestamp and a mask of the timestamps that are not NaT
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+    valid = ~np.isnat(timestamps)
+    seconds = timestamps.view(np.int64) // 1000000000
+    return np.where(valid, seconds % SECONDS_PER_DAY, 0), valid
 
 
 @dataclass(init=False)
@@ -22,6 +46,8 @@ class SwitchAggFlowStats:
             self.bytes_per_second_received[time_of_stat] += bytes_per_second
             self.packets_per_second_received[time_of_stat] += packets_per_second
 
+        INSTRUMENTATION.count("SwitchAggFlowStats.add_agg_flow_stats")
+
     def get_bytes_per_second_for(self, timestamp: datetime):
         time_of_request = timestamp.time()
         time_of_request = time_of_request.replace(time_of_request.hour, time_of_request.minute, time_of_request.second, 0)
@@ -36,10 +62,233 @@ class SwitchAggFlowStats:
             return 0
         return self.packets_per_second_received[time_of_request]
 
+    def _get_many(self, per_second_received: dict[time, int], timestamps) -> np.ndarray:
+        per_second_of_day = np.zeros(SECONDS_PER_DAY, dtype=np.int64)
+        for time_of_stat, value in per_second_received.items():
+            per_second_of_day[time_of_stat.hour * 3600 + time_of_stat.minute * 60 + time_of_stat.second] = value
+
+        seconds_of_day, valid = _seconds_of_day(timestamps)
+        return np.where(valid, per_second_of_day[seconds_of_day], 0)
+
+    def get_bytes_per_second_for_many(self, timestamps) -> np.ndarray:
+        """
+        Vectorized version of `get_bytes_per_second_for`.
+        :param timestamps: naive timestamps, e.g., a NumPy datetime64 array, a pandas Series or a list of datetime objects
+        :return: bytes per second for each timestamp, 0 for seconds without statistics
+        """
+        return self._get_many(self.bytes_per_second_received, timestamps)
+
+    def get_packets_per_second_for_many(self, timestamps) -> np.ndarray:
+        """
+        Vectorized version of `get_packets_per_second_for`.
+        :param timestamps: naive timestamps, e.g., a NumPy datetime64 array, a pandas Series or a list of datetime objects
+        :return: packets per second for each timestamp, 0 for seconds without statistics
+        """
+        return self._get_many(self.packets_per_second_received, timestamps)
+
+    def copy(self) -> 'SwitchAggFlowStats':
+        stats = copy.copy(self)
+        stats.bytes_per_second_received = dict(self.bytes_per_second_received)
+        stats.packets_per_second_received = dict(self.packets_per_second_received)
+        return stats
+
     def __str__(self):
         return json.dumps(self, cls=SwitchAggFlowStatsEncoder)
 
 
+class RingBufferSwitchAggFlowStats(SwitchAggFlowStats):
+    """
+    Same as SwitchAggFlowStats, but stores the statistics in preallocated arrays indexed by the second of the day,
+    so that updates and lookups neither allocate nor hash time objects.
+    With a window shorter than a day, only the statistics of the most recent `window_seconds` seconds are kept.
+
+    `bytes_per_second_received` and `packets_per_second_received` are read-only snapshots of the statistics,
+    assign a dict to replace them.
+    """
+
+    def __init__(self, switch_id: int, window_seconds: int = SECONDS_PER_DAY):
+        self.switch_id = switch_id
+        self.window_seconds = window_seconds
+        # Plain arrays are faster than NumPy arrays for single element access;
+        # np.frombuffer provides NumPy views of them without copying.
+        # second of the day each slot holds statistics for, -1 for empty slots,
+        # per metric, since the dicts assigned to the metrics may contain different seconds
+        self._bytes_seconds_of_day = array('i', [-1]) * window_seconds
+        self._packets_seconds_of_day = array('i', [-1]) * window_seconds
+        self._bytes_per_second = array('q', [0]) * window_seconds
+        self._packets_per_second = array('q', [0]) * window_seconds
+        self._utc_offset = 0
+        self._utc_offset_valid_until = 0.
+
+    def _current_second_of_day(self) -> int:
+        now = unix_time()
+        if now >= self._utc_offset_valid_until:
+            self._utc_offset, self._utc_offset_valid_until = _local_utc_offset(now)
+        return int(now + self._utc_offset) % SECONDS_PER_DAY
+
+    def _add(self, second_of_day: int, bytes_per_second: int, packets_per_second: int):
+        slot = second_of_day % self.window_seconds
+        if self._bytes_seconds_of_day[slot] != second_of_day:
+            self._bytes_seconds_of_day[slot] = second_of_day
+            self._bytes_per_second[slot] = bytes_per_second
+        else:
+            self._bytes_per_second[slot] += bytes_per_second
+        if self._packets_seconds_of_day[slot] != second_of_day:
+            self._packets_seconds_of_day[slot] = second_of_day
+            self._packets_per_second[slot] = packets_per_second
+        else:
+            self._packets_per_second[slot] += packets_per_second
+
+    def _get(self, seconds_of_day: array, values: array, timestamp: datetime) -> int:
+        second_of_day = timestamp.hour * 3600 + timestamp.minute * 60 + timestamp.second
+        slot = second_of_day % self.window_seconds
+        if seconds_of_day[slot] != second_of_day:
+            return 0
+        return values[slot]
+
+    def _get_many(self, seconds_of_day: array, values: array, timestamps) -> np.ndarray:
+        seconds_of_day_of_timestamps, valid = _seconds_of_day(timestamps)
+        slots = seconds_of_day_of_timestamps % self.window_seconds
+        valid &= np.frombuffer(seconds_of_day, dtype=np.int32)[slots] == seconds_of_day_of_timestamps
+        return np.where(valid, np.frombuffer(values, dtype=np.int64)[slots], 0)
+
+    def get_bytes_per_second_for_many(self, timestamps) -> np.ndarray:
+        return self._get_many(self._bytes_seconds_of_day, self._bytes_per_second, timestamps)
+
+    def get_packets_per_second_for_many(self, timestamps) -> np.ndarray:
+        return self._get_many(self._packets_seconds_of_day, self._packets_per_second, timestamps)
+
+    def copy(self) -> 'RingBufferSwitchAggFlowStats':
+        stats = copy.copy(self)
+        stats._bytes_seconds_of_day = self._bytes_seconds_of_day[:]
+        stats._packets_seconds_of_day = self._packets_seconds_of_day[:]
+        stats._bytes_per_second = self._bytes_per_second[:]
+        stats._packets_per_second = self._packets_per_second[:]
+        return stats
+
+    @staticmethod
+    def _to_dict(seconds_of_day: array, values: array) -> dict[time, int]:
+        seconds_of_day = np.frombuffer(seconds_of_day, dtype=np.int32)
+        slots = np.flatnonzero(seconds_of_day >= 0)
+        slots = slots[np.argsort(seconds_of_day[slots])]
+        return {
+            time(second_of_day // 3600, second_of_day // 60 % 60, second_of_day % 60): value
+            for second_of_day, value in zip(
+                seconds_of_day[slots].tolist(),
+                np.frombuffer(values, dtype=np.int64)[slots].tolist()
+            )
+        }
+
+    def add_agg_flow_stats(self, bytes_per_second: int, packets_per_second: int):
+        self._add(self._current_second_of_day(), bytes_per_second, packets_per_second)
+        INSTRUMENTATION.count("SwitchAggFlowStats.add_agg_flow_stats")
+
+    def get_bytes_per_second_for(self, timestamp: datetime):
+        return self._get(self._bytes_seconds_of_day, self._bytes_per_second, timestamp)
+
+    def get_packets_per_second_for(self, timestamp: datetime):
+        return self._get(self._packets_seconds_of_day, self._packets_per_second, timestamp)
+
+    @property
+    def bytes_per_second_received(self) -> Mapping[time, int]:
+        """ read-only, since changes of a snapshot would not reach the ring buffer """
+        return MappingProxyType(self._to_dict(self._bytes_seconds_of_day, self._bytes_per_second))
+
+    @bytes_per_second_received.setter
+    def bytes_per_second_received(self, value: Mapping[time, int]):
+        self._load(value, self._bytes_seconds_of_day, self._bytes_per_second)
+
+    @property
+    def packets_per_second_received(self) -> Mapping[time, int]:
+        """ read-only, since changes of a snapshot would not reach the ring buffer """
+        return MappingProxyType(self._to_dict(self._packets_seconds_of_day, self._packets_per_second))
+
+    @packets_per_second_received.setter
+    def packets_per_second_received(self, value: Mapping[time, int]):
+        self._load(value, self._packets_seconds_of_day, self._packets_per_second)
+
+    def _load(self, value: Mapping[time, int], seconds_of_day: array, values: array):
+        np.frombuffer(seconds_of_day, dtype=np.int32)[:] = -1
+        np.frombuffer(values, dtype=np.int64)[:] = 0
+        # load in chronological order, so that later seconds replace earlier ones sharing the same slot
+        for time_of_stat in sorted(value):
+            second_of_day = time_of_stat.hour * 3600 + time_of_stat.minute * 60 + time_of_stat.second
+            slot = second_of_day % self.window_seconds
+            seconds_of_day[slot] = second_of_day
+            values[slot] = value[time_of_stat]
+
+
+def lookup_switch_throughput(
+        stats_by_switch_id: Mapping[int, SwitchAggFlowStats],
+        switch_ids,
+        timestamps
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Looks up the bytes and packets per second transmitted through the switch of each request.
+    :param stats_by_switch_id: statistics of the switches
+    :param switch_ids: switch id of each request, or a single switch id for all requests
+    :param timestamps: naive timestamps of the requests, e.g., a NumPy datetime64 array or a pandas Series
+    :return: bytes per second and packets per second for each request,
+    0 for seconds without statistics and unknown switches
+    """
+    with INSTRUMENTATION.measure("lookup_switch_throughput") as measurement:
+        timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+        switch_ids = np.broadcast_to(np.asarray(switch_ids), timestamps.shape)
+
+        bytes_per_second = np.zeros(timestamps.shape, dtype=np.int64)
+        packets_per_second = np.zeros(timestamps.shape, dtype=np.int64)
+
+        for switch_id in np.unique(switch_ids).tolist():
+            stats = stats_by_switch_id.get(switch_id)
+            if stats is None:
+                continue
+
+            of_switch = switch_ids == switch_id
+            bytes_per_second[of_switch] = stats.get_bytes_per_second_for_many(timestamps[of_switch])
+            packets_per_second[of_switch] = stats.get_packets_per_second_for_many(timestamps[of_switch])
+
+        measurement.end_phase("lookup")
+        measurement.count(timestamps.size)
+
+    return bytes_per_second, packets_per_second
+
+
+def assign_switch_throughput(rows, stats_by_switch_id: Mapping[int, SwitchAggFlowStats]):
+    """
+    Fills the bytes_per_second_transmitted_through_switch and packets_per_second_transmitted_through_switch fields
+    of training data rows using one vectorized lookup.
+    :param rows: sequence of TrainingDataRow objects or a column batch, i.e., a TrainingDataRowBatch
+    or a mapping from field name to a sequence of values (see `ingest_training_data`)
+    :param stats_by_switch_id: statistics of the switches
+    """
+    # a TrainingDataRowBatch is recognized by its columns, since importing it would load pandas and SQLAlchemy.
+    # Its rows are views created on iteration, so the columns are filled instead.
+    columns = getattr(rows, 'columns', None)
+    if isinstance(columns, MutableMapping):
+        rows = columns
+
+    if isinstance(rows, MutableMapping):
+        bytes_per_second, packets_per_second = lookup_switch_throughput(
+            stats_by_switch_id,
+            rows.get('switch_id', 0),
+            rows['timestamp']
+        )
+        rows['bytes_per_second_transmitted_through_switch'] = bytes_per_second
+        rows['packets_per_second_transmitted_through_switch'] = packets_per_second
+        return
+
+    bytes_per_second, packets_per_second = lookup_switch_throughput(
+        stats_by_switch_id,
+        [row.switch_id for row in rows],
+        [row.timestamp for row in rows]
+    )
+    for row, row_bytes_per_second, row_packets_per_second in zip(
+            rows, bytes_per_second.tolist(), packets_per_second.tolist()
+    ):
+        row.bytes_per_second_transmitted_through_switch = row_bytes_per_second
+        row.packets_per_second_transmitted_through_switch = row_packets_per_second
+
+
 class SwitchAggFlowStatsEncoder(JSONEncoder):
     def default(self, o):
         if isinstance(o, SwitchAggFlowStats):
@@ -52,11 +301,20 @@ class SwitchAggFlowStatsEncoder(JSONEncoder):
 
 
 class SwitchAggFlowStatsDecoder(json.JSONDecoder):
+    """
+    Decodes SwitchAggFlowStats, or the given subclass, e.g.,
+    `json.loads(s, cls=SwitchAggFlowStatsDecoder, stats_type=RingBufferSwitchAggFlowStats)`.
+    """
+
+    def __init__(self, *args, stats_type: type[SwitchAggFlowStats] = SwitchAggFlowStats, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_type = stats_type
+
     @staticmethod
-    def try_create_object(dct):
+    def try_create_object(dct, stats_type: type[SwitchAggFlowStats] = SwitchAggFlowStats):
         if 'switch_id' in dct and 'bytes_per_second_received' in dct and 'packets_per_second_received' in dct:
             switch_id = dct['switch_id']
-            stats = SwitchAggFlowStats(switch_id)
+            stats = stats_type(switch_id)
             stats.bytes_per_second_received = {time.fromisoformat(k): v for k, v in dct['bytes_per_second_received'].items()}
             stats.packets_per_second_received = {time.fromisoformat(k): v for k, v in dct['packets_per_second_received'].items()}
             return stats
@@ -64,4 +322,4 @@ class SwitchAggFlowStatsDecoder(json.JSONDecoder):
 
     def decode(self, s, **kwargs):
         dct = super().decode(s)
-        return self.try_create_object(dct)
+        return self.try_create_object(dct, self.stats_type)
@@ -0,0 +1,242 @@
+import json
+import os
+import struct
+from datetime import time
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from .SwitchAggFlowStats import SwitchAggFlowStats, RingBufferSwitchAggFlowStats, SwitchAggFlowStatsDecoder, \
+    SwitchAggFlowStatsEncoder, SECONDS_PER_DAY
+
+# Layout of a binary flow stats file (little endian):
+# header: magic, format version, reserved, number of slots per switch
+# followed by one block per switch: switch id, bytes per second and packets per second of each second of the day.
+# Seconds without statistics hold EMPTY_SLOT.
+BINARY_FORMAT_MAGIC = b'RASTAFS\0'
+BINARY_FORMAT_VERSION = 1
+EMPTY_SLOT = -1
+
+_HEADER = struct.Struct('<8sHHI')
+
+_BLOCK_DTYPE = np.dtype([
+    ('switch_id', '<i8'),
+    ('bytes_per_second', '<i8', (SECONDS_PER_DAY,)),
+    ('packets_per_second', '<i8', (SECONDS_PER_DAY,)),
+])
+
+
+def _to_per_second_of_day(per_second_received: dict[time, int]) -> np.ndarray:
+    values = np.full(SECONDS_PER_DAY, EMPTY_SLOT, dtype=np.int64)
+    for time_of_stat, value in per_second_received.items():
+        values[time_of_stat.hour * 3600 + time_of_stat.minute * 60 + time_of_stat.second] = value
+    return values
+
+
+def _to_per_second_received(values: np.ndarray) -> dict[time, int]:
+    seconds_of_day = np.flatnonzero(values != EMPTY_SLOT)
+    return {
+        time(second_of_day // 3600, second_of_day // 60 % 60, second_of_day % 60): value
+        for second_of_day, value in zip(seconds_of_day.tolist(), values[seconds_of_day].tolist())
+    }
+
+
+def _ring_buffer_to_per_second_of_day(seconds_of_day_of_slots, values_of_slots) -> np.ndarray:
+    seconds_of_day = np.frombuffer(seconds_of_day_of_slots, dtype=np.int32)
+    occupied = seconds_of_day >= 0
+    values = np.full(SECONDS_PER_DAY, EMPTY_SLOT, dtype=np.int64)
+    values[seconds_of_day[occupied]] = np.frombuffer(values_of_slots, dtype=np.int64)[occupied]
+    return values
+
+
+def _to_block_arrays(stats: SwitchAggFlowStats) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(stats, RingBufferSwitchAggFlowStats):
+        return (
+            _ring_buffer_to_per_second_of_day(stats._bytes_seconds_of_day, stats._bytes_per_second),
+            _ring_buffer_to_per_second_of_day(stats._packets_seconds_of_day, stats._packets_per_second)
+        )
+
+    return (
+        _to_per_second_of_day(stats.bytes_per_second_received),
+        _to_per_second_of_day(stats.packets_per_second_received)
+    )
+
+
+class SwitchAggFlowStatsFile:
+    """
+    Compact binary file of the flow stats of several switches, memory-mapped for reading and incremental updates.
+
+    Example:
+
+    ```
+    with SwitchAggFlowStatsFile("flow_stats.bin", writable=True) as stats_file:
+        stats_file.flush(stats)  # writes only the seconds that changed since the last flush
+    ```
+    """
+
+    def __init__(self, path: str, writable: bool = False):
+        """
+        :param path: Path to the binary file, which is created if writable and it does not exist
+        :param writable: Open the file for updates
+        """
+        self.path = path
+        self.writable = writable
+
+        if not os.path.exists(path):
+            if not writable:
+                raise FileNotFoundError(path)
+            with open(path, 'wb') as file:
+                file.write(_HEADER.pack(BINARY_FORMAT_MAGIC, BINARY_FORMAT_VERSION, 0, SECONDS_PER_DAY))
+
+        with open(path, 'rb') as file:
+            magic, version, _, slots = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != BINARY_FORMAT_MAGIC:
+            raise ValueError(f"{path} is not a binary flow stats file")
+        if version != BINARY_FORMAT_VERSION or slots != SECONDS_PER_DAY:
+            raise ValueError(f"Unsupported binary flow stats format version {version} with {slots} slots")
+
+        self._blocks: Optional[np.memmap] = None
+        self._block_index_by_switch_id: dict[int, int] = {}
+        self._map()
+
+    def _map(self):
+        number_of_blocks = (os.path.getsize(self.path) - _HEADER.size) // _BLOCK_DTYPE.itemsize
+        if number_of_blocks == 0:
+            self._blocks = None
+            self._block_index_by_switch_id = {}
+            return
+
+        self._blocks = np.memmap(
+            self.path,
+            dtype=_BLOCK_DTYPE,
+            mode='r+' if self.writable else 'r',
+            offset=_HEADER.size,
+            shape=(number_of_blocks,)
+        )
+        self._block_index_by_switch_id = {
+            switch_id: index for index, switch_id in enumerate(self._blocks['switch_id'].tolist())
+        }
+
+    @property
+    def switch_ids(self) -> list[int]:
+        return list(self._block_index_by_switch_id)
+
+    def bytes_per_second_of(self, switch_id: int) -> np.ndarray:
+        """
+        :return: memory-mapped bytes per second of each second of the day, EMPTY_SLOT for seconds without statistics
+        """
+        return self._blocks['bytes_per_second'][self._block_index_by_switch_id[switch_id]]
+
+    def packets_per_second_of(self, switch_id: int) -> np.ndarray:
+        """
+        :return: memory-mapped packets per second of each second of the day, EMPTY_SLOT for seconds without statistics
+        """
+        return self._blocks['packets_per_second'][self._block_index_by_switch_id[switch_id]]
+
+    def read(self, switch_id: int, stats_type: type[SwitchAggFlowStats] = SwitchAggFlowStats) -> SwitchAggFlowStats:
+        bytes_per_second = self.bytes_per_second_of(switch_id)
+        packets_per_second = self.packets_per_second_of(switch_id)
+
+        stats = stats_type(switch_id)
+
+        if isinstance(stats, RingBufferSwitchAggFlowStats) and stats.window_seconds == SECONDS_PER_DAY:
+            for seconds_of_day, values, stored_values in (
+                    (stats._bytes_seconds_of_day, stats._bytes_per_second, bytes_per_second),
+                    (stats._packets_seconds_of_day, stats._packets_per_second, packets_per_second)
+            ):
+                occupied = stored_values != EMPTY_SLOT
+                np.frombuffer(seconds_of_day, dtype=np.int32)[occupied] = np.flatnonzero(occupied)
+                np.frombuffer(values, dtype=np.int64)[:] = np.maximum(stored_values, 0)
+        else:
+            stats.bytes_per_second_received = _to_per_second_received(bytes_per_second)
+            stats.packets_per_second_received = _to_per_second_received(packets_per_second)
+
+        return stats
+
+    def read_all(self, stats_type: type[SwitchAggFlowStats] = SwitchAggFlowStats) -> list[SwitchAggFlowStats]:
+        return [self.read(switch_id, stats_type) for switch_id in self.switch_ids]
+
+    def flush(self, stats: SwitchAggFlowStats):
+        """
+        Writes the statistics of a switch, appending a block for switches not in the file yet.
+        For switches already in the file, only the seconds that changed are written.
+        """
+        if not self.writable:
+            raise PermissionError(f"{self.path} was not opened for writing")
+
+        bytes_per_second, packets_per_second = _to_block_arrays(stats)
+
+        if stats.switch_id not in self._block_index_by_switch_id:
+            block = np.zeros(1, dtype=_BLOCK_DTYPE)
+            block['switch_id'] = stats.switch_id
+            block['bytes_per_second'] = bytes_per_second
+            block['packets_per_second'] = packets_per_second
+
+            self._release()
+            with open(self.path, 'ab') as file:
+                file.write(block.tobytes())
+            self._map()
+            return
+
+        stored_bytes_per_second = self.bytes_per_second_of(stats.switch_id)
+        stored_packets_per_second = self.packets_per_second_of(stats.switch_id)
+        changed = (stored_bytes_per_second != bytes_per_second) | (stored_packets_per_second != packets_per_second)
+        stored_bytes_per_second[changed] = bytes_per_second[changed]
+        stored_packets_per_second[changed] = packets_per_second[changed]
+        self._blocks.flush()
+
+    def _release(self):
+        if self._blocks is not None:
+            if self.writable:
+                self._blocks.flush()
+            self._blocks = None
+
+    def close(self):
+        self._release()
+        self._block_index_by_switch_id = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def write_switch_agg_flow_stats_binary(path: str, stats: Iterable[SwitchAggFlowStats]):
+    with SwitchAggFlowStatsFile(path, writable=True) as stats_file:
+        for switch_stats in stats:
+            stats_file.flush(switch_stats)
+
+
+def read_switch_agg_flow_stats_binary(
+        path: str,
+        stats_type: type[SwitchAggFlowStats] = SwitchAggFlowStats
+) -> list[SwitchAggFlowStats]:
+    with SwitchAggFlowStatsFile(path) as stats_file:
+        return stats_file.read_all(stats_type)
+
+
+def convert_switch_agg_flow_stats_json_to_binary(json_path: str, binary_path: str):
+    """
+    :param json_path: JSON file containing a single SwitchAggFlowStats object or a list of them,
+    as written by SwitchAggFlowStatsEncoder
+    :param binary_path: binary file to write the statistics to
+    """
+    with open(json_path) as file:
+        stats = json.load(file, object_hook=SwitchAggFlowStatsDecoder.try_create_object)
+
+    if isinstance(stats, SwitchAggFlowStats):
+        stats = [stats]
+
+    write_switch_agg_flow_stats_binary(binary_path, stats)
+
+
+def convert_switch_agg_flow_stats_binary_to_json(binary_path: str, json_path: str):
+    """
+    :param binary_path: binary file containing the statistics
+    :param json_path: JSON file to write a list of SwitchAggFlowStats objects to, using SwitchAggFlowStatsEncoder
+    """
+    stats = read_switch_agg_flow_stats_binary(binary_path)
+
+    with open(json_path, 'w') as file:
+        json.dump(stats, file, cls=SwitchAggFlowStatsEncoder)
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from typing import Callable, Optional
+
+from .SwitchAggFlowStats import SwitchAggFlowStats, RingBufferSwitchAggFlowStats
+
+
+class SwitchAggFlowStatsRegistry:
+    """
+    Owns the SwitchAggFlowStats of many switches and accepts updates from concurrent threads or asyncio tasks.
+
+    Every switch has its own lock, so updates of different switches never wait for each other
+    and the registry lock is only taken when a switch reports for the first time.
+    Snapshots are copy-on-write: taking a snapshot only marks the statistics of a switch as shared,
+    the next update of the switch replaces them with a copy, and the snapshot is copied outside the lock.
+    """
+
+    def __init__(self, stats_factory: Callable[[int], SwitchAggFlowStats] = RingBufferSwitchAggFlowStats):
+        """
+        :param stats_factory: creates the statistics of a switch that reports for the first time
+        """
+        self._stats_factory = stats_factory
+        self._registry_lock = threading.Lock()
+        self._stats_by_switch_id: dict[int, SwitchAggFlowStats] = {}
+        self._lock_by_switch_id: dict[int, threading.Lock] = {}
+        # switches whose current statistics are referenced by a snapshot and must not be changed anymore
+        self._shared_switch_ids: set[int] = set()
+
+    def _get_or_create_lock(self, switch_id: int) -> threading.Lock:
+        # dict lookups are atomic, so the registry lock is only needed to add a switch
+        lock = self._lock_by_switch_id.get(switch_id)
+        if lock is not None:
+            return lock
+
+        with self._registry_lock:
+            if switch_id not in self._stats_by_switch_id:
+                # register the stats first, so that they exist once the lock is visible to other threads
+                self._stats_by_switch_id[switch_id] = self._stats_factory(switch_id)
+                self._lock_by_switch_id[switch_id] = threading.Lock()
+            return self._lock_by_switch_id[switch_id]
+
+    def _stats_for_update(self, switch_id: int) -> SwitchAggFlowStats:
+        """ must be called while holding the lock of the switch """
+        stats = self._stats_by_switch_id[switch_id]
+        if switch_id in self._shared_switch_ids:
+            # a snapshot still reads the statistics, so they are copied before they change
+            stats = stats.copy()
+            self._stats_by_switch_id[switch_id] = stats
+            self._shared_switch_ids.discard(switch_id)
+        return stats
+
+    @property
+    def switch_ids(self) -> list[int]:
+        return list(self._stats_by_switch_id)
+
+    def add_agg_flow_stats(self, switch_id: int, bytes_per_second: int, packets_per_second: int):
+        """
+        Thread-safe version of `SwitchAggFlowStats.add_agg_flow_stats` for the switch with the given id.
+        """
+        with self._get_or_create_lock(switch_id):
+            self._stats_for_update(switch_id).add_agg_flow_stats(bytes_per_second, packets_per_second)
+
+    async def add_agg_flow_stats_async(self, switch_id: int, bytes_per_second: int, packets_per_second: int):
+        """
+        Same as `add_agg_flow_stats`, but does not block the event loop while another thread updates the same switch:
+        the lock is then awaited in a thread of the default executor of the loop.
+        If the task is cancelled while it waits, the lock is released as soon as that thread acquired it.
+        """
+        lock = self._get_or_create_lock(switch_id)
+        if not lock.acquire(blocking=False):
+            acquiring = asyncio.get_running_loop().run_in_executor(None, lock.acquire)
+            try:
+                # shielded, so that the acquisition can still be observed after a cancellation
+                await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # the thread cannot be interrupted and acquires the lock anyway
+                acquiring.add_done_callback(lambda _: lock.release())
+                raise
+        try:
+            self._stats_for_update(switch_id).add_agg_flow_stats(bytes_per_second, packets_per_second)
+        finally:
+            lock.release()
+
+    def get(self, switch_id: int) -> Optional[SwitchAggFlowStats]:
+        """
+        :return: the live statistics of the switch, which may change while they are read. See `snapshot`.
+        """
+        return self._stats_by_switch_id.get(switch_id)
+
+    def snapshot(self, switch_id: Optional[int] = None) -> dict[int, SwitchAggFlowStats]:
+        """
+        Copies the statistics, one switch at a time. The lock of a switch is only held to mark its statistics
+        as shared, they are copied after releasing it, so that writers never wait for the copy.
+        :param switch_id: Optional id of the only switch to copy
+        :return: consistent copies of the statistics of each switch
+        """
+        switch_ids = self.switch_ids if switch_id is None else [switch_id]
+
+        snapshot = {}
+        for switch_id in switch_ids:
+            lock = self._lock_by_switch_id.get(switch_id)
+            if lock is None:
+                continue
+
+            with lock:
+                stats = self._stats_by_switch_id[switch_id]
+                self._shared_switch_ids.add(switch_id)
+            # updates replace the shared statistics instead of changing them
+            snapshot[switch_id] = stats.copy()
+
+        return snapshot
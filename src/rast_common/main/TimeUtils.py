@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from typing import Tuple
+
+import numpy as np
+
+# DST transitions happen at most at quarter-hour boundaries,
+# so the local UTC offset is constant within such an interval.
+_UTC_OFFSET_INTERVAL_SECONDS = 900
+
+
+def _utc_offset_interval_start(seconds):
+    """ :return: begin of the quarter-hour interval containing the seconds since the epoch """
+    return seconds // _UTC_OFFSET_INTERVAL_SECONDS * _UTC_OFFSET_INTERVAL_SECONDS
+
+
+def _local_utc_offset(epoch_seconds: float) -> Tuple[int, float]:
+    """
+    :param epoch_seconds: Seconds since the epoch
+    :return: UTC offset of the local time in seconds
+    and the seconds since the epoch until which the offset stays the same
+    """
+    utc_offset = datetime.fromtimestamp(epoch_seconds).astimezone().utcoffset().total_seconds()
+    return int(utc_offset), _utc_offset_interval_start(epoch_seconds) + _UTC_OFFSET_INTERVAL_SECONDS
+
+
+def _local_epoch_seconds(naive_seconds: np.ndarray) -> np.ndarray:
+    """
+    Vectorized equivalent of calling `datetime.timestamp()` on naive (local time) datetimes.
+    :param naive_seconds: Seconds since the epoch of the naive datetimes, interpreted as UTC
+    :return: Seconds since the epoch of the naive datetimes, interpreted as local time
+    """
+
+    if len(naive_seconds) == 0:
+        return naive_seconds
+
+    interval_starts = _utc_offset_interval_start(naive_seconds).astype(np.int64)
+    unique_interval_starts, inverse = np.unique(interval_starts, return_inverse=True)
+
+    offsets = np.empty(len(unique_interval_starts), dtype=np.float64)
+    for i, interval_start in enumerate(unique_interval_starts.tolist()):
+        offsets[i] = datetime.fromtimestamp(interval_start, timezone.utc).replace(tzinfo=None).timestamp() \
+            - interval_start
+
+    return naive_seconds + offsets[inverse]
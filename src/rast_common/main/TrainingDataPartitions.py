@@ -0,0 +1,193 @@
+import json
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from itertools import islice
+from typing import Callable, Iterable, Optional, Tuple
+
+from .FileUtils import _write_json_atomically
+
+# A partitioned training database is a directory containing one SQLite training database per day or week
+# and a catalog of these partitions
+CATALOG_FILE = 'catalog.json'
+CATALOG_FORMAT_VERSION = 1
+
+PARTITIONINGS = ('day', 'week')
+
+
+def is_partitioned_training_database(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, CATALOG_FILE))
+
+
+def read_training_data_catalog(directory: str) -> dict:
+    """
+    :param directory: Directory of the partitioned training database
+    :return: catalog with the partitioning and, for each partition file,
+    the first and last day it covers and its number of rows
+    """
+    with open(os.path.join(directory, CATALOG_FILE)) as file:
+        catalog = json.load(file)
+
+    if catalog.get('format_version') != CATALOG_FORMAT_VERSION:
+        raise ValueError(f"Unsupported catalog format version {catalog.get('format_version')} in {directory}")
+
+    return catalog
+
+
+def write_training_data_catalog(directory: str, catalog: dict):
+    _write_json_atomically(os.path.join(directory, CATALOG_FILE), catalog, indent=2, sort_keys=True)
+
+
+def partition_of_day(day: date, partitioning: str) -> Tuple[str, date, date]:
+    """
+    :return: file name of the partition containing the day and the first and last day of the partition
+    """
+    if partitioning == 'day':
+        return f"training_data_{day.isoformat()}.db", day, day
+    if partitioning == 'week':
+        year, week, weekday = day.isocalendar()
+        monday = day - timedelta(days=weekday - 1)
+        return f"training_data_{year}-W{week:02d}.db", monday, monday + timedelta(days=6)
+    raise ValueError(f"Unknown partitioning {partitioning}, expected one of {PARTITIONINGS}")
+
+
+def partition_paths(directory: str, begin_end: Tuple[str, str] = ()) -> list[str]:
+    """
+    :param directory: Directory of the partitioned training database
+    :param begin_end: Optional tuple of the first and last day in the format "%Y %m %d"
+    :return: paths of the partitions overlapping the days, in chronological order
+    """
+    partitions = read_training_data_catalog(directory)['partitions']
+
+    if len(begin_end) > 0:
+        begin = datetime.strptime(begin_end[0], "%Y %m %d").date().isoformat()
+        end = datetime.strptime(begin_end[1], "%Y %m %d").date().isoformat()
+        partitions = {
+            file_name: partition for file_name, partition in partitions.items()
+            if partition['first_day'] <= end and partition['last_day'] >= begin
+        }
+
+    return [
+        os.path.join(directory, file_name)
+        for file_name in sorted(partitions, key=lambda file_name: partitions[file_name]['first_day'])
+    ]
+
+
+def map_partitions_in_order(
+        function: Callable[[str], object],
+        paths: Iterable[str],
+        max_workers: Optional[int] = None
+) -> Iterable:
+    """
+    Applies the function to the partitions in a thread pool and yields the results in the order of the paths.
+    SQLite releases the GIL while it executes the queries, so the partitions are scanned in parallel.
+    At most max_workers results are computed ahead of the consumer, which limits the memory held by the results.
+    :param function: function reading a partition
+    :param paths: paths of the partitions
+    :param max_workers: Number of threads, defaults to the number of CPUs
+    """
+    paths = list(paths)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        next_path_index = 0
+
+        while next_path_index < len(paths) or len(pending) > 0:
+            while next_path_index < len(paths) and len(pending) < max_workers:
+                pending.append(executor.submit(function, paths[next_path_index]))
+                next_path_index += 1
+
+            yield pending.popleft().result()
+
+
+# Marks the end of the results of a partition in the queue of its worker
+_END_OF_PARTITION = object()
+
+
+class _PartitionError:
+    """ Exception raised by a worker, passed through its queue to be raised by the consumer """
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def stream_partitions_in_order(
+        function: Callable[[str], Iterable],
+        paths: Iterable[str],
+        max_workers: Optional[int] = None,
+        chunk_size: int = 1000,
+        max_chunks_ahead: int = 2
+) -> Iterable:
+    """
+    Iterates over the results of the function for the partitions in a thread pool
+    and yields the items in the order of the paths.
+    Unlike map_partitions_in_order, the workers do not read whole partitions ahead of the consumer:
+    each worker passes the items in chunks through a queue of at most max_chunks_ahead chunks and waits while it is full,
+    so that at most max_workers * (max_chunks_ahead + 2) chunks are held in memory.
+    :param function: function streaming the items of a partition, e.g., the rows or batches of rows
+    :param paths: paths of the partitions
+    :param max_workers: Number of threads, defaults to the number of CPUs
+    :param chunk_size: number of items passed to the consumer at a time
+    :param max_chunks_ahead: number of chunks a worker reads ahead of the consumer
+    """
+    paths = list(paths)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    stopped = threading.Event()
+
+    def read_partition(path: str, chunks: queue.Queue):
+        items = iter(())
+        try:
+            items = iter(function(path))
+            while not stopped.is_set():
+                chunk = list(islice(items, chunk_size))
+                if len(chunk) == 0:
+                    chunks.put(_END_OF_PARTITION)
+                    break
+                chunks.put(chunk)
+        except BaseException as e:
+            if not stopped.is_set():
+                chunks.put(_PartitionError(e))
+        finally:
+            # close the reader of the partition, e.g., its session, also if the consumer stopped early
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        next_path_index = 0
+
+        try:
+            while next_path_index < len(paths) or len(pending) > 0:
+                while next_path_index < len(paths) and len(pending) < max_workers:
+                    chunks = queue.Queue(maxsize=max_chunks_ahead)
+                    executor.submit(read_partition, paths[next_path_index], chunks)
+                    pending.append(chunks)
+                    next_path_index += 1
+
+                chunks = pending[0]
+                while True:
+                    chunk = chunks.get()
+                    if chunk is _END_OF_PARTITION:
+                        break
+                    if isinstance(chunk, _PartitionError):
+                        raise chunk.error
+                    yield from chunk
+                pending.popleft()
+        finally:
+            # workers waiting for space in their queue put at most one more chunk after the queue is emptied,
+            # then they see that the consumer stopped, so that leaving the executor does not wait forever
+            stopped.set()
+            for chunks in pending:
+                while True:
+                    try:
+                        chunks.get_nowait()
+                    except queue.Empty:
+                        break
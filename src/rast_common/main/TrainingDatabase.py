@@ -1,64 +1,376 @@
-from datetime import datetime
+import logging
+from bisect import bisect_left
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import datetime, timedelta, date
+from itertools import islice, repeat
+from operator import attrgetter
 from typing import Optional, Iterable
 
-from sqlalchemy import create_engine, String, Float, TIMESTAMP, Engine, and_, func, select, insert, between
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, String, Float, TIMESTAMP, Date, Engine, Connection, and_, func, select, \
+    insert, type_coerce, ColumnElement, delete, BigInteger, LargeBinary, ForeignKey, inspect
 from sqlalchemy.dialects.mysql import SMALLINT, INTEGER
-from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped, Session
+from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped, Session, relationship
+from sqlalchemy.sql.expression import UnaryExpression
+from sqlalchemy.sql.operators import custom_op
 
+from .EngineManager import get_read_engine
+from .Instrumentation import INSTRUMENTATION
 from .StringUtils import get_date_from_string
-from ..Version import TrainingDataEntityVersion, SELECTED_VERSION
+from .TrainingDataPartitions import is_partitioned_training_database, partition_paths, stream_partitions_in_order
+from ..Version import TrainingDataEntityVersion, get_selected_version
+
+_logger = logging.getLogger(__name__)
+
+# Number of rows inserted per executemany call (and per transaction in ingest_training_data)
+DEFAULT_INGESTION_BATCH_SIZE = 50000
 
 
 class Base(DeclarativeBase):
+    """ tables shared by all schema versions, i.e., the ingestion manifest and the rollups.
+    Base.metadata also holds the training_data table of the version selected when this module is imported,
+    see _add_training_data_tables_to_base, use create_training_data_table to create the tables of another version.
+    """
+
+
+# The schema versions map the training_data table differently, so the entities of each version have their own
+# declarative base. The entity of the selected version is looked up when a function is called,
+# see _training_data_entity, so that select_version also takes effect after this module was imported.
+class _TrainingDataBaseV1(DeclarativeBase):
     pass
 
 
-print(f"TrainingDataEntityVersion: {SELECTED_VERSION}")
-
-if SELECTED_VERSION == TrainingDataEntityVersion.V1:
-    class TrainingDataEntityV1(Base):
-        __tablename__ = 'training_data'
-        id: Mapped[int] = mapped_column(INTEGER(unsigned=True), primary_key=True, autoincrement=True)
-        timestamp: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False, index=True)
-        number_of_parallel_requests_start: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
-        number_of_parallel_requests_end: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
-        number_of_parallel_requests_finished: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
-        request_type: Mapped[str] = mapped_column(String, nullable=False, index=True)
-        system_cpu_usage: Mapped[float] = mapped_column(Float, nullable=False)
-        requests_per_second: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
-        requests_per_minute: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
-        request_execution_time_ms: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
-else:
-    class TrainingDataEntity(Base):
-        __tablename__ = 'training_data'
-        id: Mapped[int] = mapped_column(INTEGER(unsigned=True), primary_key=True, autoincrement=True)
-        timestamp: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False, index=True)
-        number_of_parallel_requests_start: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
-        number_of_parallel_requests_end: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
-        number_of_parallel_requests_finished: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
-        request_type: Mapped[str] = mapped_column(String, nullable=False, index=True)
-        system_cpu_usage: Mapped[float] = mapped_column(Float, nullable=False)
-        requests_per_second: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
-        requests_per_minute: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
-        switch_id: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
-        bytes_per_second_transmitted_through_switch: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
-        packets_per_second_transmitted_through_switch: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
-        request_execution_time_ms: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+class _TrainingDataBase(DeclarativeBase):
+    pass
+
+
+class _TrainingDataBaseV3(DeclarativeBase):
+    pass
+
+
+class TrainingDataEntityV1(_TrainingDataBaseV1):
+    __tablename__ = 'training_data'
+    id: Mapped[int] = mapped_column(INTEGER(unsigned=True), primary_key=True, autoincrement=True)
+    timestamp: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False, index=True)
+    number_of_parallel_requests_start: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
+    number_of_parallel_requests_end: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
+    number_of_parallel_requests_finished: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
+    request_type: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    system_cpu_usage: Mapped[float] = mapped_column(Float, nullable=False)
+    requests_per_second: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    requests_per_minute: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    request_execution_time_ms: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+
+
+class TrainingDataEntity(_TrainingDataBase):
+    __tablename__ = 'training_data'
+    id: Mapped[int] = mapped_column(INTEGER(unsigned=True), primary_key=True, autoincrement=True)
+    timestamp: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False, index=True)
+    number_of_parallel_requests_start: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
+    number_of_parallel_requests_end: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
+    number_of_parallel_requests_finished: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
+    request_type: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    system_cpu_usage: Mapped[float] = mapped_column(Float, nullable=False)
+    requests_per_second: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    requests_per_minute: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    switch_id: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    bytes_per_second_transmitted_through_switch: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    packets_per_second_transmitted_through_switch: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    request_execution_time_ms: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+
+
+class RequestTypeEntity(_TrainingDataBaseV3):
+    """
+    Request types referenced by the training data, with stable ids starting at 0 in order of first appearance,
+    which are used as the ordinal encoding of the request types.
+    """
+    __tablename__ = 'request_types'
+    id: Mapped[int] = mapped_column(INTEGER(unsigned=True), primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+
+
+class TrainingDataEntityV3(_TrainingDataBaseV3):
+    __tablename__ = 'training_data'
+    id: Mapped[int] = mapped_column(INTEGER(unsigned=True), primary_key=True, autoincrement=True)
+    timestamp: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False, index=True)
+    number_of_parallel_requests_start: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
+    number_of_parallel_requests_end: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
+    number_of_parallel_requests_finished: Mapped[int] = mapped_column(SMALLINT(unsigned=True), nullable=False)
+    request_type_id: Mapped[int] = mapped_column(
+        INTEGER(unsigned=True), ForeignKey('request_types.id'), nullable=False, index=True
+    )
+    system_cpu_usage: Mapped[float] = mapped_column(Float, nullable=False)
+    requests_per_second: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    requests_per_minute: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    switch_id: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    bytes_per_second_transmitted_through_switch: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    packets_per_second_transmitted_through_switch: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    request_execution_time_ms: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    request_type_entry: Mapped[RequestTypeEntity] = relationship(lazy='joined')
+
+    @property
+    def request_type(self) -> str:
+        return self.request_type_entry.name
+
+
+class IngestionManifestEntity(Base):
+    """
+    One entry per day of training data stored in the training_data table,
+    so that checking whether a log file was already ingested does not need to scan the training data.
+    Log files without training data of their day are recorded with a row count of 0
+    and the begin of the day as first and last timestamp.
+    """
+    __tablename__ = 'ingestion_manifest'
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    log_file: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    row_count: Mapped[int] = mapped_column(INTEGER(unsigned=True), nullable=False)
+    first_timestamp: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+    last_timestamp: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+
+
+class _TrainingDataRollup:
+    """
+    Aggregates of the training data rows of one request type within a bucket of time,
+    updated by the insert functions, see read_training_data_rollups.
+    The histogram holds the counts of the request execution times, see _histogram_bins.
+    """
+    bucket: Mapped[datetime] = mapped_column(TIMESTAMP, primary_key=True)
+    request_type: Mapped[str] = mapped_column(String, primary_key=True)
+    row_count: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sum_request_execution_time_ms: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    min_request_execution_time_ms: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    max_request_execution_time_ms: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sum_system_cpu_usage: Mapped[float] = mapped_column(Float, nullable=False)
+    sum_bytes_per_second_transmitted_through_switch: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sum_packets_per_second_transmitted_through_switch: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    histogram: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class TrainingDataRollupPerSecondEntity(_TrainingDataRollup, Base):
+    __tablename__ = 'training_data_rollup_second'
+
+
+class TrainingDataRollupPerMinuteEntity(_TrainingDataRollup, Base):
+    __tablename__ = 'training_data_rollup_minute'
+
+
+class TrainingDataRollupPerDayEntity(_TrainingDataRollup, Base):
+    __tablename__ = 'training_data_rollup_day'
+
+
+# Rollup entity of each resolution
+ROLLUP_ENTITIES = {
+    "second": TrainingDataRollupPerSecondEntity,
+    "minute": TrainingDataRollupPerMinuteEntity,
+    "day": TrainingDataRollupPerDayEntity,
+}
+
+# Length of the prefix of a stored timestamp that identifies the bucket of each resolution
+# and the suffix completing the prefix to the timestamp of the start of the bucket
+_ROLLUP_BUCKET_FORMAT = {
+    "second": (19, ""),
+    "minute": (16, ":00"),
+    "day": (10, " 00:00:00"),
+}
+
+_ROLLUP_AGGREGATE_FIELDS = (
+    "row_count",
+    "sum_request_execution_time_ms",
+    "min_request_execution_time_ms",
+    "max_request_execution_time_ms",
+    "sum_system_cpu_usage",
+    "sum_bytes_per_second_transmitted_through_switch",
+    "sum_packets_per_second_transmitted_through_switch",
+)
+
+# Function combining the values of an aggregate field of the rows or rollups of a group, np.add for the others
+_ROLLUP_AGGREGATE_FUNCTIONS = {
+    "min_request_execution_time_ms": np.minimum,
+    "max_request_execution_time_ms": np.maximum,
+}
+
+# Request execution times are counted in exact bins below _HISTOGRAM_LINEAR_BINS ms
+# and in _HISTOGRAM_BINS_PER_POWER_OF_TWO bins per power of two above, i.e., with a relative error below 4 %.
+# Histograms are stored sparsely as pairs of bin and count.
+_HISTOGRAM_LINEAR_BINS = 64
+_HISTOGRAM_BINS_PER_POWER_OF_TWO = 16
+_HISTOGRAM_DTYPE = np.dtype([('bin', '<u2'), ('count', '<u4')])
+# Upper bound of the number of bins, for request execution times below 2^32 ms
+_HISTOGRAM_MAX_BINS = 1024
+
+
+def _histogram_bins(request_execution_times_ms: np.ndarray) -> np.ndarray:
+    values = np.maximum(np.asarray(request_execution_times_ms, dtype=np.int64), 0)
+    # floor(log2(value)) of values >= 1
+    exponent = np.frexp(values.astype(np.float64))[1] - 1
+    shift = np.maximum(exponent - 4, 0)
+    sub_bin = (values >> shift) - _HISTOGRAM_BINS_PER_POWER_OF_TWO
+    logarithmic_bin = _HISTOGRAM_LINEAR_BINS + (exponent - 6) * _HISTOGRAM_BINS_PER_POWER_OF_TWO + sub_bin
+    return np.where(values < _HISTOGRAM_LINEAR_BINS, values, logarithmic_bin)
+
+
+def _histogram_bin_values(bins: np.ndarray) -> np.ndarray:
+    """
+    :return: the middle of the request execution times counted in each bin
+    """
+    bins = np.asarray(bins, dtype=np.int64)
+    above_linear_bins = np.maximum(bins - _HISTOGRAM_LINEAR_BINS, 0)
+    exponent = above_linear_bins // _HISTOGRAM_BINS_PER_POWER_OF_TWO + 6
+    width = np.left_shift(1, exponent - 4)
+    lower = (_HISTOGRAM_BINS_PER_POWER_OF_TWO + above_linear_bins % _HISTOGRAM_BINS_PER_POWER_OF_TWO) * width
+    return np.where(bins < _HISTOGRAM_LINEAR_BINS, bins, lower + (width - 1) / 2)
+
+
+def _merge_histograms(histograms: Iterable[bytes]) -> bytes:
+    entries = np.concatenate([np.frombuffer(histogram, dtype=_HISTOGRAM_DTYPE) for histogram in histograms])
+    bins, inverse = np.unique(entries['bin'], return_inverse=True)
+    merged = np.empty(len(bins), dtype=_HISTOGRAM_DTYPE)
+    merged['bin'] = bins
+    merged['count'] = np.bincount(inverse, weights=entries['count'], minlength=len(bins))
+    return merged.tobytes()
+
+
+def _aggregate_rollups_by_group(group_of_item: np.ndarray, aggregates: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """ combine the aggregates of the items of each group, e.g., of the rows or of the rollups of a finer resolution.
+    :param group_of_item: group of each item, numbered from 0 without gaps
+    :param aggregates: array per field of _ROLLUP_AGGREGATE_FIELDS, with one value per item
+    :return: array per field, with one value per group
+    """
+    order = np.argsort(group_of_item, kind='stable')
+    group_starts = np.flatnonzero(np.diff(group_of_item[order], prepend=-1))
+    return {
+        field: _ROLLUP_AGGREGATE_FUNCTIONS.get(field, np.add).reduceat(values[order], group_starts)
+        for field, values in aggregates.items()
+    }
+
+
+def _group_histograms(group_of_row: np.ndarray, bins: np.ndarray, number_of_groups: int) -> list[bytes]:
+    """ count the histogram bins of the rows of each group, sorted by bin. """
+    group_and_bin, counts = np.unique(group_of_row * _HISTOGRAM_MAX_BINS + bins, return_counts=True)
+    histogram_entries = np.empty(len(counts), dtype=_HISTOGRAM_DTYPE)
+    histogram_entries['bin'] = group_and_bin % _HISTOGRAM_MAX_BINS
+    histogram_entries['count'] = counts
+    entry_offsets = np.concatenate((
+        [0],
+        np.cumsum(np.bincount(group_and_bin // _HISTOGRAM_MAX_BINS, minlength=number_of_groups))
+    )) * _HISTOGRAM_DTYPE.itemsize
+    histogram_bytes = histogram_entries.tobytes()
+    return [histogram_bytes[begin:end] for begin, end in zip(entry_offsets[:-1].tolist(), entry_offsets[1:].tolist())]
+
+
+def _update_training_data_rollups(connection: Connection, batch: list[tuple], fields: tuple[str, ...]):
+    """ add the rows of a batch of inserted values to the rollups of each resolution.
+    The rows are aggregated once per second and request type,
+    the rollups of the coarser resolutions are aggregated from those of the seconds.
+    """
+    def column(field: str, dtype) -> np.ndarray:
+        if field in fields:
+            position = fields.index(field)
+            return np.array([row_values[position] for row_values in batch], dtype=dtype)
+        return np.full(len(batch), _TRAINING_DATA_FIELD_DEFAULTS[field], dtype=dtype)
+
+    request_execution_times_ms = column("request_execution_time_ms", np.int64)
+    bins = _histogram_bins(request_execution_times_ms)
+
+    # group the rows by second and request type, numbered in the order of the seconds and request types
+    second_prefix_length = _ROLLUP_BUCKET_FORMAT["second"][0]
+    seconds, second_of_row = np.unique(column("timestamp", f"U{second_prefix_length}"), return_inverse=True)
+    request_types, request_type_of_row = np.unique(column("request_type", str), return_inverse=True)
+    second_groups, second_group_of_row = np.unique(
+        second_of_row * len(request_types) + request_type_of_row,
+        return_inverse=True
+    )
+    second_aggregates = _aggregate_rollups_by_group(second_group_of_row, {
+        "row_count": np.ones(len(batch), dtype=np.int64),
+        "sum_request_execution_time_ms": request_execution_times_ms,
+        "min_request_execution_time_ms": request_execution_times_ms,
+        "max_request_execution_time_ms": request_execution_times_ms,
+        "sum_system_cpu_usage": column("system_cpu_usage", np.float64),
+        "sum_bytes_per_second_transmitted_through_switch":
+            column("bytes_per_second_transmitted_through_switch", np.int64),
+        "sum_packets_per_second_transmitted_through_switch":
+            column("packets_per_second_transmitted_through_switch", np.int64),
+    })
+    second_of_group = second_groups // len(request_types)
+    request_type_of_second_group = second_groups % len(request_types)
+
+    for resolution, entity in ROLLUP_ENTITIES.items():
+        prefix_length, suffix = _ROLLUP_BUCKET_FORMAT[resolution]
+
+        if resolution == "second":
+            buckets, groups, group_of_row, aggregates = seconds, second_groups, second_group_of_row, second_aggregates
+        else:
+            buckets, bucket_of_second = np.unique(seconds.astype(f"U{prefix_length}"), return_inverse=True)
+            groups, group_of_second_group = np.unique(
+                bucket_of_second[second_of_group] * len(request_types) + request_type_of_second_group,
+                return_inverse=True
+            )
+            group_of_row = group_of_second_group[second_group_of_row]
+            aggregates = _aggregate_rollups_by_group(group_of_second_group, second_aggregates)
+
+        rollups = list(zip(
+            [bucket + suffix for bucket in buckets[groups // len(request_types)].tolist()],
+            request_types[groups % len(request_types)].tolist(),
+            *[aggregates[field].tolist() for field in _ROLLUP_AGGREGATE_FIELDS],
+            _group_histograms(group_of_row, bins, len(groups))
+        ))
+
+        # merge with the rollups of buckets that earlier batches already wrote to,
+        # only the range of buckets of the batch has to be read
+        table = entity.__tablename__
+        existing_rollups = connection.exec_driver_sql(
+            f"SELECT bucket, request_type, {', '.join(_ROLLUP_AGGREGATE_FIELDS)}, histogram FROM {table} "
+            f"WHERE bucket >= ? AND bucket <= ?",
+            (rollups[0][0], rollups[-1][0])
+        ).fetchall()
+
+        for existing_rollup in existing_rollups:
+            # the rollups are sorted by bucket and request type, which a shorter tuple precedes
+            key = (existing_rollup[0], existing_rollup[1])
+            index = bisect_left(rollups, key)
+            if index == len(rollups) or rollups[index][:2] != key:
+                continue
+            bucket, request_type, row_count, sum_ms, min_ms, max_ms, sum_cpu, sum_bytes, sum_packets, histogram = \
+                rollups[index]
+            rollups[index] = (
+                bucket,
+                request_type,
+                row_count + existing_rollup[2],
+                sum_ms + existing_rollup[3],
+                min(min_ms, existing_rollup[4]),
+                max(max_ms, existing_rollup[5]),
+                sum_cpu + existing_rollup[6],
+                sum_bytes + existing_rollup[7],
+                sum_packets + existing_rollup[8],
+                _merge_histograms([histogram, existing_rollup[9]]),
+            )
+
+        connection.exec_driver_sql(
+            f"INSERT OR REPLACE INTO {table} "
+            f"(bucket, request_type, {', '.join(_ROLLUP_AGGREGATE_FIELDS)}, histogram) "
+            f"VALUES ({', '.join('?' * (len(_ROLLUP_AGGREGATE_FIELDS) + 3))})",
+            rollups
+        )
 
 
 class TrainingDataRow:
-    _timestamp: datetime = None
-    _number_of_parallel_requests_start: int = None
-    _number_of_parallel_requests_end: int = None
-    _number_of_parallel_requests_finished: int = None
-    _request_type: str = None
-    _system_cpu_usage: float = 0.
-    _requests_per_second: int = 0
-    _requests_per_minute: int = 0
-    _switch_id: int = 0
-    _bytes_per_second_transmitted_through_switch: int = 0
-    _packets_per_second_transmitted_through_switch: int = 0
-    _request_execution_time_ms: int = None
+    # a fixed layout instead of a per-instance __dict__, since millions of rows may be held in memory
+    __slots__ = (
+        "_timestamp",
+        "_number_of_parallel_requests_start",
+        "_number_of_parallel_requests_end",
+        "_number_of_parallel_requests_finished",
+        "_request_type",
+        "_system_cpu_usage",
+        "_requests_per_second",
+        "_requests_per_minute",
+        "_switch_id",
+        "_bytes_per_second_transmitted_through_switch",
+        "_packets_per_second_transmitted_through_switch",
+        "_request_execution_time_ms",
+    )
 
     @staticmethod
     def from_logfile_entry(logfile_entry):
@@ -86,6 +398,39 @@ class TrainingDataRow:
             self._bytes_per_second_transmitted_through_switch = entity.bytes_per_second_transmitted_through_switch if hasattr(entity, "bytes_per_second_transmitted_through_switch") else 0
             self._packets_per_second_transmitted_through_switch = entity.packets_per_second_transmitted_through_switch if hasattr(entity, "packets_per_second_transmitted_through_switch") else 0
             self._request_execution_time_ms = entity.request_execution_time_ms
+        else:
+            self._timestamp = None
+            self._number_of_parallel_requests_start = None
+            self._number_of_parallel_requests_end = None
+            self._number_of_parallel_requests_finished = None
+            self._request_type = None
+            self._system_cpu_usage = 0.
+            self._requests_per_second = 0
+            self._requests_per_minute = 0
+            self._switch_id = 0
+            self._bytes_per_second_transmitted_through_switch = 0
+            self._packets_per_second_transmitted_through_switch = 0
+            self._request_execution_time_ms = None
+
+    @staticmethod
+    def _from_values(values: tuple):
+        """ create a row from the values of all fields in the order of _TRAINING_DATA_FIELDS, without defaults. """
+        row = TrainingDataRow.__new__(TrainingDataRow)
+        (
+            row._timestamp,
+            row._number_of_parallel_requests_start,
+            row._number_of_parallel_requests_end,
+            row._number_of_parallel_requests_finished,
+            row._request_type,
+            row._system_cpu_usage,
+            row._requests_per_second,
+            row._requests_per_minute,
+            row._switch_id,
+            row._bytes_per_second_transmitted_through_switch,
+            row._packets_per_second_transmitted_through_switch,
+            row._request_execution_time_ms,
+        ) = values
+        return row
 
     def __str__(self):
         return str.strip(f"""
@@ -216,99 +561,949 @@ def create_connection_using_sqlalchemy(db_file, enable_sql_logging=False) -> Opt
     return engine
 
 
-def create_training_data_table(engine: Engine):
+def create_training_data_table(engine: Engine, version: Optional[TrainingDataEntityVersion] = None):
+    """ create the training_data table of the schema version and the tables shared by all versions.
+    Databases created before the ingestion manifest or the rollups existed are migrated once,
+    by backfilling the manifest and rebuilding the rollups from the training data.
+    Both read all rows, so they are logged as warnings.
+    :param engine: Engine of the training database
+    :param version: Version of the training data schema, defaults to the selected version
+    """
+    version = _resolve_version(version)
+
     try:
-        # Create the table if it does not exist
-        Base.metadata.create_all(engine, checkfirst=True)
+        # Create the tables if they do not exist
+        Base.metadata.create_all(engine, tables=_SHARED_TABLES, checkfirst=True)
+        training_data_entity = _training_data_entity(version)
+        training_data_entity.metadata.create_all(engine, checkfirst=True)
+
+        # Databases created before the ingestion manifest existed have to be backfilled once
+        with Session(engine) as session:
+            manifest_is_empty = session.execute(select(IngestionManifestEntity.day).limit(1)).first() is None
+            training_data_table = training_data_entity.__table__
+            training_data_is_empty = session.execute(select(training_data_table.c.id).limit(1)).first() is None
+
+            rollups_are_empty = session.execute(
+                select(TrainingDataRollupPerDayEntity.bucket).limit(1)
+            ).first() is None
+
+        if manifest_is_empty and not training_data_is_empty:
+            _logger.warning("%s has no ingestion manifest, backfilling it from the training data", engine.url.database)
+            backfill_ingestion_manifest(engine, version)
+
+        # Databases created before the rollups existed have to be rebuilt once
+        if rollups_are_empty and not training_data_is_empty:
+            _logger.warning(
+                "%s has no rollups, rebuilding them from the training data, which reads all rows once",
+                engine.url.database
+            )
+            rebuild_training_data_rollups(engine, version=version)
     except Exception as e:
         print(e)
 
 
+def backfill_ingestion_manifest(engine: Engine, version: Optional[TrainingDataEntityVersion] = None):
+    """ rebuild the ingestion manifest from the rows stored in the training_data table.
+    This is done automatically by create_training_data_table for databases without a manifest.
+    :param engine: Engine of the training database
+    :param version: Version of the training data schema, defaults to the selected version
+    """
+    training_data_table = _training_data_entity(_resolve_version(version)).__table__
+    day = func.date(training_data_table.c.timestamp)
+
+    with Session(engine) as session:
+        session.execute(delete(IngestionManifestEntity))
+        session.execute(
+            insert(IngestionManifestEntity).from_select(
+                ['day', 'row_count', 'first_timestamp', 'last_timestamp'],
+                select(
+                    day,
+                    func.count(),
+                    func.min(training_data_table.c.timestamp),
+                    func.max(training_data_table.c.timestamp)
+                ).group_by(day)
+            )
+        )
+        session.commit()
+
+
+def rebuild_training_data_rollups(
+        engine: Engine,
+        batch_size: int = DEFAULT_INGESTION_BATCH_SIZE,
+        version: Optional[TrainingDataEntityVersion] = None
+):
+    """ rebuild the rollups of all resolutions from the rows stored in the training_data table.
+    This is done automatically by create_training_data_table for databases without rollups.
+    :param engine: Engine of the training database
+    :param batch_size: number of rows aggregated at a time
+    :param version: Version of the training data schema, defaults to the selected version
+    """
+    version = _resolve_version(version)
+
+    fields = _training_data_fields(version)
+    select_sql = (
+        f"SELECT id, {', '.join(_training_data_select_sql_columns(fields, version))} FROM training_data "
+        f"WHERE id > ? ORDER BY id LIMIT ?"
+    )
+
+    with engine.connect() as connection:
+        for entity in ROLLUP_ENTITIES.values():
+            connection.execute(delete(entity))
+
+        last_id = 0
+        while True:
+            rows = connection.exec_driver_sql(select_sql, (last_id, batch_size)).fetchall()
+            if len(rows) == 0:
+                break
+            last_id = rows[-1][0]
+            _update_training_data_rollups(connection, [tuple(row[1:]) for row in rows], fields)
+
+        connection.commit()
+
+
+# Fields of the training_data table in the order in which they are inserted
+_TRAINING_DATA_FIELDS = (
+    "timestamp",
+    "number_of_parallel_requests_start",
+    "number_of_parallel_requests_end",
+    "number_of_parallel_requests_finished",
+    "request_type",
+    "system_cpu_usage",
+    "requests_per_second",
+    "requests_per_minute",
+    "switch_id",
+    "bytes_per_second_transmitted_through_switch",
+    "packets_per_second_transmitted_through_switch",
+    "request_execution_time_ms",
+)
+
+_SWITCH_FIELDS = (
+    "switch_id",
+    "bytes_per_second_transmitted_through_switch",
+    "packets_per_second_transmitted_through_switch",
+)
+
+# Values of fields that are missing in a column batch, same as the defaults of TrainingDataRow
+_TRAINING_DATA_FIELD_DEFAULTS = {
+    "system_cpu_usage": 0.,
+    "requests_per_second": 0,
+    "requests_per_minute": 0,
+    "switch_id": 0,
+    "bytes_per_second_transmitted_through_switch": 0,
+    "packets_per_second_transmitted_through_switch": 0,
+}
+
+# Types of the columns of a TrainingDataRowBatch.
+# Timestamps use nanoseconds, the resolution pandas uses, so that converting to a DataFrame does not copy.
+TRAINING_DATA_ROW_BATCH_DTYPE = np.dtype([
+    ("timestamp", "datetime64[ns]"),
+    ("number_of_parallel_requests_start", np.int64),
+    ("number_of_parallel_requests_end", np.int64),
+    ("number_of_parallel_requests_finished", np.int64),
+    ("request_type", object),
+    ("system_cpu_usage", np.float64),
+    ("requests_per_second", np.int64),
+    ("requests_per_minute", np.int64),
+    ("switch_id", np.int64),
+    ("bytes_per_second_transmitted_through_switch", np.int64),
+    ("packets_per_second_transmitted_through_switch", np.int64),
+    ("request_execution_time_ms", np.int64),
+])
+
+# Number of rows per TrainingDataRowBatch produced by the batch readers
+DEFAULT_READ_BATCH_SIZE = 65536
+
+# Number of rows of a partition passed at a time from the worker thread reading it to the consumer of the rows
+_PARTITION_CHUNK_SIZE = 1000
+
+_UPSERT_INGESTION_MANIFEST_SQL = (
+    "INSERT INTO ingestion_manifest (day, log_file, row_count, first_timestamp, last_timestamp) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (day) DO UPDATE SET "
+    "log_file = coalesce(excluded.log_file, log_file), "
+    "row_count = row_count + excluded.row_count, "
+    # the two-argument forms of min and max are scalar functions in SQLite,
+    # the timestamps of entries of log files without training data are placeholders
+    "first_timestamp = CASE WHEN row_count = 0 THEN excluded.first_timestamp "
+    "ELSE min(first_timestamp, excluded.first_timestamp) END, "
+    "last_timestamp = CASE WHEN row_count = 0 THEN excluded.last_timestamp "
+    "ELSE max(last_timestamp, excluded.last_timestamp) END"
+)
+
+_INSERT_EMPTY_INGESTION_MANIFEST_SQL = (
+    "INSERT INTO ingestion_manifest (day, log_file, row_count, first_timestamp, last_timestamp) "
+    "VALUES (?, ?, 0, ?, ?) "
+    "ON CONFLICT (day) DO NOTHING"
+)
+
+
+@dataclass
+class IngestionStatistics:
+    row_count: int
+    duration_s: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.row_count / self.duration_s if self.duration_s > 0 else float(self.row_count)
+
+
+class TrainingDataRowBatch:
+    """
+    Training data rows stored column by column, with one NumPy array per field of TrainingDataRow
+    (see TRAINING_DATA_ROW_BATCH_DTYPE for the types).
+    Moving millions of rows as batches avoids creating a Python object per row and per value.
+
+    Batches are produced by `read_training_data_batches_from_db` and accepted by the insert functions.
+    Iterating over a batch yields TrainingDataRow objects, for code that works row by row.
+
+    Example:
+
+    ```
+    for batch in read_training_data_batches_from_db(r"db/trainingdata_2021-04-06.db", ("2021 03 30", "2021 04 05")):
+        df = batch.to_dataframe()
+    ```
+    """
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: Mapping[str, Iterable]):
+        """
+        :param columns: values of each field. Fields with defaults in TrainingDataRow may be missing.
+        Columns that already have the type of TRAINING_DATA_ROW_BATCH_DTYPE are not copied.
+        """
+        length = None
+        self.columns: dict[str, np.ndarray] = {}
+
+        for field in _TRAINING_DATA_FIELDS:
+            if field in columns:
+                column = np.asarray(columns[field], dtype=TRAINING_DATA_ROW_BATCH_DTYPE[field])
+                if length is None:
+                    length = len(column)
+                elif len(column) != length:
+                    raise ValueError(f"Column {field} has {len(column)} values instead of {length}")
+                self.columns[field] = column
+            elif field not in _TRAINING_DATA_FIELD_DEFAULTS:
+                raise KeyError(f"Column batch is missing the field {field}")
+
+        for field, default in _TRAINING_DATA_FIELD_DEFAULTS.items():
+            if field not in self.columns:
+                self.columns[field] = np.full(length, default, dtype=TRAINING_DATA_ROW_BATCH_DTYPE[field])
+
+        # keep the order of the fields, independent of the order of the given columns
+        self.columns = {field: self.columns[field] for field in _TRAINING_DATA_FIELDS}
+
+    @staticmethod
+    def from_rows(rows: Iterable[TrainingDataRow]):
+        rows = list(rows)
+        return TrainingDataRowBatch({
+            field: [getattr(row, field) for row in rows] for field in _TRAINING_DATA_FIELDS
+        })
+
+    @staticmethod
+    def from_logfile_entries(logfile_entries: Iterable[dict]):
+        """ batch version of `TrainingDataRow.from_logfile_entry`. """
+        logfile_entries = list(logfile_entries)
+        return TrainingDataRowBatch({
+            "timestamp": [entry['time_stamp'] for entry in logfile_entries],
+            "number_of_parallel_requests_start": [
+                entry['number_of_parallel_requests_start'] for entry in logfile_entries
+            ],
+            "number_of_parallel_requests_end": [entry['number_of_parallel_requests_end'] for entry in logfile_entries],
+            "number_of_parallel_requests_finished": [
+                entry['number_of_parallel_requests_finished'] for entry in logfile_entries
+            ],
+            "request_type": [entry['request_type'] for entry in logfile_entries],
+            "request_execution_time_ms": [entry['response_time'] for entry in logfile_entries],
+        })
+
+    @staticmethod
+    def from_structured_array(array: np.ndarray):
+        """
+        :param array: structured array with (at least) the fields of TRAINING_DATA_ROW_BATCH_DTYPE.
+        The columns of the batch are views of the fields of the array if the types match.
+        """
+        return TrainingDataRowBatch({field: array[field] for field in array.dtype.names})
+
+    @staticmethod
+    def concatenate(batches: Iterable["TrainingDataRowBatch"]):
+        batches = list(batches)
+        if len(batches) == 0:
+            return TrainingDataRowBatch({field: [] for field in _TRAINING_DATA_FIELDS})
+        return TrainingDataRowBatch({
+            field: np.concatenate([batch.columns[field] for batch in batches]) for field in _TRAINING_DATA_FIELDS
+        })
+
+    def __len__(self):
+        return len(self.columns["timestamp"])
+
+    def __iter__(self) -> Iterable[TrainingDataRow]:
+        # convert each column to Python values once, instead of every value on its own
+        columns = [
+            self.columns["timestamp"].astype("datetime64[us]").tolist()
+        ] + [
+            self.columns[field].tolist() for field in _TRAINING_DATA_FIELDS[1:]
+        ]
+        return map(TrainingDataRow._from_values, zip(*columns))
+
+    def take(self, indices) -> "TrainingDataRowBatch":
+        """
+        :param indices: indices or boolean mask of the rows to select, e.g., to sort or filter the batch
+        :return: new batch with the selected rows
+        """
+        return TrainingDataRowBatch({field: column[indices] for field, column in self.columns.items()})
+
+    def to_structured_array(self) -> np.ndarray:
+        array = np.empty(len(self), dtype=TRAINING_DATA_ROW_BATCH_DTYPE)
+        for field, column in self.columns.items():
+            array[field] = column
+        return array
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        :return: DataFrame with one column per field, sharing the memory of the columns of the batch
+        """
+        return pd.DataFrame(self.columns, copy=False)
+
+
+def _resolve_version(version: Optional[TrainingDataEntityVersion]) -> TrainingDataEntityVersion:
+    # looked up at call time, so that select_version takes effect after the import of this module
+    return get_selected_version() if version is None else version
+
+
+def _training_data_fields(version: TrainingDataEntityVersion) -> tuple[str, ...]:
+    if version == TrainingDataEntityVersion.V1:
+        return tuple(field for field in _TRAINING_DATA_FIELDS if field not in _SWITCH_FIELDS)
+    return _TRAINING_DATA_FIELDS
+
+
+def _training_data_entity(version: TrainingDataEntityVersion):
+    if version == TrainingDataEntityVersion.V1:
+        return TrainingDataEntityV1
+    if version == TrainingDataEntityVersion.V3:
+        return TrainingDataEntityV3
+    return TrainingDataEntity
+
+
+# Tables shared by all schema versions, created by create_training_data_table for every version
+_SHARED_TABLES = list(Base.metadata.sorted_tables)
+
+
+def _add_training_data_tables_to_base(version: TrainingDataEntityVersion):
+    """ copy the training_data table of the version (and the request_types table of V3) to Base.metadata,
+    where the training_data table was declared when the version was fixed at import time,
+    so that `Base.metadata.create_all(engine)` keeps creating it
+    """
+    for table in _training_data_entity(version).metadata.sorted_tables:
+        table.to_metadata(Base.metadata)
+
+
+_add_training_data_tables_to_base(get_selected_version())
+
+
+# V3 stores the id of the request type instead of its name in the training_data table.
+# The ids are bound as values when rows are inserted, see _register_request_types,
+# the names are translated in SQL when rows are read using raw SQL.
+_REQUEST_TYPE_NAME_SQL = "(SELECT name FROM request_types WHERE id = request_type_id)"
+
+# The id is computed within the statement that inserts the request type, and SQLite never bases a write
+# on a stale read, so that concurrent writers neither assign an id twice nor register a request type twice.
+_REGISTER_REQUEST_TYPE_SQL = (
+    "INSERT OR IGNORE INTO request_types (id, name) SELECT coalesce(max(id), -1) + 1, ? FROM request_types"
+)
+
+
+def _insert_training_data_sql(fields: tuple[str, ...], version: TrainingDataEntityVersion) -> str:
+    if version == TrainingDataEntityVersion.V3:
+        columns = ["request_type_id" if field == "request_type" else field for field in fields]
+    else:
+        columns = fields
+    return f"INSERT INTO training_data ({', '.join(columns)}) VALUES ({', '.join('?' * len(fields))})"
+
+
+def _training_data_select_sql_columns(fields: tuple[str, ...], version: TrainingDataEntityVersion) -> list[str]:
+    if version == TrainingDataEntityVersion.V3:
+        return [_REQUEST_TYPE_NAME_SQL if field == "request_type" else field for field in fields]
+    return list(fields)
+
+
+def _request_type_name_column(training_data_table, version: TrainingDataEntityVersion):
+    if version == TrainingDataEntityVersion.V3:
+        request_types_table = RequestTypeEntity.__table__
+        return select(request_types_table.c.name).where(
+            request_types_table.c.id == training_data_table.c.request_type_id
+        ).scalar_subquery()
+    return training_data_table.c.request_type
+
+
+def _request_type_filter(
+        training_data_table,
+        request_type: str,
+        version: TrainingDataEntityVersion,
+        use_index: bool = True
+):
+    """
+    :param use_index: False to keep SQLite from using the index of the request type column,
+    so that it reads a range of days in the order of the timestamp index instead of sorting the rows
+    """
+    if version == TrainingDataEntityVersion.V3:
+        column = training_data_table.c.request_type_id
+        request_types_table = RequestTypeEntity.__table__
+        value = select(request_types_table.c.id).where(request_types_table.c.name == request_type).scalar_subquery()
+    else:
+        column = training_data_table.c.request_type
+        value = request_type
+
+    if not use_index:
+        # the unary + operator disqualifies the column from the use of an index, see the SQLite query planner
+        column = UnaryExpression(column, operator=custom_op('+'), type_=column.type)
+
+    return column == value
+
+
+def _known_request_type_ids(connection: Connection) -> dict[str, int]:
+    return dict(connection.exec_driver_sql("SELECT name, id FROM request_types").fetchall())
+
+
+def _register_request_types(connection: Connection, request_types: list, known_request_type_ids: dict[str, int]):
+    """ add the request types that are not known yet to the request_types table of V3
+    and update the known ids with the ids of the table.
+    Ids are assigned in order of first appearance, continuing after the greatest id,
+    request types registered by a concurrent writer in the meantime keep their ids.
+    """
+    new_request_types = [
+        request_type for request_type in dict.fromkeys(request_types) if request_type not in known_request_type_ids
+    ]
+    if len(new_request_types) == 0:
+        return
+
+    connection.exec_driver_sql(_REGISTER_REQUEST_TYPE_SQL, [(request_type,) for request_type in new_request_types])
+    known_request_type_ids.update(_known_request_type_ids(connection))
+
+
+def _format_timestamp(timestamp: datetime) -> str:
+    # same format SQLAlchemy uses to store datetimes in SQLite
+    return timestamp.isoformat(' ', 'microseconds')
+
+
+def _column_batch_values(batch, fields: tuple[str, ...]) -> Iterable[tuple]:
+    columns = []
+    for field in fields:
+        if field in batch:
+            column = batch[field]
+        elif field in _TRAINING_DATA_FIELD_DEFAULTS:
+            column = repeat(_TRAINING_DATA_FIELD_DEFAULTS[field])
+        else:
+            raise KeyError(f"Column batch is missing the field {field}")
+
+        if isinstance(column, np.ndarray):
+            if field == "timestamp" and np.issubdtype(column.dtype, np.datetime64):
+                column = np.char.replace(np.datetime_as_string(column, unit='us'), 'T', ' ')
+            # the sqlite3 module only accepts native Python values
+            column = column.tolist()
+        elif field == "timestamp":
+            column = [_format_timestamp(timestamp) for timestamp in column]
+
+        columns.append(column)
+
+    return zip(*columns)
+
+
+def _training_data_values(rows, fields: tuple[str, ...]) -> Iterable[tuple]:
+    """ convert training data rows and column batches to tuples of values in the order of the fields.
+    A column batch is a TrainingDataRowBatch
+    or a mapping from field name to a sequence (e.g. a list or NumPy array) of values.
+    A single TrainingDataRowBatch may also be passed instead of an iterable.
+    Tuples are taken as values in the order of the fields, with the timestamp as datetime or as stored string.
+    """
+    other_fields = attrgetter(*fields[1:])
+
+    if isinstance(rows, TrainingDataRowBatch):
+        rows = [rows]
+
+    for row in rows:
+        if isinstance(row, TrainingDataRowBatch):
+            yield from _column_batch_values(row.columns, fields)
+        elif isinstance(row, Mapping):
+            yield from _column_batch_values(row, fields)
+        elif isinstance(row, tuple):
+            if isinstance(row[0], datetime):
+                yield (_format_timestamp(row[0]),) + row[1:]
+            else:
+                yield row
+        else:
+            yield (_format_timestamp(row.timestamp),) + other_fields(row)
+
+
+def _insert_training_data_in_batches(
+        connection: Connection,
+        rows,
+        batch_size: int,
+        version: TrainingDataEntityVersion,
+        path_to_log_file: Optional[str],
+        commit_each_batch: bool,
+        measurement
+) -> int:
+    """ insert the rows using executemany on a prepared statement and record them in the ingestion manifest
+    and the rollups.
+    :param measurement: measurement of the calling operation, see INSTRUMENTATION
+    :return: number of inserted rows
+    """
+    fields = _training_data_fields(version)
+    insert_sql = _insert_training_data_sql(fields, version)
+
+    if version == TrainingDataEntityVersion.V3:
+        request_type_position = fields.index("request_type")
+        known_request_type_ids = _known_request_type_ids(connection)
+
+    values = _training_data_values(rows, fields)
+    row_count = 0
+
+    while True:
+        batch = list(islice(values, batch_size))
+        measurement.end_phase("prepare")
+        if len(batch) == 0:
+            break
+
+        if version == TrainingDataEntityVersion.V3:
+            _register_request_types(
+                connection,
+                [row_values[request_type_position] for row_values in batch],
+                known_request_type_ids
+            )
+            # bind the ids of the request types, the names are still needed for the rollups
+            connection.exec_driver_sql(insert_sql, [
+                row_values[:request_type_position]
+                + (known_request_type_ids[row_values[request_type_position]],)
+                + row_values[request_type_position + 1:]
+                for row_values in batch
+            ])
+        else:
+            connection.exec_driver_sql(insert_sql, batch)
+        measurement.end_phase("insert")
+
+        statistics_per_day = {}
+        for row_values in batch:
+            timestamp = row_values[0]
+            day = timestamp[:10]
+            statistics = statistics_per_day.get(day)
+            if statistics is None:
+                statistics_per_day[day] = [1, timestamp, timestamp]
+            else:
+                statistics[0] += 1
+                if timestamp < statistics[1]:
+                    statistics[1] = timestamp
+                if timestamp > statistics[2]:
+                    statistics[2] = timestamp
+
+        connection.exec_driver_sql(_UPSERT_INGESTION_MANIFEST_SQL, [
+            (day, path_to_log_file, day_row_count, first_timestamp, last_timestamp)
+            for day, (day_row_count, first_timestamp, last_timestamp) in statistics_per_day.items()
+        ])
+        measurement.end_phase("manifest")
+
+        _update_training_data_rollups(connection, batch, fields)
+        measurement.end_phase("rollups")
+
+        if commit_each_batch:
+            connection.commit()
+            measurement.end_phase("commit")
+
+        measurement.count(len(batch))
+        row_count += len(batch)
+
+    return row_count
+
+
+def _record_log_file_in_ingestion_manifest(connection: Connection, path_to_log_file: str):
+    """ record the day of the log file in the ingestion manifest, unless training data of that day was inserted,
+    so that log files without training data of their day are not parsed again.
+    Log files whose path does not contain a date cannot be recorded.
+    """
+    try:
+        day = datetime.strptime(get_date_from_string(path_to_log_file), "%Y-%m-%d")
+    except (AttributeError, ValueError):
+        return
+
+    connection.exec_driver_sql(
+        _INSERT_EMPTY_INGESTION_MANIFEST_SQL,
+        (day.date().isoformat(), path_to_log_file, _format_timestamp(day), _format_timestamp(day))
+    )
+
+
 def training_data_exists_in_db_using_sqlalchemy(session: Session, path_to_log_file: str) -> bool:
+    """ check whether the training data of the day the log file was written has already been inserted.
+    This is a primary key lookup in the ingestion manifest.
+    Databases created without a manifest, which create_training_data_table has not backfilled yet,
+    are checked by a range query on the timestamps of the training_data table instead.
+    :param session: Session of the training database
+    :param path_to_log_file: path to a log file containing the date in the format "%Y-%m-%d"
+    :return: True if training data of that day exists
+    """
     file_timestamp = datetime.strptime(
         get_date_from_string(path_to_log_file),
         "%Y-%m-%d"
     )
 
-    date_to_check = file_timestamp
+    date_to_check = file_timestamp.date()
 
-    exists_query = session.query(
-        select(TrainingDataEntity.timestamp)
-        .where(and_(func.strftime('%Y%m%d', TrainingDataEntity.timestamp) == date_to_check.strftime("%Y%m%d")))
-        .exists()
-    )
-    exists_result = session.execute(exists_query).scalar()
+    if inspect(session.connection()).has_table(IngestionManifestEntity.__tablename__):
+        exists_query = select(
+            select(IngestionManifestEntity.day)
+            .where(IngestionManifestEntity.day == date_to_check)
+            .exists()
+        )
+    else:
+        day_to_check = date_to_check.strftime("%Y %m %d")
+        exists_query = select(
+            select(TrainingDataEntity.timestamp)
+            .where(_timestamp_between_days(TrainingDataEntity.timestamp, day_to_check, day_to_check))
+            .exists()
+        )
+
+    with INSTRUMENTATION.measure("training_data_exists_in_db_using_sqlalchemy") as measurement:
+        exists_result = session.execute(exists_query).scalar()
+        measurement.end_phase("query")
 
     return exists_result
 
 
-def insert_training_data(session: Session, rows: list[TrainingDataRow]):
-    session.execute(insert(TrainingDataEntity), [
-        {
-            "timestamp": row.timestamp,
-            "number_of_parallel_requests_start": row.number_of_parallel_requests_start,
-            "number_of_parallel_requests_end": row.number_of_parallel_requests_end,
-            "number_of_parallel_requests_finished": row.number_of_parallel_requests_finished,
-            "request_type": row.request_type,
-            "system_cpu_usage": row.system_cpu_usage,
-            "request_execution_time_ms": row.request_execution_time_ms,
-            "requests_per_second": row.requests_per_second,
-            "requests_per_minute": row.requests_per_minute,
-            "switch_id": row.switch_id,
-            "bytes_per_second_transmitted_through_switch": row.bytes_per_second_transmitted_through_switch,
-            "packets_per_second_transmitted_through_switch": row.packets_per_second_transmitted_through_switch
-        }
-        for row in rows
-    ])
+def insert_training_data(
+        session: Session,
+        rows: Iterable[TrainingDataRow],
+        path_to_log_file: Optional[str] = None,
+        version: Optional[TrainingDataEntityVersion] = None
+):
+    """ insert the training data rows within the transaction of the session
+    and record them in the ingestion manifest and the rollups.
+    :param session: Session of the training database
+    :param rows: training data rows or column batches to insert, see ingest_training_data
+    :param path_to_log_file: optional path of the log file the rows were read from
+    :param version: Version of the training data schema, defaults to the selected version
+    """
+    version = _resolve_version(version)
+
+    with INSTRUMENTATION.measure("insert_training_data") as measurement:
+        _insert_training_data_in_batches(
+            session.connection(),
+            rows,
+            DEFAULT_INGESTION_BATCH_SIZE,
+            version,
+            path_to_log_file,
+            commit_each_batch=False,
+            measurement=measurement
+        )
+
+
+def ingest_training_data(
+        engine: Engine,
+        rows,
+        path_to_log_file: Optional[str] = None,
+        batch_size: int = DEFAULT_INGESTION_BATCH_SIZE,
+        bulk_load: bool = False,
+        version: Optional[TrainingDataEntityVersion] = None
+) -> IngestionStatistics:
+    """ stream training data into the database, committing one transaction per batch.
+    Only one batch is held in memory at a time, so rows can be produced by a generator.
+
+    Example call:
+
+    `ingest_training_data(engine, (TrainingDataRow.from_logfile_entry(e) for e in entries), bulk_load=True)`
+    :param engine: Engine of the training database, see create_training_data_table
+    :param rows: iterable of TrainingDataRow objects or column batches,
+    i.e., TrainingDataRowBatch objects or mappings from field name to a sequence (e.g. a list or NumPy array) of values.
+    Fields with defaults in TrainingDataRow may be missing in column batches.
+    :param path_to_log_file: optional path of the log file the rows were read from
+    :param batch_size: number of rows inserted per transaction
+    :param bulk_load: use WAL journaling, relaxed synchronous writes
+    and rebuild the training_data indexes after loading instead of updating them per row
+    :param version: Version of the training data schema, defaults to the selected version
+    :return: number of inserted rows and the duration of the ingestion
+    """
+    version = _resolve_version(version)
+
+    begin = datetime.now()
+
+    training_data_table = _training_data_entity(version).__table__
+
+    with engine.connect() as connection, INSTRUMENTATION.measure("ingest_training_data") as measurement:
+        if bulk_load:
+            previous_journal_mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+            previous_synchronous = connection.exec_driver_sql("PRAGMA synchronous").scalar()
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+            connection.exec_driver_sql("PRAGMA synchronous=OFF")
+            for index in training_data_table.indexes:
+                index.drop(connection, checkfirst=True)
+            connection.commit()
+            measurement.end_phase("drop_indexes")
+
+        try:
+            row_count = _insert_training_data_in_batches(
+                connection,
+                rows,
+                batch_size,
+                version,
+                path_to_log_file,
+                commit_each_batch=True,
+                measurement=measurement
+            )
+        finally:
+            if bulk_load:
+                connection.rollback()
+                for index in training_data_table.indexes:
+                    index.create(connection, checkfirst=True)
+                connection.commit()
+                connection.exec_driver_sql(f"PRAGMA synchronous={previous_synchronous}")
+                connection.exec_driver_sql(f"PRAGMA journal_mode={previous_journal_mode}")
+                measurement.end_phase("create_indexes")
+
+    statistics = IngestionStatistics(row_count, (datetime.now() - begin).total_seconds())
+
+    _logger.info("ingest_training_data inserted %s rows in %s s (%.0f rows/s)",
+                 statistics.row_count, statistics.duration_s, statistics.rows_per_second)
+
+    return statistics
+
+
+def _read_partitions(db_path: str, begin_end: tuple[str, str], read_partition, chunk_size: int) -> Iterable:
+    """ read the partitions of a partitioned training database overlapping the days in parallel
+    and stream their results in chronological order.
+    The worker threads read at most a few chunks of each partition ahead, see stream_partitions_in_order.
+    :param db_path: Directory of the partitioned training database
+    :param begin_end: Optional tuple of the first and last day in the format "%Y %m %d"
+    :param read_partition: function streaming the results from the SQLite database file of a partition
+    :param chunk_size: number of results passed from a worker thread to the consumer at a time
+    """
+    yield from stream_partitions_in_order(read_partition, partition_paths(db_path, begin_end), chunk_size=chunk_size)
 
 
 def read_all_training_data_from_db_using_sqlalchemy(
         db_path: str,
-        version: TrainingDataEntityVersion = SELECTED_VERSION
+        version: Optional[TrainingDataEntityVersion] = None,
+        enable_sql_logging: bool = False
 ) -> Iterable[TrainingDataRow]:
-    db_connection = create_connection_using_sqlalchemy(db_path, True)
-    if db_connection is None:
-        print("Could not read performance metrics")
-        exit(1)
+    """
+    :param db_path: Path to SQLite database file or directory of a partitioned training database
+    :param version: Version of the training data schema, defaults to the selected version
+    :param enable_sql_logging: enable logging of SQL statements
+    :return: Stream of all training data rows
+    """
+    version = _resolve_version(version)
 
-    with Session(db_connection) as session:
-        if version == TrainingDataEntityVersion.V1:
-            stmt = select(TrainingDataEntityV1)
-        else:
-            stmt = select(TrainingDataEntity)
+    if is_partitioned_training_database(db_path):
+        yield from _read_partitions(
+            db_path,
+            (),
+            lambda partition_path: read_all_training_data_from_db_using_sqlalchemy(
+                partition_path, version, enable_sql_logging
+            ),
+            chunk_size=_PARTITION_CHUNK_SIZE
+        )
+        return
+
+    db_connection = get_read_engine(db_path, enable_sql_logging=enable_sql_logging)
+
+    with Session(db_connection) as session, \
+            INSTRUMENTATION.measure("read_all_training_data_from_db_using_sqlalchemy") as measurement:
+        stmt = select(_training_data_entity(version))
 
         # Stream results using chunked fetching to reduce memory usage
         chunk_size = 1000  # Adjust chunk size as needed
 
-        # Use yield_per to fetch rows one at a time in a memory-efficient way
-        for row in session.execute(stmt).scalars().yield_per(chunk_size):
-            yield TrainingDataRow(row)
+        # Use yield_per to fetch rows one chunk at a time in a memory-efficient way
+        yield from _training_data_rows_of_chunks(
+            session.execute(stmt).scalars().yield_per(chunk_size),
+            measurement
+        )
+
+
+def _training_data_rows_of_chunks(result, measurement) -> Iterable[TrainingDataRow]:
+    """ stream the entities of the result as TrainingDataRow objects and time the query, fetching and construction
+    of the rows, but not the time the consumer takes between the chunks.
+    :param result: ScalarResult of training data entities with yield_per set to the chunk size
+    :param measurement: measurement of the calling operation, see INSTRUMENTATION
+    """
+    measurement.end_phase("query")
+
+    for entities in result.partitions():
+        measurement.end_phase("fetch")
+        rows = [TrainingDataRow(entity) for entity in entities]
+        measurement.end_phase("construct")
+        measurement.count(len(rows))
+
+        yield from rows
+        measurement.resume()
+
+
+def _timestamp_between_days(timestamp_column, begin: str, end: str) -> ColumnElement[bool]:
+    """ create a filter that selects all timestamps from the begin day up to and including the end day.
+    The timestamp column is compared directly against the day boundaries,
+    so that SQLite can use the index on the timestamp column.
+    :param timestamp_column: timestamp column to filter
+    :param begin: first day in the format "%Y %m %d"
+    :param end: last day in the format "%Y %m %d"
+    :return: filter expression
+    """
+    lower_bound = datetime.strptime(begin, "%Y %m %d").date()
+    upper_bound = datetime.strptime(end, "%Y %m %d").date() + timedelta(days=1)
+
+    # SQLite stores timestamps as "YYYY-MM-DD HH:MM:SS[.ffffff]" strings,
+    # which compare correctly against "YYYY-MM-DD" day boundaries.
+    stored_timestamp = type_coerce(timestamp_column, String)
+    return and_(stored_timestamp >= lower_bound.isoformat(), stored_timestamp < upper_bound.isoformat())
 
 
 def read_training_data_from_db_between_using_sqlalchemy(
         db_path: str,
         begin: str,
         end: str,
-        version: TrainingDataEntityVersion = SELECTED_VERSION
+        version: Optional[TrainingDataEntityVersion] = None,
+        request_type: Optional[str] = None,
+        switch_id: Optional[int] = None,
+        enable_sql_logging: bool = False
 ) -> Iterable[TrainingDataRow]:
-    db_connection = create_connection_using_sqlalchemy(db_path, True)
-    if db_connection is None:
-        print("Could not read performance metrics")
-        exit(1)
+    """
+    Example call:
+
+    `read_training_data_from_db_between_using_sqlalchemy(r"db/trainingdata_2021-04-06.db", "2021 03 30", "2021 04 05")`
+    :param db_path: Path to SQLite database file or directory of a partitioned training database,
+    of which only the partitions overlapping the days are read
+    :param begin: First day to read in the format "%Y %m %d"
+    :param end: Last day to read in the format "%Y %m %d"
+    :param version: Version of the training data schema, defaults to the selected version
+    :param request_type: Optional request type to filter on
+    :param switch_id: Optional switch id to filter on
+    :param enable_sql_logging: enable logging of SQL statements
+    :return: Stream of the training data rows within the specified days in chronological order
+    """
+    version = _resolve_version(version)
+
+    if is_partitioned_training_database(db_path):
+        yield from _read_partitions(
+            db_path,
+            (begin, end),
+            lambda partition_path: read_training_data_from_db_between_using_sqlalchemy(
+                partition_path, begin, end, version, request_type, switch_id, enable_sql_logging
+            ),
+            chunk_size=_PARTITION_CHUNK_SIZE
+        )
+        return
+
+    db_connection = get_read_engine(db_path, enable_sql_logging=enable_sql_logging)
+
+    entity = _training_data_entity(version)
 
-    with Session(db_connection) as session:
+    stmt = select(entity).where(_timestamp_between_days(entity.timestamp, begin, end))
+
+    if request_type is not None:
+        stmt = stmt.where(_request_type_filter(entity.__table__, request_type, version, use_index=False))
+
+    if switch_id is not None:
         if version == TrainingDataEntityVersion.V1:
-            results = session.query(TrainingDataEntityV1).filter(between(
-                func.strftime('%Y %m %d', TrainingDataEntityV1.timestamp),
-                begin,
-                end)
-            ).all()
+            # V1 training data was not recorded per switch, so every row belongs to the switch id 0
+            if switch_id != 0:
+                return
         else:
-            results = session.query(TrainingDataEntity).filter(between(
-                func.strftime('%Y %m %d', TrainingDataEntity.timestamp),
-                begin,
-                end)
-            ).all()
-
-        for row in results:
-            yield row
+            stmt = stmt.where(entity.switch_id == switch_id)
+
+    # in the order of the timestamp index, so that SQLite streams the rows instead of sorting them first
+    stmt = stmt.order_by(entity.timestamp, entity.id)
+
+    with Session(db_connection) as session, \
+            INSTRUMENTATION.measure("read_training_data_from_db_between_using_sqlalchemy") as measurement:
+        # Stream results using chunked fetching to reduce memory usage
+        chunk_size = 1000  # Adjust chunk size as needed
+
+        yield from _training_data_rows_of_chunks(
+            session.execute(stmt).scalars().yield_per(chunk_size),
+            measurement
+        )
+
+
+def read_training_data_batches_from_db(
+        db_path: str,
+        begin_end: tuple[str, str] = (),
+        version: Optional[TrainingDataEntityVersion] = None,
+        request_type: Optional[str] = None,
+        switch_id: Optional[int] = None,
+        batch_size: int = DEFAULT_READ_BATCH_SIZE
+) -> Iterable[TrainingDataRowBatch]:
+    """
+    Columnar version of `read_all_training_data_from_db_using_sqlalchemy`
+    and `read_training_data_from_db_between_using_sqlalchemy`.
+
+    Example call:
+
+    `read_training_data_batches_from_db(r"db/trainingdata_2021-04-06.db", ("2021 03 30", "2021 04 05"))`
+    :param db_path: Path to SQLite database file or directory of a partitioned training database,
+    of which only the partitions overlapping the days are read
+    :param begin_end: Optional tuple of the first and last day to read in the format "%Y %m %d"
+    :param version: Version of the training data schema, defaults to the selected version
+    :param request_type: Optional request type to filter on
+    :param switch_id: Optional switch id to filter on
+    :param batch_size: Maximum number of rows per batch
+    :return: Stream of batches of the training data rows in insertion order, respectively in chronological order
+    if the days are limited, and in chronological order of the partitions
+    """
+    version = _resolve_version(version)
+
+    if is_partitioned_training_database(db_path):
+        yield from _read_partitions(
+            db_path,
+            begin_end,
+            lambda partition_path: read_training_data_batches_from_db(
+                partition_path, begin_end, version, request_type, switch_id, batch_size
+            ),
+            # each batch is a chunk already
+            chunk_size=1
+        )
+        return
+
+    db_connection = get_read_engine(db_path)
+
+    training_data_table = _training_data_entity(version).__table__
+    fields = _training_data_fields(version)
+
+    # read the stored timestamp strings, NumPy parses them faster than SQLAlchemy
+    stmt = select(
+        type_coerce(training_data_table.c.timestamp, String),
+        *[
+            _request_type_name_column(training_data_table, version) if field == "request_type"
+            else training_data_table.c[field]
+            for field in fields[1:]
+        ]
+    )
+
+    if len(begin_end) > 0:
+        stmt = stmt.where(_timestamp_between_days(training_data_table.c.timestamp, *begin_end))
+
+    if request_type is not None:
+        stmt = stmt.where(
+            _request_type_filter(training_data_table, request_type, version, use_index=len(begin_end) == 0)
+        )
+
+    if switch_id is not None:
+        if version == TrainingDataEntityVersion.V1:
+            # V1 training data was not recorded per switch, so every row belongs to the switch id 0
+            if switch_id != 0:
+                return
+        else:
+            stmt = stmt.where(training_data_table.c.switch_id == switch_id)
+
+    if len(begin_end) > 0:
+        # in the order of the timestamp index, so that SQLite streams the rows instead of sorting them first
+        stmt = stmt.order_by(training_data_table.c.timestamp, training_data_table.c.id)
+    else:
+        stmt = stmt.order_by(training_data_table.c.id)
+
+    with db_connection.connect() as connection, \
+            INSTRUMENTATION.measure("read_training_data_batches_from_db") as measurement:
+        result = connection.execution_options(yield_per=batch_size).execute(stmt)
+        measurement.end_phase("query")
+
+        for partition in result.partitions():
+            measurement.end_phase("fetch")
+            batch = TrainingDataRowBatch(dict(zip(fields, zip(*partition))))
+            measurement.end_phase("construct")
+            measurement.count(len(partition), sum(column.nbytes for column in batch.columns.values()))
+
+            yield batch
+            measurement.resume()
@@ -0,0 +1,231 @@
+import argparse
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from typing import Optional
+
+from ..Version import TrainingDataEntityVersion
+
+_logger = logging.getLogger(__name__)
+
+# Schema of V3, as created by create_training_data_table when V3 is selected
+_CREATE_REQUEST_TYPES_TABLE_SQL = """
+CREATE TABLE {schema}.request_types (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+)
+"""
+
+_CREATE_TRAINING_DATA_V3_TABLE_SQL = """
+CREATE TABLE {schema}.{table} (
+    id INTEGER NOT NULL,
+    timestamp TIMESTAMP NOT NULL,
+    number_of_parallel_requests_start SMALLINT NOT NULL,
+    number_of_parallel_requests_end SMALLINT NOT NULL,
+    number_of_parallel_requests_finished SMALLINT NOT NULL,
+    request_type_id INTEGER NOT NULL,
+    system_cpu_usage FLOAT NOT NULL,
+    requests_per_second INTEGER NOT NULL,
+    requests_per_minute INTEGER NOT NULL,
+    switch_id INTEGER NOT NULL,
+    bytes_per_second_transmitted_through_switch INTEGER NOT NULL,
+    packets_per_second_transmitted_through_switch INTEGER NOT NULL,
+    request_execution_time_ms INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(request_type_id) REFERENCES request_types (id)
+)
+"""
+
+_CREATE_TRAINING_DATA_V3_INDEXES_SQL = (
+    "CREATE INDEX {schema}.ix_training_data_request_type_id ON training_data (request_type_id)",
+    "CREATE INDEX {schema}.ix_training_data_timestamp ON training_data (timestamp)",
+)
+
+# ids in order of first appearance of the request types, so that they match the ordinal encoding
+# read_all_performance_metrics_from_db created for the database before the migration
+_INSERT_REQUEST_TYPES_SQL = """
+INSERT INTO {target_schema}.request_types (id, name)
+SELECT row_number() OVER (ORDER BY first_id) - 1, request_type
+FROM (SELECT request_type, min(id) AS first_id FROM {source_schema}.training_data GROUP BY request_type)
+"""
+
+_COPY_TRAINING_DATA_SQL = """
+INSERT INTO {target_schema}.{target_table} (
+    id, timestamp,
+    number_of_parallel_requests_start, number_of_parallel_requests_end, number_of_parallel_requests_finished,
+    request_type_id, system_cpu_usage, requests_per_second, requests_per_minute,
+    switch_id, bytes_per_second_transmitted_through_switch, packets_per_second_transmitted_through_switch,
+    request_execution_time_ms
+)
+SELECT
+    training_data.id, training_data.timestamp,
+    number_of_parallel_requests_start, number_of_parallel_requests_end, number_of_parallel_requests_finished,
+    request_types.id, system_cpu_usage, requests_per_second, requests_per_minute,
+    {switch_columns},
+    request_execution_time_ms
+FROM {source_schema}.training_data AS training_data
+JOIN {target_schema}.request_types AS request_types ON request_types.name = training_data.request_type
+ORDER BY training_data.id
+"""
+
+_SWITCH_COLUMNS = (
+    "switch_id, bytes_per_second_transmitted_through_switch, packets_per_second_transmitted_through_switch"
+)
+# V1 training data was not recorded per switch
+_V1_SWITCH_COLUMNS = "0, 0, 0"
+
+
+def detect_training_data_version(db_path: str) -> Optional[TrainingDataEntityVersion]:
+    """
+    :param db_path: Path to SQLite database file
+    :return: Version of the schema of the training_data table, None if the database has no training_data table
+    """
+    with sqlite3.connect(db_path) as connection:
+        return _detect_training_data_version(connection, "main")
+
+
+def _detect_training_data_version(connection: sqlite3.Connection, schema: str) -> Optional[TrainingDataEntityVersion]:
+    columns = {row[1] for row in connection.execute(f"PRAGMA {schema}.table_info(training_data)")}
+    if len(columns) == 0:
+        return None
+    if "request_type_id" in columns:
+        return TrainingDataEntityVersion.V3
+    if "switch_id" in columns:
+        return TrainingDataEntityVersion.CURRENT
+    return TrainingDataEntityVersion.V1
+
+
+def _convert_training_data(
+        connection: sqlite3.Connection,
+        source_schema: str,
+        target_schema: str,
+        target_table: str,
+        source_version: TrainingDataEntityVersion
+):
+    connection.execute(_CREATE_REQUEST_TYPES_TABLE_SQL.format(schema=target_schema))
+    connection.execute(_INSERT_REQUEST_TYPES_SQL.format(source_schema=source_schema, target_schema=target_schema))
+    connection.execute(_CREATE_TRAINING_DATA_V3_TABLE_SQL.format(schema=target_schema, table=target_table))
+    connection.execute(_COPY_TRAINING_DATA_SQL.format(
+        source_schema=source_schema,
+        target_schema=target_schema,
+        target_table=target_table,
+        switch_columns=_V1_SWITCH_COLUMNS if source_version == TrainingDataEntityVersion.V1 else _SWITCH_COLUMNS
+    ))
+
+
+def _migrate_in_place(connection: sqlite3.Connection, source_version: TrainingDataEntityVersion):
+    _convert_training_data(connection, "main", "main", "training_data_v3", source_version)
+    # dropping the table also drops its indexes
+    connection.execute("DROP TABLE main.training_data")
+    connection.execute("ALTER TABLE main.training_data_v3 RENAME TO training_data")
+    for create_index_sql in _CREATE_TRAINING_DATA_V3_INDEXES_SQL:
+        connection.execute(create_index_sql.format(schema="main"))
+
+
+def _migrate_by_copy(connection: sqlite3.Connection, source_version: TrainingDataEntityVersion):
+    _convert_training_data(connection, "source", "main", "training_data", source_version)
+    for create_index_sql in _CREATE_TRAINING_DATA_V3_INDEXES_SQL:
+        connection.execute(create_index_sql.format(schema="main"))
+
+    # copy the other tables, e.g., the ingestion manifest and the rollups, as they are
+    other_tables = connection.execute(
+        "SELECT name, sql FROM source.sqlite_master "
+        "WHERE type = 'table' AND name NOT IN ('training_data', 'request_types') AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    for name, create_table_sql in other_tables:
+        connection.execute(create_table_sql)
+        connection.execute(f'INSERT INTO main."{name}" SELECT * FROM source."{name}"')
+
+    other_indexes = connection.execute(
+        "SELECT sql FROM source.sqlite_master "
+        "WHERE type = 'index' AND sql IS NOT NULL AND tbl_name NOT IN ('training_data', 'request_types')"
+    ).fetchall()
+    for create_index_sql, in other_indexes:
+        connection.execute(create_index_sql)
+
+
+def migrate_training_database_to_v3(
+        source_db_path: str,
+        target_db_path: Optional[str] = None,
+        vacuum: bool = True
+) -> int:
+    """
+    Converts a training database of version V1 or CURRENT to V3,
+    which stores the request types in a lookup table and references them by their id in the training data.
+    The ids are assigned in order of first appearance,
+    i.e., they equal the codes read_all_performance_metrics_from_db created for the database before the migration.
+
+    The conversion runs within SQLite without loading the rows into Python.
+    Without a target database, the source database is converted in place within a single transaction.
+
+    Example call:
+
+    `migrate_training_database_to_v3(r"db/trainingdata_2021-04-06.db", r"db/trainingdata_2021-04-06_v3.db")`
+    :param source_db_path: Path to SQLite database file to convert
+    :param target_db_path: Optional path to a new SQLite database file to copy the converted database to
+    :param vacuum: Rebuild the database file after converting in place to reclaim the freed space
+    :return: number of converted rows
+    """
+    begin = datetime.now()
+
+    if target_db_path is not None and os.path.exists(target_db_path):
+        raise FileExistsError(target_db_path)
+
+    # autocommit mode, so that the transaction is controlled explicitly and includes the DDL statements
+    connection = sqlite3.connect(target_db_path or source_db_path, isolation_level=None)
+    try:
+        if target_db_path is not None:
+            connection.execute("ATTACH DATABASE ? AS source", (source_db_path,))
+            source_schema = "source"
+        else:
+            source_schema = "main"
+
+        source_version = _detect_training_data_version(connection, source_schema)
+        if source_version is None:
+            raise ValueError(f"{source_db_path} does not contain training data")
+        if source_version == TrainingDataEntityVersion.V3:
+            raise ValueError(f"{source_db_path} already uses the schema version {source_version}")
+
+        connection.execute("BEGIN")
+        try:
+            if target_db_path is not None:
+                _migrate_by_copy(connection, source_version)
+            else:
+                _migrate_in_place(connection, source_version)
+            row_count = connection.execute("SELECT count(*) FROM main.training_data").fetchone()[0]
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        if target_db_path is not None:
+            connection.execute("DETACH DATABASE source")
+        elif vacuum:
+            connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+    _logger.info("migrate_training_database_to_v3 converted %s rows from %s in %s s",
+                 row_count, source_version, (datetime.now() - begin).total_seconds())
+
+    return row_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converts a training database to the schema version V3.")
+    parser.add_argument("source", help="SQLite database file to convert")
+    parser.add_argument("--target", help="new SQLite database file to copy the converted database to, "
+                                         "converts the source in place if omitted")
+    parser.add_argument("--no-vacuum", action="store_true", help="do not rebuild the database file after converting")
+    args = parser.parse_args()
+
+    # report the duration of the conversion, as the library only logs it
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    migrate_training_database_to_v3(args.source, args.target, not args.no_vacuum)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,40 @@
+import logging
 from datetime import datetime
-from typing import Tuple
-from pandas import DataFrame
+from typing import Tuple, Optional
 
-from .TrainingDatabase import read_training_data_from_db_between_using_sqlalchemy, \
-    read_all_training_data_from_db_using_sqlalchemy
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, factorize
+from sqlalchemy import select, func, literal, type_coerce, String
+
+from .EngineManager import get_read_engine
+from .Instrumentation import INSTRUMENTATION
+from .TimeUtils import _local_epoch_seconds
+from .TrainingDataPartitions import is_partitioned_training_database, partition_paths, map_partitions_in_order
+from .TrainingDatabase import _timestamp_between_days, _training_data_entity, _known_request_type_ids, \
+    ROLLUP_ENTITIES, _HISTOGRAM_DTYPE, _histogram_bin_values, _merge_histograms
+from ..Version import get_selected_version
+
+_logger = logging.getLogger(__name__)
+
+PERFORMANCE_METRICS_COLUMNS = [
+    'Timestamp',
+    'WeekDay',
+    'PR 1',
+    'PR 2',
+    'PR 3',
+    'Request Type',
+    'CPU (System)',
+    'RPS',
+    'RPM',
+    "Switch ID",
+    "BPS transmitted",
+    "PPS transmitted",
+    'Response Time s'
+]
+
+# Number of rows fetched from the cursor per chunk while filling the column arrays
+_CHUNK_SIZE = 65536
 
 
 def read_all_performance_metrics_from_db(db_path: str, begin_end: Tuple[str, str] = ()) -> Tuple[DataFrame, dict]:
@@ -11,83 +42,422 @@ def read_all_performance_metrics_from_db(db_path: str, begin_end: Tuple[str, str
     Example call:
 
     `read_all_performance_metrics_from_db(r"db/trainingdata_2021-04-06.db", ("2021 03 30", "2021 04 05"))`
-    :param db_path: Path to SQLite database file
+    :param db_path: Path to SQLite database file or directory of a partitioned training database,
+    of which the partitions overlapping the specified days are read in parallel
     :param begin_end: Optional tuple to filter within the specified begin and end datetime.
     :return: DataFrame with performance metrics
     and dictionary with the request types mapping created using ordinal encoding
     """
 
-    known_request_types = {}
-
     begin = datetime.now()
 
-    if len(begin_end) > 0:
-        training_data = read_training_data_from_db_between_using_sqlalchemy(db_path, begin_end[0], begin_end[1])
+    if is_partitioned_training_database(db_path):
+        df, known_request_types = _read_partitioned_performance_metrics(db_path, begin_end)
     else:
-        training_data = read_all_training_data_from_db_using_sqlalchemy(db_path)
-
-    def gen_rows():
-        for row in training_data:
-            time_stamp = row.timestamp
-
-            weekday = time_stamp.weekday()
-
-            # we are only interested in the time of day, not the date
-            # time = time_stamp.timetz()
-            # milliseconds = time.microsecond / 1000000
-            # time_of_day_in_seconds = milliseconds + time.second + time.minute * 60 + time.hour * 3600
-            # time_of_request = time_of_day_in_seconds
-
-            time_of_request = time_stamp.timestamp()
-
-            request_type = row.request_type
-
-            if request_type not in known_request_types:
-                known_request_types[request_type] = len(known_request_types)
-
-            request_type_as_int = known_request_types[request_type]
-
-            new_obj = (
-                time_of_request,
-                weekday,
-                row.number_of_parallel_requests_start,
-                row.number_of_parallel_requests_end,
-                row.number_of_parallel_requests_finished,
-                request_type_as_int,
-                float(row.system_cpu_usage),
-                row.requests_per_second,
-                row.requests_per_minute,
-                row.switch_id,
-                row.bytes_per_second_transmitted_through_switch,
-                row.packets_per_second_transmitted_through_switch,
-                float(row.request_execution_time_ms) / 1000,
-            )
+        df, known_request_types, _ = _read_performance_metrics(db_path, begin_end)
 
-            yield new_obj
-
-    df = DataFrame.from_records(
-        gen_rows(),
-        columns=[
-            'Timestamp',
-            'WeekDay',
-            'PR 1',
-            'PR 2',
-            'PR 3',
-            'Request Type',
-            'CPU (System)',
-            'RPS',
-            'RPM',
-            "Switch ID",
-            "BPS transmitted",
-            "PPS transmitted",
-            'Response Time s'
-        ]
-    )
-
-    print(f"read_all_performance_metrics_from_db finished in {(datetime.now() - begin).total_seconds()} s")
+    _logger.info("read_all_performance_metrics_from_db finished in %s s", (datetime.now() - begin).total_seconds())
 
     # print("== " + path + "==")
     # print(df.describe())
     # print("Number of response time outliers: %i" % len(detect_response_time_outliers(df)))
 
     return df, known_request_types
+
+
+def _read_performance_metrics(
+        db_path: str,
+        begin_end: Tuple[str, str] = (),
+        after_id: int = 0,
+        known_request_types: Optional[dict] = None,
+        operation: str = "read_all_performance_metrics_from_db"
+) -> Tuple[DataFrame, dict, int]:
+    """
+    :param db_path: Path to SQLite database file
+    :param begin_end: Optional tuple to filter within the specified begin and end datetime.
+    :param after_id: Only read rows with a greater id
+    :param known_request_types: Request types mapping to extend, so that known request types keep their codes
+    :param operation: name of the calling operation, see INSTRUMENTATION
+    :return: DataFrame with performance metrics, the request types mapping
+    and the greatest id of the read rows (after_id if no rows were read)
+    """
+
+    db_connection = get_read_engine(db_path)
+
+    table = _training_data_entity(get_selected_version()).__table__
+    # V3 stores the stable codes of the request types, which are read directly
+    has_request_type_codes = 'request_type_id' in table.c
+    has_switch_columns = 'switch_id' in table.c
+
+    def switch_column(name: str):
+        return table.c[name] if has_switch_columns else literal(0)
+
+    stmt = select(
+        table.c.timestamp,
+        table.c.number_of_parallel_requests_start,
+        table.c.number_of_parallel_requests_end,
+        table.c.number_of_parallel_requests_finished,
+        table.c.request_type_id if has_request_type_codes else table.c.request_type,
+        table.c.system_cpu_usage,
+        table.c.requests_per_second,
+        table.c.requests_per_minute,
+        switch_column('switch_id'),
+        switch_column('bytes_per_second_transmitted_through_switch'),
+        switch_column('packets_per_second_transmitted_through_switch'),
+        table.c.request_execution_time_ms,
+        table.c.id,
+    )
+    count_stmt = select(func.count()).select_from(table)
+
+    if after_id > 0:
+        stmt = stmt.where(table.c.id > after_id)
+        count_stmt = count_stmt.where(table.c.id > after_id)
+
+    if len(begin_end) > 0:
+        date_filter = _timestamp_between_days(table.c.timestamp, begin_end[0], begin_end[1])
+        # keep the insertion order of the rows, like the unfiltered select
+        stmt = stmt.where(date_filter).order_by(table.c.id)
+        count_stmt = count_stmt.where(date_filter)
+
+    known_request_types = {} if known_request_types is None else dict(known_request_types)
+    max_id = after_id
+
+    measurement = INSTRUMENTATION.measure(operation)
+
+    with db_connection.connect() as connection:
+        number_of_rows = connection.execute(count_stmt).scalar()
+        measurement.end_phase("count")
+
+        timestamps = np.empty(number_of_rows, dtype='datetime64[us]')
+        request_types = np.empty(number_of_rows, dtype=np.int64)
+        cpu_usage = np.empty(number_of_rows, dtype=np.float64)
+        response_times = np.empty(number_of_rows, dtype=np.float64)
+        integer_columns = {
+            name: np.empty(number_of_rows, dtype=np.int64)
+            for name in ['PR 1', 'PR 2', 'PR 3', 'RPS', 'RPM', 'Switch ID', 'BPS transmitted', 'PPS transmitted']
+        }
+        integer_column_positions = {
+            'PR 1': 1, 'PR 2': 2, 'PR 3': 3, 'RPS': 6, 'RPM': 7,
+            'Switch ID': 8, 'BPS transmitted': 9, 'PPS transmitted': 10
+        }
+
+        # Fetch through the DBAPI cursor, so that neither Row nor datetime objects are created per row.
+        # The timestamps are returned as the stored strings and parsed by NumPy.
+        compiled = stmt.compile(dialect=connection.dialect)
+        cursor = connection.connection.cursor()
+        cursor.execute(str(compiled), [compiled.params[name] for name in compiled.positiontup])
+        measurement.end_phase("query")
+
+        offset = 0
+        while True:
+            chunk = cursor.fetchmany(_CHUNK_SIZE)
+            measurement.end_phase("fetch")
+            # The table may grow between the count and the select; ignore rows added in the meantime.
+            chunk = chunk[:number_of_rows - offset]
+            if len(chunk) == 0:
+                break
+
+            end = offset + len(chunk)
+            columns = list(zip(*chunk))
+
+            timestamps[offset:end] = columns[0]
+
+            if has_request_type_codes:
+                request_types[offset:end] = columns[4]
+            else:
+                # ordinal encoding in order of first appearance, stable across chunks
+                codes, uniques = factorize(np.array(columns[4], dtype=object))
+                for request_type in uniques:
+                    if request_type not in known_request_types:
+                        known_request_types[request_type] = len(known_request_types)
+                chunk_to_known = np.array(
+                    [known_request_types[request_type] for request_type in uniques], dtype=np.int64
+                )
+                request_types[offset:end] = chunk_to_known[codes]
+
+            cpu_usage[offset:end] = columns[5]
+            for name, position in integer_column_positions.items():
+                integer_columns[name][offset:end] = columns[position]
+            response_times[offset:end] = columns[11]
+            max_id = max(max_id, max(columns[12]))
+            measurement.end_phase("decode")
+
+            offset = end
+
+        cursor.close()
+
+        if has_request_type_codes:
+            known_request_types = _known_request_type_ids(connection)
+
+    timestamps = timestamps[:offset]
+    naive_seconds = timestamps.astype(np.int64) / 1e6
+    days_since_epoch = timestamps.astype('datetime64[D]').astype(np.int64)
+
+    df = DataFrame(
+        {
+            'Timestamp': _local_epoch_seconds(naive_seconds),
+            # 1970-01-01 was a Thursday (weekday 3)
+            'WeekDay': (days_since_epoch + 3) % 7,
+            'PR 1': integer_columns['PR 1'][:offset],
+            'PR 2': integer_columns['PR 2'][:offset],
+            'PR 3': integer_columns['PR 3'][:offset],
+            'Request Type': request_types[:offset],
+            'CPU (System)': cpu_usage[:offset],
+            'RPS': integer_columns['RPS'][:offset],
+            'RPM': integer_columns['RPM'][:offset],
+            "Switch ID": integer_columns['Switch ID'][:offset],
+            "BPS transmitted": integer_columns['BPS transmitted'][:offset],
+            "PPS transmitted": integer_columns['PPS transmitted'][:offset],
+            'Response Time s': response_times[:offset] / 1000,
+        },
+        columns=PERFORMANCE_METRICS_COLUMNS,
+        copy=False
+    )
+    measurement.end_phase("dataframe")
+    if measurement.enabled:
+        measurement.count(len(df), int(df.memory_usage(index=False).sum()))
+    measurement.finish()
+
+    return df, known_request_types, max_id
+
+
+def _read_partitioned_performance_metrics(directory: str, begin_end: Tuple[str, str] = ()) -> Tuple[DataFrame, dict]:
+    """
+    :param directory: Directory of a partitioned training database
+    :param begin_end: Optional tuple to filter within the specified begin and end datetime.
+    :return: DataFrame with the performance metrics of the partitions in chronological order
+    and the request types mapping, in which the codes of the partitions are renumbered in order of first appearance
+    """
+    dfs = []
+    known_request_types = {}
+
+    for df, partition_request_types, _ in map_partitions_in_order(
+            lambda partition_path: _read_performance_metrics(partition_path, begin_end),
+            partition_paths(directory, begin_end)
+    ):
+        if len(partition_request_types) > 0:
+            partition_to_known = np.empty(max(partition_request_types.values()) + 1, dtype=np.int64)
+            for request_type, code in sorted(partition_request_types.items(), key=lambda item: item[1]):
+                if request_type not in known_request_types:
+                    known_request_types[request_type] = len(known_request_types)
+                partition_to_known[code] = known_request_types[request_type]
+            df['Request Type'] = partition_to_known[df['Request Type'].to_numpy()]
+        dfs.append(df)
+
+    if len(dfs) == 0:
+        return DataFrame({column: [] for column in PERFORMANCE_METRICS_COLUMNS}, columns=PERFORMANCE_METRICS_COLUMNS), {}
+
+    return pd.concat(dfs, ignore_index=True, copy=False), known_request_types
+
+
+def _histogram_percentiles(histograms: list, percentiles: Tuple[float, ...]) -> np.ndarray:
+    """
+    :return: nearest-rank percentiles of each histogram, one row per histogram and one column per percentile
+    """
+    entries = np.frombuffer(b"".join(histograms), dtype=_HISTOGRAM_DTYPE)
+    entries_per_histogram = np.array([len(histogram) for histogram in histograms]) // _HISTOGRAM_DTYPE.itemsize
+
+    # the cumulative counts over all histograms are increasing,
+    # so the entry of each rank is found by offsetting the rank by the counts of the previous histograms
+    cumulative_counts = np.cumsum(entries['count'], dtype=np.int64)
+    last_entries = np.cumsum(entries_per_histogram) - 1
+    counts_until_histogram = cumulative_counts[last_entries]
+    counts_before_histogram = np.concatenate(([0], counts_until_histogram[:-1]))
+    totals = counts_until_histogram - counts_before_histogram
+
+    ranks = np.maximum(np.ceil(np.outer(totals, np.asarray(percentiles) / 100)), 1)
+    percentile_entries = np.searchsorted(cumulative_counts, counts_before_histogram[:, np.newaxis] + ranks)
+    return _histogram_bin_values(entries['bin'][percentile_entries])
+
+
+def _rollups_to_dataframe(rollups: list, percentiles: Tuple[float, ...], with_timestamp: bool) -> DataFrame:
+    columns = (['Timestamp'] if with_timestamp else []) + [
+        'Request Type',
+        'Count',
+        'Mean Response Time ms',
+        'Min Response Time ms',
+        'Max Response Time ms',
+        *[f'P{percentile:g} Response Time ms' for percentile in percentiles],
+        'Mean CPU (System)',
+        'Mean BPS transmitted',
+        'Mean PPS transmitted',
+    ]
+
+    if len(rollups) == 0:
+        return DataFrame(columns=columns)
+
+    values = list(zip(*rollups))
+    if with_timestamp:
+        timestamps, values = values[0], values[1:]
+    request_types, row_counts, sum_ms, min_ms, max_ms, sum_cpu, sum_bytes, sum_packets, histograms = values
+
+    row_counts = np.array(row_counts, dtype=np.int64)
+    min_ms = np.array(min_ms, dtype=np.int64)
+    max_ms = np.array(max_ms, dtype=np.int64)
+
+    # percentiles are estimated from the histograms, but cannot lie outside the exact minimum and maximum
+    estimated_percentiles = np.clip(
+        _histogram_percentiles(histograms, percentiles),
+        min_ms[:, np.newaxis],
+        max_ms[:, np.newaxis]
+    )
+
+    data = {}
+    if with_timestamp:
+        data['Timestamp'] = pd.to_datetime(pd.Series(timestamps), format='%Y-%m-%d %H:%M:%S')
+    data['Request Type'] = request_types
+    data['Count'] = row_counts
+    data['Mean Response Time ms'] = np.array(sum_ms, dtype=np.float64) / row_counts
+    data['Min Response Time ms'] = min_ms
+    data['Max Response Time ms'] = max_ms
+    for index, percentile in enumerate(percentiles):
+        data[f'P{percentile:g} Response Time ms'] = estimated_percentiles[:, index]
+    data['Mean CPU (System)'] = np.array(sum_cpu, dtype=np.float64) / row_counts
+    data['Mean BPS transmitted'] = np.array(sum_bytes, dtype=np.float64) / row_counts
+    data['Mean PPS transmitted'] = np.array(sum_packets, dtype=np.float64) / row_counts
+
+    return DataFrame(data, columns=columns)
+
+
+def _rollup_columns(entity):
+    return (
+        entity.request_type,
+        entity.row_count,
+        entity.sum_request_execution_time_ms,
+        entity.min_request_execution_time_ms,
+        entity.max_request_execution_time_ms,
+        entity.sum_system_cpu_usage,
+        entity.sum_bytes_per_second_transmitted_through_switch,
+        entity.sum_packets_per_second_transmitted_through_switch,
+        entity.histogram,
+    )
+
+
+def _read_rollups(db_path: str, begin_end: Tuple[str, str], stmt) -> list:
+    """
+    :return: rows of the rollup statement, concatenated over the partitions of a partitioned training database.
+    The partitions span whole days, so no bucket is split across partitions.
+    """
+    if is_partitioned_training_database(db_path):
+        return [
+            row
+            for partition_rows in map_partitions_in_order(
+                lambda partition_path: _read_rollups(partition_path, (), stmt),
+                partition_paths(db_path, begin_end)
+            )
+            for row in partition_rows
+        ]
+
+    with get_read_engine(db_path).connect() as connection:
+        return connection.execute(stmt).all()
+
+
+def read_training_data_rollups(
+        db_path: str,
+        begin_end: Tuple[str, str] = (),
+        resolution: str = 'minute',
+        request_type: Optional[str] = None,
+        percentiles: Tuple[float, ...] = (50, 95, 99)
+) -> DataFrame:
+    """
+    Reads the pre-aggregated training data per second, minute or day and request type,
+    which the insert functions keep up to date, instead of every row of the training data.
+
+    Example call:
+
+    `read_training_data_rollups(r"db/trainingdata_2021-04-06.db", ("2021 03 30", "2021 04 05"), 'second')`
+    :param db_path: Path to SQLite database file or directory of a partitioned training database
+    :param begin_end: Optional tuple to filter within the specified begin and end datetime.
+    :param resolution: 'second', 'minute' or 'day'
+    :param request_type: Optional request type to filter on
+    :param percentiles: Percentiles of the response time to estimate, accurate to about 3 %
+    :return: DataFrame with one row per bucket of time and request type
+    """
+    begin = datetime.now()
+
+    entity = ROLLUP_ENTITIES[resolution]
+
+    stmt = select(type_coerce(entity.bucket, String), *_rollup_columns(entity))
+    if len(begin_end) > 0:
+        stmt = stmt.where(_timestamp_between_days(entity.bucket, *begin_end))
+    if request_type is not None:
+        stmt = stmt.where(entity.request_type == request_type)
+    stmt = stmt.order_by(entity.bucket, entity.request_type)
+
+    with INSTRUMENTATION.measure("read_training_data_rollups") as measurement:
+        rollups = _read_rollups(db_path, begin_end, stmt)
+        measurement.end_phase("query")
+        df = _rollups_to_dataframe(rollups, percentiles, with_timestamp=True)
+        measurement.end_phase("dataframe")
+        measurement.count(len(rollups))
+
+    _logger.info("read_training_data_rollups finished in %s s", (datetime.now() - begin).total_seconds())
+
+    return df
+
+
+def summarize_training_data(
+        db_path: str,
+        begin_end: Tuple[str, str] = (),
+        request_type: Optional[str] = None,
+        percentiles: Tuple[float, ...] = (50, 95, 99)
+) -> DataFrame:
+    """
+    Summarizes the training data of each request type within whole days using the daily rollups,
+    so that the duration does not depend on the number of rows.
+
+    Example call:
+
+    `summarize_training_data(r"db/trainingdata_2021-04-06.db", ("2021 01 01", "2021 06 30"))`
+    :param db_path: Path to SQLite database file or directory of a partitioned training database
+    :param begin_end: Optional tuple to filter within the specified begin and end datetime.
+    :param request_type: Optional request type to filter on
+    :param percentiles: Percentiles of the response time to estimate, accurate to about 3 %
+    :return: DataFrame with one row per request type
+    """
+    begin = datetime.now()
+
+    entity = ROLLUP_ENTITIES['day']
+
+    stmt = select(*_rollup_columns(entity))
+    if len(begin_end) > 0:
+        stmt = stmt.where(_timestamp_between_days(entity.bucket, *begin_end))
+    if request_type is not None:
+        stmt = stmt.where(entity.request_type == request_type)
+    stmt = stmt.order_by(entity.request_type)
+
+    measurement = INSTRUMENTATION.measure("summarize_training_data")
+
+    rollups = _read_rollups(db_path, begin_end, stmt)
+    measurement.end_phase("query")
+
+    summaries = {}
+    for rollup_type, row_count, sum_ms, min_ms, max_ms, sum_cpu, sum_bytes, sum_packets, histogram in rollups:
+        summary = summaries.get(rollup_type)
+        if summary is None:
+            summaries[rollup_type] = [row_count, sum_ms, min_ms, max_ms, sum_cpu, sum_bytes, sum_packets, [histogram]]
+            continue
+        summary[0] += row_count
+        summary[1] += sum_ms
+        summary[2] = min(summary[2], min_ms)
+        summary[3] = max(summary[3], max_ms)
+        summary[4] += sum_cpu
+        summary[5] += sum_bytes
+        summary[6] += sum_packets
+        summary[7].append(histogram)
+
+    df = _rollups_to_dataframe(
+        [
+            (rollup_type, *summary[:7], _merge_histograms(summary[7]))
+            for rollup_type, summary in summaries.items()
+        ],
+        percentiles,
+        with_timestamp=False
+    )
+    measurement.end_phase("aggregate")
+    measurement.count(len(rollups))
+    measurement.finish()
+
+    _logger.info("summarize_training_data finished in %s s", (datetime.now() - begin).total_seconds())
+
+    return df
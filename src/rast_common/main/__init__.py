@@ -1,5 +1,120 @@
-from .StringUtils import *
-from .SwitchAggFlowStats import *
-from .FileUtils import *
-from .TrainingDatabase import *
-from .TrainingDatabaseUtils import *
+import sys
+from importlib import import_module
+from types import ModuleType
+
+# Public names of the submodules. A submodule is imported when one of its names is accessed for the first time,
+# so that, e.g., using the string helpers does not import pandas and SQLAlchemy.
+# The names of the schema versions are re-exported from the parent package, as they were before.
+_SUBMODULE_EXPORTS = {
+    '..Version': (
+        'TrainingDataEntityVersion', 'SELECTED_VERSION', 'select_version', 'get_selected_version',
+    ),
+    'StringUtils': (
+        'get_date_from_string', 'contains_timestamp_with_ms', 'get_timestamp_from_string', 'get_timestamp_from_line',
+        'get_timestamps_from_lines', 'dir_path',
+    ),
+    'SwitchAggFlowStats': (
+        'SECONDS_PER_DAY', 'SwitchAggFlowStats', 'RingBufferSwitchAggFlowStats', 'lookup_switch_throughput',
+        'assign_switch_throughput', 'SwitchAggFlowStatsEncoder', 'SwitchAggFlowStatsDecoder',
+    ),
+    'FileUtils': (
+        'readResponseTimesFromLogFile', 'readResponseTimesFromLogFileAsArrays',
+    ),
+    'TrainingDatabase': (
+        'DEFAULT_INGESTION_BATCH_SIZE', 'Base', 'TrainingDataEntityV1', 'TrainingDataEntity', 'RequestTypeEntity',
+        'TrainingDataEntityV3', 'IngestionManifestEntity', 'TrainingDataRollupPerSecondEntity',
+        'TrainingDataRollupPerMinuteEntity', 'TrainingDataRollupPerDayEntity', 'ROLLUP_ENTITIES', 'TrainingDataRow',
+        'create_connection_using_sqlalchemy', 'create_training_data_table', 'backfill_ingestion_manifest',
+        'rebuild_training_data_rollups', 'TRAINING_DATA_ROW_BATCH_DTYPE', 'DEFAULT_READ_BATCH_SIZE',
+        'IngestionStatistics', 'TrainingDataRowBatch', 'training_data_exists_in_db_using_sqlalchemy',
+        'insert_training_data', 'ingest_training_data', 'read_all_training_data_from_db_using_sqlalchemy',
+        'read_training_data_from_db_between_using_sqlalchemy', 'read_training_data_batches_from_db',
+    ),
+    'TrainingDatabaseUtils': (
+        'PERFORMANCE_METRICS_COLUMNS', 'read_all_performance_metrics_from_db', 'read_training_data_rollups',
+        'summarize_training_data',
+    ),
+    'LogIngestion': (
+        'ingest_log_directory',
+    ),
+    'LogFollower': (
+        'CHECKPOINT_FORMAT_VERSION', 'DEFAULT_MAX_BYTES_PER_READ', 'LogFollower', 'FollowedLogFileEntity',
+        'ingest_followed_log_files',
+    ),
+    'SwitchAggFlowStatsBinary': (
+        'BINARY_FORMAT_MAGIC', 'BINARY_FORMAT_VERSION', 'EMPTY_SLOT', 'SwitchAggFlowStatsFile',
+        'write_switch_agg_flow_stats_binary', 'read_switch_agg_flow_stats_binary',
+        'convert_switch_agg_flow_stats_json_to_binary', 'convert_switch_agg_flow_stats_binary_to_json',
+    ),
+    'SwitchAggFlowStatsRegistry': (
+        'SwitchAggFlowStatsRegistry',
+    ),
+    'PerformanceMetricsCache': (
+        'CACHE_FORMAT_VERSION', 'read_all_performance_metrics_from_db_cached',
+    ),
+    'EngineManager': (
+        'DEFAULT_READER_PRAGMAS', 'DEFAULT_WRITER_PRAGMAS', 'EngineManager', 'ENGINE_MANAGER', 'get_read_engine',
+        'get_write_engine',
+    ),
+    'Instrumentation': (
+        'InstrumentationEvent', 'Instrumentation', 'INSTRUMENTATION', 'InstrumentationCounters',
+    ),
+    'FeatureDerivation': (
+        'derive_training_data_features',
+    ),
+    'TrainingDatabaseMigration': (
+        'detect_training_data_version', 'migrate_training_database_to_v3',
+    ),
+    'TrainingDataPartitions': (
+        'CATALOG_FILE', 'CATALOG_FORMAT_VERSION', 'PARTITIONINGS', 'is_partitioned_training_database',
+        'read_training_data_catalog', 'write_training_data_catalog', 'partition_of_day', 'partition_paths',
+        'map_partitions_in_order', 'stream_partitions_in_order',
+    ),
+    'PartitionedTrainingDatabase': (
+        'create_partitioned_training_database', 'ingest_partitioned_training_data', 'partitioned_training_data_exists',
+        'partition_training_database',
+    ),
+}
+
+_SUBMODULE_OF_NAME = {name: submodule for submodule, names in _SUBMODULE_EXPORTS.items() for name in names}
+
+# Names whose value changes, which are looked up on every access instead of once
+_UNCACHED_NAMES = {'SELECTED_VERSION'}
+
+__all__ = list(_SUBMODULE_OF_NAME)
+
+
+class _Package(ModuleType):
+    def __setattr__(self, name: str, value):
+        # Importing a submodule binds it to the package. Some submodules are named after the class they define,
+        # e.g. SwitchAggFlowStats, for which the package keeps the class instead of the submodule.
+        if isinstance(value, ModuleType) and name in _SUBMODULE_OF_NAME:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def _import_submodule(submodule: str) -> ModuleType:
+    # names of modules outside of this package start with a dot, e.g. "..Version"
+    return import_module(submodule if submodule.startswith('.') else f".{submodule}", __name__)
+
+
+def __getattr__(name: str):
+    submodule = _SUBMODULE_OF_NAME.get(name)
+    if submodule is None:
+        if name in _SUBMODULE_EXPORTS and not name.startswith('.'):
+            return _import_submodule(name)
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(_import_submodule(submodule), name)
+    if name not in _UNCACHED_NAMES:
+        # later accesses do not go through __getattr__
+        globals()[name] = value
+    return value
+
+
+def __dir__():
+    submodules = {submodule for submodule in _SUBMODULE_EXPORTS if not submodule.startswith('.')}
+    return sorted(set(globals()) | set(__all__) | submodules)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run the tests against the sources, also when the package is not installed,
+# and generate their data like the benchmarks do
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))
+
+
+@pytest.fixture(scope='session')
+def training_data_batch():
+    """
+    generated training data of all request types spread over three days, see synthetic_data.py.
+    Shared by the tests, which must not change it.
+    """
+    from synthetic_data import generate_training_data_batch
+
+    return generate_training_data_batch(20000, seed=7)
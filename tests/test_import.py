@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+
+sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))
+from import_time import measure_import_times, check_import_results  # noqa: E402
+
+HEAVY_MODULES = ['numpy', 'pandas', 'sqlalchemy']
+
+
+def _import_in_fresh_interpreter(statement: str) -> subprocess.CompletedProcess:
+    """ run the import statement in a new interpreter, which prints the loaded modules as JSON to stderr """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(path for path in (SRC_DIR, env.get('PYTHONPATH')) if path)
+    return subprocess.run(
+        [sys.executable, '-c', f"{statement}\nimport json, sys\nsys.stderr.write(json.dumps(sorted(sys.modules)))"],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=env
+    )
+
+
+def test_import_loads_no_heavy_modules_and_prints_nothing():
+    completed = _import_in_fresh_interpreter("import rast_common.main")
+
+    loaded_modules = json.loads(completed.stderr)
+    assert [module for module in HEAVY_MODULES if module in loaded_modules] == []
+    assert completed.stdout == ""
+
+
+def test_version_names_are_exported():
+    completed = _import_in_fresh_interpreter(
+        "import rast_common.main as main\n"
+        "main.select_version(main.TrainingDataEntityVersion.V3)\n"
+        "assert main.get_selected_version() == main.SELECTED_VERSION == main.TrainingDataEntityVersion.V3"
+    )
+
+    loaded_modules = json.loads(completed.stderr)
+    assert [module for module in HEAVY_MODULES if module in loaded_modules] == []
+
+
+def test_import_time(monkeypatch):
+    # import_time.py runs the imports in interpreters that inherit the environment
+    monkeypatch.setenv('PYTHONPATH', os.pathsep.join(path for path in (SRC_DIR, os.environ.get('PYTHONPATH')) if path))
+
+    assert check_import_results(measure_import_times(repeat=3)) == []
@@ -0,0 +1,264 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from rast_common.main import LogFollower, create_connection_using_sqlalchemy, ingest_followed_log_files
+
+from synthetic_data import generate_locust_log_lines
+
+_ENTRY_PATTERN = re.compile(r"\[(.*?)\] (\S+) (\d+) (\d+) (\d+) (\d+)")
+
+
+@pytest.fixture(scope='module')
+def log_lines() -> list[str]:
+    return list(generate_locust_log_lines(2000, seed=7))
+
+
+def _write(path, lines: list[str], mode: str = 'a'):
+    with open(path, mode) as file:
+        file.writelines(lines)
+
+
+def _read_all(follower: LogFollower) -> list[str]:
+    """ :return: new lines of all log files, read until the follower has no backlog """
+    lines = []
+    while True:
+        for _, new_lines in follower.read_new_lines():
+            lines += new_lines
+        if not follower.has_backlog:
+            return lines
+
+
+def test_appended_lines_are_read_once(tmp_path, log_lines):
+    log = tmp_path / 'locust_log.log'
+    data = ''.join(log_lines)
+
+    with LogFollower([log], max_bytes_per_read=4096) as follower:
+        assert follower.read_new_lines() == []
+
+        lines = []
+        for begin in range(0, len(data), 5000):
+            # ends within a line, which is read once it is complete
+            _write(log, [data[begin:begin + 5000]])
+            lines += _read_all(follower)
+
+    assert lines == log_lines
+
+
+def test_lines_longer_than_a_read_are_read_whole(tmp_path, log_lines):
+    log = tmp_path / 'locust_log.log'
+    long_line = 'x' * 1000 + '\n'
+
+    with LogFollower([log], max_bytes_per_read=64) as follower:
+        _write(log, log_lines[:10] + [long_line, long_line[:500]])
+        assert _read_all(follower) == log_lines[:10] + [long_line]
+
+        _write(log, [long_line[500:]] + log_lines[10:20])
+        assert _read_all(follower) == [long_line] + log_lines[10:20]
+
+
+def test_rotated_log_file_is_read_to_the_end_while_following(tmp_path, log_lines):
+    log = tmp_path / 'locust_log.log'
+
+    with LogFollower([log], max_bytes_per_read=4096) as follower:
+        _write(log, log_lines[:500])
+        lines = _read_all(follower)
+
+        _write(log, log_lines[500:1000])
+        os.rename(log, tmp_path / 'locust_log.log.1')
+        _write(log, log_lines[1000:])
+        lines += _read_all(follower)
+
+    assert lines == log_lines
+
+
+def test_rotated_log_file_is_read_to_the_end_after_restart(tmp_path, log_lines):
+    log = tmp_path / 'locust_log.log'
+    checkpoint = str(tmp_path / 'checkpoint.json')
+
+    with LogFollower([log], checkpoint) as follower:
+        _write(log, log_lines[:500])
+        lines = _read_all(follower)
+        follower.save_checkpoint()
+
+    _write(log, log_lines[500:1000])
+    os.rename(log, tmp_path / 'locust_log.log.1')
+    _write(log, log_lines[1000:])
+
+    with LogFollower([log], checkpoint) as follower:
+        lines += _read_all(follower)
+
+    assert lines == log_lines
+
+
+def test_truncated_log_file_is_read_from_the_beginning(tmp_path, log_lines):
+    log = tmp_path / 'locust_log.log'
+
+    with LogFollower([log]) as follower:
+        _write(log, log_lines[:1000])
+        assert _read_all(follower) == log_lines[:1000]
+
+        # e.g. the copytruncate option of logrotate
+        _write(log, log_lines[1000:1100], mode='w')
+        assert _read_all(follower) == log_lines[1000:1100]
+
+
+def test_log_file_rewritten_beyond_the_position_is_read_from_the_beginning(tmp_path, log_lines):
+    log = tmp_path / 'locust_log.log'
+    checkpoint = str(tmp_path / 'checkpoint.json')
+
+    with LogFollower([log], checkpoint) as follower:
+        _write(log, log_lines[:100])
+        assert _read_all(follower) == log_lines[:100]
+        follower.save_checkpoint()
+
+        # the size alone does not tell that the log file was truncated
+        _write(log, log_lines[100:1000], mode='w')
+        assert _read_all(follower) == log_lines[100:1000]
+
+    _write(log, log_lines[1000:], mode='w')
+
+    with LogFollower([log], checkpoint) as follower:
+        assert _read_all(follower) == log_lines[1000:]
+
+
+@pytest.mark.parametrize('with_fingerprint', [True, False])
+def test_checkpoint_continues_after_the_last_read_line(tmp_path, log_lines, with_fingerprint):
+    log = tmp_path / 'locust_log.log'
+    checkpoint = str(tmp_path / 'checkpoint.json')
+
+    with LogFollower([log], checkpoint) as follower:
+        _write(log, log_lines[:500] + [log_lines[500][:10]])
+        assert _read_all(follower) == log_lines[:500]
+        follower.save_checkpoint()
+        positions = follower.positions()
+
+    if not with_fingerprint:
+        # checkpoints written before fingerprints were stored
+        with open(checkpoint) as file:
+            content = json.load(file)
+        for position in content['files'].values():
+            del position['fingerprint']
+        with open(checkpoint, 'w') as file:
+            json.dump(content, file)
+
+    _write(log, [log_lines[500][10:]] + log_lines[501:])
+
+    with LogFollower([log], checkpoint) as follower:
+        if with_fingerprint:
+            assert follower.positions() == positions
+        assert _read_all(follower) == log_lines[500:]
+
+
+def _entry_lines(batch) -> list[str]:
+    timestamps = np.datetime_as_string(batch.columns['timestamp'], unit='ms')
+    return [
+        f"[{timestamp.replace('T', ' ')}] {request_type} {start} {end} {finished} {response_time_ms}\n"
+        for timestamp, request_type, start, end, finished, response_time_ms in zip(
+            timestamps.tolist(),
+            batch.columns['request_type'].tolist(),
+            batch.columns['number_of_parallel_requests_start'].tolist(),
+            batch.columns['number_of_parallel_requests_end'].tolist(),
+            batch.columns['number_of_parallel_requests_finished'].tolist(),
+            batch.columns['request_execution_time_ms'].tolist()
+        )
+    ]
+
+
+def _parse_entry_lines(lines: list[str]):
+    for line in lines:
+        match = _ENTRY_PATTERN.match(line)
+        yield {
+            'time_stamp': datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S.%f'),
+            'request_type': match.group(2),
+            'number_of_parallel_requests_start': int(match.group(3)),
+            'number_of_parallel_requests_end': int(match.group(4)),
+            'number_of_parallel_requests_finished': int(match.group(5)),
+            'response_time': int(match.group(6)),
+        }
+
+
+def _ingest_until_read(follower: LogFollower, engine, paths: list, parse_log_lines=_parse_entry_lines):
+    """ follow the log files until they were read to the end, then stop after the current poll """
+    stop_event = threading.Event()
+    errors = []
+
+    def ingest():
+        try:
+            ingest_followed_log_files(follower, engine, parse_log_lines, 0.01, stop_event, batch_size=100)
+        except Exception as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=ingest)
+    thread.start()
+    sizes = {str(path): os.path.getsize(path) for path in paths}
+    while thread.is_alive() and any(
+            follower.positions()[path]['offset'] < size for path, size in sizes.items()
+    ):
+        stop_event.wait(0.01)
+    stop_event.set()
+    thread.join()
+
+    if len(errors) > 0:
+        raise errors[0]
+
+
+def _ingested_rows(db_path: str) -> list[tuple]:
+    with sqlite3.connect(db_path) as connection:
+        rows = connection.execute(
+            "SELECT timestamp, request_type, request_execution_time_ms FROM training_data"
+        ).fetchall()
+        manifest_row_count, = connection.execute("SELECT sum(row_count) FROM ingestion_manifest").fetchone()
+    connection.close()
+    assert manifest_row_count == len(rows)
+    return sorted(rows)
+
+
+@pytest.mark.parametrize('checkpoint', ['none', 'ahead'])
+def test_followed_log_files_are_ingested_exactly_once_after_a_crash(tmp_path, training_data_batch, checkpoint):
+    logs = [tmp_path / 'rast_log_a.log', tmp_path / 'rast_log_b.log']
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+    db_path = str(tmp_path / 'training_data.db')
+    entries = training_data_batch.take(slice(0, 3000))
+    lines = _entry_lines(entries)
+    _write(logs[0], lines[:1500])
+    _write(logs[1], lines[1500:])
+
+    calls = []
+
+    def crash_after_some_polls(log_lines: list[str]):
+        calls.append(len(log_lines))
+        if len(calls) == 5:
+            raise RuntimeError("crash")
+        return _parse_entry_lines(log_lines)
+
+    engine = create_connection_using_sqlalchemy(db_path)
+    follower = LogFollower(logs, checkpoint_path, max_bytes_per_read=8192)
+    with pytest.raises(RuntimeError, match="crash"):
+        _ingest_until_read(follower, engine, logs, crash_after_some_polls)
+    if checkpoint == 'ahead':
+        # the checkpoint file includes the lines of the poll that crashed, which were not committed
+        follower.save_checkpoint()
+    follower.close()
+
+    assert 0 < len(_ingested_rows(db_path)) < len(lines)
+
+    with LogFollower(logs, checkpoint_path, max_bytes_per_read=8192) as follower:
+        _ingest_until_read(follower, engine, logs)
+    engine.dispose()
+
+    expected_rows = sorted(zip(
+        [
+            timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')
+            for timestamp in entries.columns['timestamp'].astype('datetime64[us]').tolist()
+        ],
+        entries.columns['request_type'].tolist(),
+        entries.columns['request_execution_time_ms'].tolist()
+    ))
+    assert _ingested_rows(db_path) == expected_rows
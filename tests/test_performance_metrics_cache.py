@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from rast_common.main import TrainingDataRowBatch, create_connection_using_sqlalchemy, create_training_data_table, \
+    ingest_training_data, read_all_performance_metrics_from_db, read_all_performance_metrics_from_db_cached
+
+pytest.importorskip('pyarrow')
+
+
+def _ingest(db_path: str, batch: TrainingDataRowBatch):
+    engine = create_connection_using_sqlalchemy(db_path)
+    create_training_data_table(engine)
+    ingest_training_data(engine, batch)
+    engine.dispose()
+
+
+def _execute(db_path: str, sql: str, parameters=()):
+    with sqlite3.connect(db_path) as connection:
+        connection.execute(sql, parameters)
+    connection.close()
+
+
+def _metadata(cache_dir: str) -> dict:
+    cache_path, = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    with open(os.path.join(cache_path, 'metadata.json')) as file:
+        return json.load(file)
+
+
+def _assert_equals_uncached(db_path: str, cache_dir: str, begin_end=()):
+    df, known_request_types = read_all_performance_metrics_from_db_cached(db_path, begin_end, cache_dir)
+    expected_df, expected_request_types = read_all_performance_metrics_from_db(db_path, begin_end)
+
+    assert known_request_types == expected_request_types
+    pd.testing.assert_frame_equal(df, expected_df)
+
+
+@pytest.fixture
+def database(tmp_path, training_data_batch) -> tuple[str, str, TrainingDataRowBatch]:
+    """
+    :return: path of a training database with the first half of the rows, the cache directory and the other rows
+    """
+    db_path = str(tmp_path / 'training_data.db')
+    _ingest(db_path, training_data_batch.take(slice(0, 5000)))
+    return db_path, str(tmp_path / 'cache'), training_data_batch.take(slice(5000, 10000))
+
+
+@pytest.mark.parametrize('begin_end', [(), ('2021 04 01', '2021 04 02')])
+def test_appended_rows_are_read_incrementally(database, begin_end):
+    db_path, cache_dir, later_rows = database
+    _assert_equals_uncached(db_path, cache_dir, begin_end)
+
+    # a request type that appears only in the appended rows gets the next code
+    later_rows.columns['request_type'][:10] = '/new'
+    _ingest(db_path, later_rows)
+    _assert_equals_uncached(db_path, cache_dir, begin_end)
+
+    assert len(_metadata(cache_dir)['parts']) == 2
+
+
+def test_removed_rows_rebuild_the_cache(database):
+    db_path, cache_dir, _ = database
+    _assert_equals_uncached(db_path, cache_dir)
+
+    _execute(db_path, "DELETE FROM training_data WHERE id % 7 = 0")
+    _assert_equals_uncached(db_path, cache_dir)
+
+    assert len(_metadata(cache_dir)['parts']) == 1
+
+
+def test_replaced_rows_rebuild_the_cache(database):
+    db_path, cache_dir, _ = database
+    _assert_equals_uncached(db_path, cache_dir)
+
+    # without AUTOINCREMENT, the id of the removed last row is assigned to the next row
+    with sqlite3.connect(db_path) as connection:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(training_data)")]
+        last_row = connection.execute("SELECT * FROM training_data ORDER BY id DESC LIMIT 1").fetchone()
+        connection.execute("DELETE FROM training_data WHERE id = ?", (last_row[0],))
+        replacement = dict(zip(columns[1:], last_row[1:]), timestamp='2021-04-03 23:59:59.999000')
+        connection.execute(
+            f"INSERT INTO training_data ({', '.join(replacement)}) VALUES ({', '.join('?' * len(replacement))})",
+            list(replacement.values())
+        )
+    connection.close()
+
+    _assert_equals_uncached(db_path, cache_dir)
+
+
+def test_replaced_database_file_rebuilds_the_cache(database, tmp_path):
+    db_path, cache_dir, _ = database
+    _assert_equals_uncached(db_path, cache_dir)
+
+    # same ids and timestamps, only the replaced file tells the rows apart
+    other_path = str(tmp_path / 'other.db')
+    shutil.copyfile(db_path, other_path)
+    _execute(other_path, "UPDATE training_data SET request_execution_time_ms = request_execution_time_ms + 1")
+    os.replace(other_path, db_path)
+
+    _assert_equals_uncached(db_path, cache_dir)
+    assert len(_metadata(cache_dir)['parts']) == 1
@@ -0,0 +1,90 @@
+import json
+from datetime import datetime, time
+
+import pytest
+
+from rast_common.main import SECONDS_PER_DAY, SwitchAggFlowStats, RingBufferSwitchAggFlowStats, \
+    SwitchAggFlowStatsDecoder, TrainingDataRowBatch, assign_switch_throughput
+
+
+@pytest.mark.parametrize('window_seconds', [SECONDS_PER_DAY, 60])
+def test_ring_buffer_keeps_the_seconds_of_each_metric(window_seconds):
+    bytes_per_second_received = {time(23, 59, 58): 5, time(23, 59, 59): 7}
+    packets_per_second_received = {time(23, 59, 58): 1}
+
+    dict_stats = SwitchAggFlowStats(1)
+    ring_buffer_stats = RingBufferSwitchAggFlowStats(1, window_seconds)
+    for stats in (dict_stats, ring_buffer_stats):
+        stats.bytes_per_second_received = bytes_per_second_received
+        stats.packets_per_second_received = packets_per_second_received
+
+    assert json.loads(str(ring_buffer_stats)) == json.loads(str(dict_stats))
+
+    decoded = json.loads(str(ring_buffer_stats), cls=SwitchAggFlowStatsDecoder, stats_type=RingBufferSwitchAggFlowStats)
+    assert dict(decoded.bytes_per_second_received) == bytes_per_second_received
+    assert dict(decoded.packets_per_second_received) == packets_per_second_received
+    assert decoded.get_bytes_per_second_for(datetime(2021, 4, 1, 23, 59, 59)) == 7
+    assert decoded.get_packets_per_second_for(datetime(2021, 4, 1, 23, 59, 59)) == 0
+
+
+def test_ring_buffer_replaces_the_seconds_of_an_assigned_metric_only():
+    stats = RingBufferSwitchAggFlowStats(1)
+    stats.add_agg_flow_stats(100, 10)
+    second_of_update = next(iter(stats.packets_per_second_received))
+
+    stats.bytes_per_second_received = {time(1, 2, 3): 5}
+
+    assert dict(stats.bytes_per_second_received) == {time(1, 2, 3): 5}
+    assert dict(stats.packets_per_second_received) == {second_of_update: 10}
+
+
+def test_ring_buffer_metrics_are_read_only():
+    stats = RingBufferSwitchAggFlowStats(1)
+    stats.bytes_per_second_received = {time(1, 2, 3): 5}
+
+    with pytest.raises(TypeError):
+        stats.bytes_per_second_received[time(1, 2, 3)] += 1
+
+    assert stats.get_bytes_per_second_for(datetime(2021, 4, 1, 1, 2, 3)) == 5
+
+
+def _stats_of_switch_1() -> SwitchAggFlowStats:
+    stats = SwitchAggFlowStats(1)
+    stats.bytes_per_second_received = {time(1, 2, 3): 100, time(1, 2, 4): 200}
+    stats.packets_per_second_received = {time(1, 2, 3): 1, time(1, 2, 4): 2}
+    return stats
+
+
+def _training_data_columns() -> dict:
+    return {
+        'timestamp': [
+            datetime(2021, 4, 1, 1, 2, 3, 500000), datetime(2021, 4, 1, 1, 2, 4), datetime(2021, 4, 1, 1, 2, 4)
+        ],
+        'number_of_parallel_requests_start': [1, 1, 1],
+        'number_of_parallel_requests_end': [1, 1, 1],
+        'number_of_parallel_requests_finished': [0, 0, 0],
+        'request_type': ['a', 'b', 'a'],
+        'switch_id': [1, 1, 2],
+        'request_execution_time_ms': [10, 20, 30],
+    }
+
+
+def test_assign_switch_throughput_fills_the_columns_of_a_batch():
+    batch = TrainingDataRowBatch(_training_data_columns())
+
+    assign_switch_throughput(batch, {1: _stats_of_switch_1()})
+
+    assert batch.columns['bytes_per_second_transmitted_through_switch'].tolist() == [100, 200, 0]
+    assert batch.columns['packets_per_second_transmitted_through_switch'].tolist() == [1, 2, 0]
+
+
+def test_assign_switch_throughput_fills_rows_and_mappings():
+    rows = list(TrainingDataRowBatch(_training_data_columns()))
+    columns = _training_data_columns()
+
+    assign_switch_throughput(rows, {1: _stats_of_switch_1()})
+    assign_switch_throughput(columns, {1: _stats_of_switch_1()})
+
+    assert [row.bytes_per_second_transmitted_through_switch for row in rows] == [100, 200, 0]
+    assert [row.packets_per_second_transmitted_through_switch for row in rows] == [1, 2, 0]
+    assert columns['bytes_per_second_transmitted_through_switch'].tolist() == [100, 200, 0]
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+from rast_common.main import SwitchAggFlowStatsRegistry
+
+
+def test_cancelled_async_update_releases_the_lock():
+    registry = SwitchAggFlowStatsRegistry()
+    registry.add_agg_flow_stats(1, 100, 1)
+    lock = registry._get_or_create_lock(1)
+
+    async def cancel_waiting_update():
+        lock.acquire()
+        update = asyncio.create_task(registry.add_agg_flow_stats_async(1, 100, 1))
+        # let the update start waiting for the lock in the executor
+        await asyncio.sleep(0.05)
+        update.cancel()
+        await asyncio.gather(update, return_exceptions=True)
+        assert update.cancelled()
+
+        lock.release()
+        # the executor thread acquires the lock and the event loop releases it again
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if not lock.locked():
+                break
+
+    asyncio.run(cancel_waiting_update())
+
+    assert not lock.locked()
+    registry.add_agg_flow_stats(1, 100, 1)
+    assert sum(registry.snapshot()[1].bytes_per_second_received.values()) == 200
+
+
+def test_async_updates_wait_for_threads():
+    registry = SwitchAggFlowStatsRegistry()
+    updates_per_writer = 1000
+
+    def update_in_thread():
+        for _ in range(updates_per_writer):
+            registry.add_agg_flow_stats(1, 1, 1)
+
+    async def update_concurrently():
+        thread = threading.Thread(target=update_in_thread)
+        thread.start()
+        for _ in range(updates_per_writer):
+            await registry.add_agg_flow_stats_async(1, 1, 1)
+        thread.join()
+
+    asyncio.run(update_concurrently())
+
+    assert sum(registry.snapshot()[1].packets_per_second_received.values()) == 2 * updates_per_writer
@@ -0,0 +1,118 @@
+import threading
+
+import numpy as np
+import pytest
+
+from rast_common.main import TrainingDataRowBatch, create_connection_using_sqlalchemy, create_training_data_table, \
+    ingest_training_data, partition_training_database, read_training_data_batches_from_db, \
+    read_training_data_from_db_between_using_sqlalchemy, stream_partitions_in_order
+
+ITEMS_PER_PARTITION = 1000
+
+
+class _Partitions:
+    """ partitions of numbered items, which record the readers that were opened and closed """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.opened = []
+        self.closed = []
+        self.produced_item_count = 0
+
+    def read(self, path: str):
+        with self._lock:
+            self.opened.append(path)
+        try:
+            for item in range(int(path) * ITEMS_PER_PARTITION, (int(path) + 1) * ITEMS_PER_PARTITION):
+                with self._lock:
+                    self.produced_item_count += 1
+                yield item
+        finally:
+            with self._lock:
+                self.closed.append(path)
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+@pytest.mark.parametrize('chunk_size', [1, 7, 5000])
+def test_items_are_streamed_in_the_order_of_the_partitions(max_workers, chunk_size):
+    partitions = _Partitions()
+    paths = [str(index) for index in range(8)]
+
+    items = list(stream_partitions_in_order(partitions.read, paths, max_workers=max_workers, chunk_size=chunk_size))
+
+    assert items == list(range(len(paths) * ITEMS_PER_PARTITION))
+    assert sorted(partitions.closed) == paths
+
+
+def test_closing_the_stream_early_closes_the_readers():
+    partitions = _Partitions()
+    paths = [str(index) for index in range(50)]
+    max_workers, chunk_size, max_chunks_ahead = 3, 10, 2
+
+    stream = stream_partitions_in_order(
+        partitions.read, paths, max_workers=max_workers, chunk_size=chunk_size, max_chunks_ahead=max_chunks_ahead
+    )
+    assert [next(stream) for _ in range(25)] == list(range(25))
+    stream.close()
+
+    # the workers were not left waiting for the consumer, and only read a few chunks ahead of it
+    assert sorted(partitions.closed) == sorted(partitions.opened)
+    assert len(partitions.opened) <= 2 * max_workers
+    assert partitions.produced_item_count <= (len(partitions.opened) * (max_chunks_ahead + 2) + 3) * chunk_size
+
+
+def test_errors_of_a_partition_are_raised_in_order():
+    partitions = _Partitions()
+
+    def read(path: str):
+        if path == '2':
+            raise ValueError(path)
+        return partitions.read(path)
+
+    stream = stream_partitions_in_order(read, ['0', '1', '2', '3'], max_workers=2, chunk_size=100)
+
+    items = []
+    with pytest.raises(ValueError):
+        for item in stream:
+            items.append(item)
+    assert items == list(range(2 * ITEMS_PER_PARTITION))
+
+
+@pytest.fixture
+def partitioned_database(tmp_path, training_data_batch) -> tuple[str, str]:
+    """
+    :return: path of a training database and of a partitioned copy of it with one partition per day
+    """
+    db_path = str(tmp_path / 'training_data.db')
+    engine = create_connection_using_sqlalchemy(db_path)
+    create_training_data_table(engine)
+    ingest_training_data(engine, training_data_batch.take(slice(0, 10000)))
+    engine.dispose()
+
+    directory = str(tmp_path / 'partitioned')
+    partition_training_database(db_path, directory, 'day')
+    return db_path, directory
+
+
+def test_partitioned_reads_equal_the_unpartitioned_reads(partitioned_database):
+    db_path, directory = partitioned_database
+
+    for begin_end in [(), ('2021 04 02', '2021 04 03')]:
+        expected, batches = [
+            TrainingDataRowBatch.concatenate(read_training_data_batches_from_db(path, begin_end, batch_size=999))
+            for path in (db_path, directory)
+        ]
+        for field, column in expected.columns.items():
+            np.testing.assert_array_equal(batches.columns[field], column, err_msg=field)
+
+
+def test_partitioned_rows_can_be_closed_early(partitioned_database):
+    db_path, directory = partitioned_database
+
+    rows = read_training_data_from_db_between_using_sqlalchemy(directory, '2021 04 01', '2021 04 03')
+    first_rows = [next(rows) for _ in range(10)]
+    rows.close()
+
+    expected_rows = read_training_data_from_db_between_using_sqlalchemy(db_path, '2021 04 01', '2021 04 03')
+    assert [str(row) for row in first_rows] == [str(next(expected_rows)) for _ in range(10)]
+    expected_rows.close()
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rast_common.main import TrainingDataEntityVersion, TrainingDataRowBatch, create_connection_using_sqlalchemy, \
+    create_training_data_table, ingest_training_data, read_training_data_rollups, summarize_training_data
+
+PERCENTILES = (50, 95, 99)
+
+_BUCKET_FREQUENCIES = {'second': 's', 'minute': 'min', 'day': 'D'}
+
+
+@pytest.fixture(scope='module', params=[TrainingDataEntityVersion.CURRENT, TrainingDataEntityVersion.V3])
+def ingested_database(request, tmp_path_factory, training_data_batch) -> tuple[str, pd.DataFrame]:
+    """
+    :return: path of a training database and its rows, inserted in several batches
+    and partly again in random order, so that the rollups of most buckets are merged with existing ones
+    """
+    rng = np.random.default_rng(7)
+    again = training_data_batch.take(rng.permutation(len(training_data_batch))[:len(training_data_batch) // 3])
+    again.columns['request_execution_time_ms'] = rng.integers(0, 100000, len(again))
+
+    db_path = str(tmp_path_factory.mktemp('rollups') / 'training_data.db')
+    engine = create_connection_using_sqlalchemy(db_path)
+    create_training_data_table(engine, request.param)
+    ingest_training_data(engine, training_data_batch, batch_size=1000, version=request.param)
+    ingest_training_data(engine, again, batch_size=777, version=request.param)
+    engine.dispose()
+
+    return db_path, TrainingDataRowBatch.concatenate([training_data_batch, again]).to_dataframe()
+
+
+@pytest.fixture
+def ingested_rows(ingested_database) -> tuple[str, pd.DataFrame]:
+    db_path, rows = ingested_database
+    return db_path, rows.copy()
+
+
+def _nearest_rank_percentiles(values: pd.Series) -> pd.Series:
+    sorted_values = np.sort(values.to_numpy())
+    ranks = np.maximum(np.ceil(len(sorted_values) * np.array(PERCENTILES) / 100).astype(int), 1)
+    return pd.Series(sorted_values[ranks - 1], index=[f'P{percentile} Response Time ms' for percentile in PERCENTILES])
+
+
+def _expected_aggregates(rows: pd.DataFrame, keys: list) -> pd.DataFrame:
+    grouped = rows.groupby(keys)
+    expected = pd.DataFrame({
+        'Count': grouped.size(),
+        'Mean Response Time ms': grouped['request_execution_time_ms'].mean(),
+        'Min Response Time ms': grouped['request_execution_time_ms'].min(),
+        'Max Response Time ms': grouped['request_execution_time_ms'].max(),
+        'Mean CPU (System)': grouped['system_cpu_usage'].mean(),
+        'Mean BPS transmitted': grouped['bytes_per_second_transmitted_through_switch'].mean(),
+        'Mean PPS transmitted': grouped['packets_per_second_transmitted_through_switch'].mean(),
+    })
+    return expected.join(grouped['request_execution_time_ms'].apply(_nearest_rank_percentiles).unstack())
+
+
+def _assert_aggregates_equal(actual: pd.DataFrame, expected: pd.DataFrame):
+    assert list(actual.index) == list(expected.index)
+
+    exact_columns = ['Count', 'Min Response Time ms', 'Max Response Time ms']
+    assert (actual[exact_columns].to_numpy() == expected[exact_columns].to_numpy()).all()
+
+    mean_columns = ['Mean Response Time ms', 'Mean CPU (System)', 'Mean BPS transmitted', 'Mean PPS transmitted']
+    np.testing.assert_allclose(actual[mean_columns].to_numpy(float), expected[mean_columns].to_numpy(float))
+
+    # the percentiles are the middle of the histogram bin of the exact percentile,
+    # bins are exact below 64 ms and 1/16 of a power of two wide above
+    for percentile in PERCENTILES:
+        column = f'P{percentile} Response Time ms'
+        exact = expected[column].to_numpy(float)
+        assert (np.abs(actual[column].to_numpy(float) - exact) <= exact / 32).all(), column
+
+
+@pytest.mark.parametrize('resolution', ['second', 'minute', 'day'])
+def test_rollups_match_the_rows(ingested_rows, resolution):
+    db_path, rows = ingested_rows
+    rows['Timestamp'] = rows['timestamp'].dt.floor(_BUCKET_FREQUENCIES[resolution])
+
+    rollups = read_training_data_rollups(db_path, resolution=resolution, percentiles=PERCENTILES)
+
+    _assert_aggregates_equal(
+        rollups.set_index(['Timestamp', 'Request Type']),
+        _expected_aggregates(rows, ['Timestamp', 'request_type'])
+    )
+
+
+def test_rollups_of_days_and_request_type(ingested_rows):
+    db_path, rows = ingested_rows
+    rows['Timestamp'] = rows['timestamp'].dt.floor('min')
+    rows = rows[
+        (rows['timestamp'] >= '2021-04-02') & (rows['timestamp'] < '2021-04-04') & (rows['request_type'] == '/cart')
+    ]
+
+    rollups = read_training_data_rollups(db_path, ('2021 04 02', '2021 04 03'), 'minute', '/cart', PERCENTILES)
+
+    _assert_aggregates_equal(
+        rollups.set_index(['Timestamp', 'Request Type']),
+        _expected_aggregates(rows, ['Timestamp', 'request_type'])
+    )
+
+
+def test_summary_matches_the_rows(ingested_rows):
+    db_path, rows = ingested_rows
+
+    summary = summarize_training_data(db_path, percentiles=PERCENTILES)
+
+    _assert_aggregates_equal(summary.set_index('Request Type'), _expected_aggregates(rows, 'request_type'))
+
+
+def test_summary_of_days(ingested_rows):
+    db_path, rows = ingested_rows
+    rows = rows[rows['timestamp'] < '2021-04-02']
+
+    summary = summarize_training_data(db_path, ('2021 04 01', '2021 04 01'), percentiles=PERCENTILES)
+
+    _assert_aggregates_equal(summary.set_index('Request Type'), _expected_aggregates(rows, 'request_type'))
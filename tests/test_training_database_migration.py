@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from rast_common.main import TrainingDataEntityVersion, TrainingDataRowBatch, create_connection_using_sqlalchemy, \
+    create_training_data_table, ingest_training_data, read_training_data_batches_from_db, summarize_training_data, \
+    detect_training_data_version, migrate_training_database_to_v3, read_all_performance_metrics_from_db, \
+    select_version, get_selected_version
+
+V1 = TrainingDataEntityVersion.V1
+V3 = TrainingDataEntityVersion.V3
+
+_SWITCH_FIELDS = (
+    'switch_id', 'bytes_per_second_transmitted_through_switch', 'packets_per_second_transmitted_through_switch'
+)
+
+
+@pytest.fixture
+def restore_selected_version():
+    selected_version = get_selected_version()
+    yield
+    select_version(selected_version)
+
+
+def _create_database(path: str, batch: TrainingDataRowBatch, version: TrainingDataEntityVersion) -> str:
+    engine = create_connection_using_sqlalchemy(path)
+    create_training_data_table(engine, version)
+    ingest_training_data(engine, batch, batch_size=1000, version=version)
+    engine.dispose()
+    return path
+
+
+def _read_rows(path: str, version: TrainingDataEntityVersion) -> TrainingDataRowBatch:
+    return TrainingDataRowBatch.concatenate(read_training_data_batches_from_db(path, version=version))
+
+
+def _assert_batches_equal(actual: TrainingDataRowBatch, expected: TrainingDataRowBatch):
+    for field, column in expected.columns.items():
+        np.testing.assert_array_equal(actual.columns[field], column, err_msg=field)
+
+
+@pytest.mark.parametrize('source_version', [V1, TrainingDataEntityVersion.CURRENT])
+@pytest.mark.parametrize('in_place', [True, False])
+def test_migration_keeps_the_training_data(tmp_path, training_data_batch, source_version, in_place):
+    batch = training_data_batch.take(slice(0, 5000))
+    source_path = _create_database(str(tmp_path / 'source.db'), batch, source_version)
+    target_path = None if in_place else str(tmp_path / 'target.db')
+    expected_rows = _read_rows(source_path, source_version)
+    expected_summary = summarize_training_data(source_path)
+
+    assert migrate_training_database_to_v3(source_path, target_path) == 5000
+
+    migrated_path = target_path or source_path
+    assert detect_training_data_version(migrated_path) == V3
+    if source_version == V1:
+        # V1 training data was not recorded per switch
+        for field in _SWITCH_FIELDS:
+            expected_rows.columns[field] = np.zeros(len(expected_rows), dtype=np.int64)
+    _assert_batches_equal(_read_rows(migrated_path, V3), expected_rows)
+    # the manifest and the rollups are kept
+    assert summarize_training_data(migrated_path).equals(expected_summary)
+
+
+def test_migration_keeps_the_codes_of_the_request_types(tmp_path, training_data_batch, restore_selected_version):
+    source_path = _create_database(str(tmp_path / 'source.db'), training_data_batch.take(slice(0, 5000)), V1)
+    select_version(V1)
+    expected_metrics, expected_request_types = read_all_performance_metrics_from_db(source_path)
+
+    migrate_training_database_to_v3(source_path)
+
+    select_version(V3)
+    metrics, request_types = read_all_performance_metrics_from_db(source_path)
+    assert request_types == expected_request_types
+    assert metrics['Request Type'].equals(expected_metrics['Request Type'])
+
+
+def test_migrated_database_accepts_new_request_types(tmp_path, training_data_batch):
+    batch = training_data_batch.take(slice(0, 2000))
+    source_path = _create_database(str(tmp_path / 'source.db'), batch, TrainingDataEntityVersion.CURRENT)
+    migrate_training_database_to_v3(source_path)
+
+    new_rows = batch.take(slice(0, 10))
+    new_rows.columns['request_type'] = np.array(['/new'] * 5 + ['/login'] * 5, dtype=object)
+    engine = create_connection_using_sqlalchemy(source_path)
+    ingest_training_data(engine, new_rows, version=V3)
+    engine.dispose()
+
+    rows = _read_rows(source_path, V3)
+    assert len(rows) == 2010
+    assert rows.columns['request_type'][-10:].tolist() == ['/new'] * 5 + ['/login'] * 5
+
+
+def test_migration_rejects_v3_and_existing_targets(tmp_path, training_data_batch):
+    batch = training_data_batch.take(slice(0, 100))
+    v3_path = _create_database(str(tmp_path / 'v3.db'), batch, V3)
+    current_path = _create_database(str(tmp_path / 'current.db'), batch, TrainingDataEntityVersion.CURRENT)
+
+    with pytest.raises(ValueError):
+        migrate_training_database_to_v3(v3_path)
+    with pytest.raises(FileExistsError):
+        migrate_training_database_to_v3(current_path, v3_path)
+    assert detect_training_data_version(current_path) == TrainingDataEntityVersion.CURRENT